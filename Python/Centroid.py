@@ -17,6 +17,8 @@ import serial.tools.list_ports
 import csv
 from datetime import date
 
+from fiberdetect import moments_centroid
+
 # env_filename=os.getenv('ZWO_ASI_LIB') #initialize camera and find its directory where it is located 
 # asi.init('C:\\Users\\ASE\\Desktop\\Ari Lab-2023\\Pics\\ASIStudio\\ASICamera2.dll') #directory of camera 
 
@@ -316,15 +318,15 @@ class ImageProcessorApp:
             start =  time.time()
             output = self.original_image.copy()
 
-            # convert the grayscale image to binary image
-            ret,thresh = cv2.threshold(self.original_image,127,255,0)
-            
-            # calculate moments of binary image
-            M = cv2.moments(thresh)
+            # centroid of the pixels brighter than 127
+            centroid = moments_centroid(self.original_image, threshold=127)
+            if centroid is None:
+                messagebox.showerror("Error", "No bright spot found in the image")
+                return
 
             # calculate x,y coordinate of center
-            cX = int(M["m10"] / M["m00"])
-            cY = int(M["m01"] / M["m00"])
+            cX = int(centroid.center[0])
+            cY = int(centroid.center[1])
 
             targetx = 850
             targety = 500
@@ -11,11 +11,14 @@ from time import time
 import pycromanager
 import sys
 from scipy import optimize
-from time import sleep
+from time import sleep, perf_counter
 import serial
 import serial.tools.list_ports
 import csv
 
+from fiberdetect import detect_circles, detect_circles_pyramid, refine_circle, VOTING_MODES
+from ftacontrol import snapshot_sampler, wait_for_settle, SerialTransport
+
 # env_filename=os.getenv('ZWO_ASI_LIB') #initialize camera and find its directory where it is located 
 # asi.init('C:\\Users\\ASE\\Desktop\\Ari Lab-2023\\Pics\\ASIStudio\\ASICamera2.dll') #directory of camera 
 
@@ -32,6 +35,8 @@ class ImageProcessorApp:
         self.y_coord = 0
         self.coord_min = 0
         self.coord_max = 4095 #create max values for the corrdinates of the fiber tip, use later when making actuator function
+        self.link = SerialTransport(self.ser, eol='\r\n') #writes commands without blocking and matches the pyboard's replies to them, see ftacontrol/transport.py
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close) #so the preamp gets turned off and the link stopped when the window is closed
 
         # Frame for holding the images
         self.image_frame = tk.Frame(root)
@@ -62,6 +67,21 @@ class ImageProcessorApp:
         self.element_dropdown = tk.OptionMenu(self.coord_frame, self.selected_element, *self.element_options)
         self.element_dropdown.pack()
 
+        # Hough voting mode, full circle or along the edge gradient
+        self.voting_mode = tk.StringVar(root)
+        self.voting_mode.set(VOTING_MODES[0])
+
+        self.voting_label = tk.Label(self.coord_frame, text="Voting Mode")
+        self.voting_label.pack()
+
+        self.voting_dropdown = tk.OptionMenu(self.coord_frame, self.voting_mode, *VOTING_MODES)
+        self.voting_dropdown.pack()
+
+        # Pyramid search, finds the fiber at 1/4 scale then refines it at full resolution
+        self.pyramid_var = tk.BooleanVar(value=True)
+        self.pyramid_check = tk.Checkbutton(self.coord_frame, text='Pyramid Search (1/4 scale)', variable=self.pyramid_var)
+        self.pyramid_check.pack()
+
         #PREAMPS enable/disable button
         self.amps_var = tk.BooleanVar(value=False) #create boolean value to make sure the preamps always starts disabled
 
@@ -162,33 +182,22 @@ class ImageProcessorApp:
 
     ser=connect_actuator()
        
+    def fta_command(self, command): #sends one command to the fta controller and waits for the pyboard to answer it
+        print("OUT: " + command) # prints the command is being sent, debug
+        result = self.link.command(command, timeout=2) #gives up after 2 s instead of waiting on readline forever
+        if result.reply:
+            print("In : " + result.reply + f" ({result.rtt * 1000:.1f} ms)")
+        return result
+
     def amp_on(self): #turns on the preamp
-        test_str = 'amp_enable\r\n' #test string that will be sent to the piboard, formatted with newline character
-        print("OUT: " + test_str) # prints the command is being sent, debug
-        self.ser.write( test_str.encode('ascii') ) # convert the sting to bytes since serial connection requires this format
-        line =  self.ser.readline().decode('utf-8') # reads a line of text from the serial port and decodes it. now we wait 
-        while not line: #wait for pyboard to respond
-            line =  self.ser.readline().decode('utf-8') #once a non-empty resonce is given, print
-        print( "In : " + line )
+        self.fta_command('amp_enable')
 
     def amp_off(self): #turns off the preamp
-        test_str = 'amp_disable\r\n' #test string that will be sent to the piboard, formatted with newline character
-        print("OUT: " + test_str) # prints the command is being sent, debug
-        self.ser.write( test_str.encode('ascii') ) # convert the sting to bytes since serial connection requires this format
-        line =  self.ser.readline().decode('utf-8') # reads a line of text from the serial port and decodes it. now we wait
-        while not line: #wait for pyboard to respond
-            line =  self.ser.readline().decode('utf-8') #once a non-empty resonce is given, print
-        print( "In : " + line )   
-
-    def set_DAC(self,x,y): #basically same thing as above, but different strings are inputed to the fta controller to oget back differnt outputs. there are both x and y inputs though
-        test_str = f'DAC_set,{x},{y}\r\n' #DAC is responcoble for the xy inputs of the FTA. can be values 0-4095
-        print("OUT: " + test_str)
-        self.ser.write( test_str.encode('ascii') ) 
-        line =  self.ser.readline().decode('utf-8') 
-        while not line: #wait for pyboard to respond
-            line =  self.ser.readline().decode('utf-8') 
-        print( "In : " + line )
-        
+        self.fta_command('amp_disable')
+
+    def set_DAC(self,x,y): #both axes in one command. DAC is responcoble for the xy inputs of the FTA. can be values 0-4095
+        self.fta_command(f'DAC_set,{x},{y}')
+
         element = int(self.selected_element.get())  # Get the element number from dropdown
         self.dac_values.append((x, y)) # append the element and dac inputs 
 
@@ -276,75 +285,28 @@ class ImageProcessorApp:
         
             output = self.original_image.copy()
 
-            # Apply Gaussian Blur
-            blur_image = cv2.GaussianBlur(self.original_image, (9, 9), 0)
-
-            # Canny Edge Detection
-            edged_image = cv2.Canny(blur_image, 75, 150)
-
-            height, width = edged_image.shape
-            radii = 100
-            acc_array = np.zeros((height, width, radii))
-            filter3D = np.ones((40, 40, radii))
-
-            def fill_acc_array(x0, y0, radius):
-                x = radius
-                y = 0
-                decision = 1 - x
-                while y <= x:
-                    if 0 <= x + x0 < height and 0 <= y + y0 < width:
-                        acc_array[x + x0, y + y0, radius] += 1
-                    if 0 <= y + x0 < height and 0 <= x + y0 < width:
-                        acc_array[y + x0, x + y0, radius] += 1
-                    if 0 <= -x + x0 < height and 0 <= y + y0 < width:
-                        acc_array[-x + x0, y + y0, radius] += 1
-                    if 0 <= -y + x0 < height and 0 <= x + y0 < width:
-                        acc_array[-y + x0, x + y0, radius] += 1
-                    if 0 <= -x + x0 < height and 0 <= -y + y0 < width:
-                        acc_array[-x + x0, -y + y0, radius] += 1
-                    if 0 <= -y + x0 < height and 0 <= -x + y0 < width:
-                        acc_array[-y + x0, -x + y0, radius] += 1
-                    if 0 <= x + x0 < height and 0 <= -y + y0 < width:
-                        acc_array[x + x0, -y + y0, radius] += 1
-                    if 0 <= y + x0 < height and 0 <= -x + y0 < width:
-                        acc_array[y + x0, -x + y0, radius] += 1
-                    y += 1
-                    if decision <= 0:
-                        decision += 2 * y + 1
-                    else:
-                        x -= 1
-                        decision += 2 * (y - x) + 1
-
-            edges = np.where(edged_image == 255)
+            mode = self.voting_mode.get()
+            if self.pyramid_var.get():
+                # same blur/canny/voting but searched at 1/4 scale first, only the hits are redone at full resolution
+                circles = detect_circles_pyramid(self.original_image, radii=range(20, 55), scale=4, blur_size=9,
+                                                 canny_low=75, canny_high=150, mode=mode, min_distance=30)
+            else:
+                # Gaussian blur, canny edges, vote for circles with radius 20-54, then keep the local maxima at least 30 px apart, best first
+                circles = detect_circles(self.original_image, radii=range(20, 55), blur_size=9,
+                                         canny_low=75, canny_high=150, mode=mode, min_distance=30)
+
             global circle_radius
             circle_radius = int()
-            for i in range(len(edges[0])):
-                x = edges[0][i]
-                y = edges[1][i]
-                for radius in range(20, 55):
-                    fill_acc_array(x, y, radius)
-
-            i = 0
-            while i < height - 40:
-                j = 0
-                while j < width - 40:
-                    filter3D = acc_array[i:i+40, j:j+40, :] * filter3D
-                    max_pt = np.where(filter3D == filter3D.max())
-                    a = int(max_pt[0][0])
-                    b = int(max_pt[1][0])
-                    c = int(max_pt[2][0])
-                    b = b + j
-                    a = a + i
-                    if filter3D.max() > 90:
-                        if (b, a) not in self.circle_centers:
-                            # Draw circles on the extended image
-                            cv2.circle(output, (b, a), c, (0, 255, 0), 2)
-                            cv2.circle(output, (b, a), 3, (0, 0, 255), -1)
-                            self.circle_centers.append((b, a))
-                            circle_radius = c
-                    j += 30
-                    filter3D[:, :, :] = 1
-                i += 30
+            for (b, a), c, score in circles:
+                if (b, a) not in [(round(x), round(y)) for x, y in self.circle_centers]:
+                    # Fit the circle edge to get a sub-pixel center and radius
+                    (x, y), r, rms = refine_circle(self.original_image, (b, a), c)
+                    print(f"Refined circle: ({x:.2f}, {y:.2f}) r={r:.2f} rms={rms}")
+                    # Draw circles on the extended image
+                    cv2.circle(output, (round(x), round(y)), round(r), (0, 255, 0), 2)
+                    cv2.circle(output, (round(x), round(y)), 3, (0, 0, 255), -1)
+                    self.circle_centers.append((x, y))
+                    circle_radius = r
 
             # Crop the output back to the original image size
             # Add to data storage with element number
@@ -471,6 +433,16 @@ class ImageProcessorApp:
         # Draw the updated plot
         self.canvas.draw()
 
+    def wait_for_tip(self, timeout, start=None):
+        # takes pictures until the fiber tip stops moving instead of sleeping a fixed time, timeout is the longest wait
+        result = wait_for_settle(snapshot_sampler(self.camera.capture), window=0.3, min_samples=3, timeout=timeout,
+                                 start=start)
+        if result.settled:
+            print(f"Fiber tip settled in {result.settle_time:.2f} s")
+        else:
+            print(f"Fiber tip still moving after {timeout} s (std {result.std:.2f} px), carrying on")
+        return result.settle_time
+
     def automate_process_rough(self): # manual brute force way of moving the fiber tip
         #min is 559 for x and y dac values
         #max is 3537 for x and y dac values 
@@ -479,84 +451,75 @@ class ImageProcessorApp:
         print('Taking photo')
         self.capture_image_from_camera()
         print('Processing Image')
-        sleep(2)
         self.process_image()
-        print('Image processed, waiting for next round')
-        sleep(10)
+        print('Image processed')
 
         print('Turning Amp On')
+        sent = perf_counter()
         self.amp_on()
-        sleep(3)
+        self.wait_for_tip(timeout=3, start=sent)
         print('Taking photo')
         self.capture_image_from_camera()
         print('Processing Image')
-        sleep(2)
         self.process_image()
-        print('Image processed, waiting for next round')
-        sleep(10)
+        print('Image processed')
 
+        sent = perf_counter()
         self.set_DAC(2047, 2047)
         print('Waiting for Fiber Tip to Move... ')
-        sleep(10)
+        self.wait_for_tip(timeout=10, start=sent)
         print('Taking photo')
         self.capture_image_from_camera()
         print('Processing Image')
-        sleep(2)
         self.process_image()
-        print('Image processed, waiting for next round')
-        sleep(10)
+        print('Image processed')
 
+        sent = perf_counter()
         self.set_DAC(559, 559)
         print('Waiting for Fiber Tip to Move... ')
-        sleep(20)
+        self.wait_for_tip(timeout=20, start=sent)
         print('Taking photo')
         self.capture_image_from_camera()
         print('Processing Image')
-        sleep(2)
         self.process_image()
-        print('Image processed, waiting for next round')
-        sleep(10)
+        print('Image processed')
     
+        sent = perf_counter()
         self.set_DAC(3537, 3537)
         print('Waiting for Fiber Tip to Move... ')
-        sleep(20)
+        self.wait_for_tip(timeout=20, start=sent)
         print('Taking photo')
         self.capture_image_from_camera()
         print('Processing Image')
-        sleep(2)
         self.process_image()
-        sleep(10)
 
+        sent = perf_counter()
         self.set_DAC(3537,1200)
         print('Waiting for Fiber Tip to Move... ')
-        sleep(20)
+        self.wait_for_tip(timeout=20, start=sent)
         print('Taking photo')
         self.capture_image_from_camera()
         print('Processing Image')
-        sleep(2)
         self.process_image()
-        print('Image processed, waiting for next round')
-        sleep(10)
+        print('Image processed')
         
+        sent = perf_counter()
         self.set_DAC(559, 3537)
         print('Waiting for Fiber Tip to Move... ')
-        sleep(20)
+        self.wait_for_tip(timeout=20, start=sent)
         print('Taking photo')
         self.capture_image_from_camera()
         print('Processing Image')
-        sleep(2)
         self.process_image()
-        sleep(10)
 
+        sent = perf_counter()
         self.set_DAC(2047,2047)
         print('Waiting for Fiber Tip to Move... ')
-        sleep(12)
+        self.wait_for_tip(timeout=12, start=sent)
         print('Taking photo')
         self.capture_image_from_camera()
         print('Processing Image')
-        sleep(2)
         self.process_image()
-        sleep(8)
         
         # for i in range(600,3500,200):
         #     self.set_DAC(i,2047)
@@ -579,7 +542,6 @@ class ImageProcessorApp:
         self.amp_off()
         self.capture_image_from_camera()
         print('Processing Image')
-        sleep(2)
         self.process_image()
         print('Automation Done')
 
@@ -649,10 +611,16 @@ class ImageProcessorApp:
 
 # Make sure to include the rest of your class methods and initialization here
 
+    def on_close(self):
+        self.amp_off() # failsafe to make sure the preamp is always turned off when closing 
+        self.link.close() # stops the reader thread
+        self.root.destroy()
+
     def __del__(self):
         # Cleanup the camera on application close
+        if hasattr(self, 'link'):
+            self.link.close() # already stopped if the window was closed, closing twice is fine
         if hasattr(self, 'ser'):
-            self.amp_off() # failsafe to make sure the preamp is always turned off when closing 
             self.ser.close()
         if hasattr(self, 'camera'):
             self.camera.close()
@@ -16,6 +16,8 @@ import serial
 import serial.tools.list_ports
 import csv
 
+from fiberdetect import detect_circles, VOTING_MODES
+
 # env_filename=os.getenv('ZWO_ASI_LIB') #initialize camera and find its directory where it is located 
 # asi.init('C:\\Users\\ASE\\Desktop\\Ari Lab-2023\\Pics\\ASIStudio\\ASICamera2.dll') #directory of camera 
 
@@ -62,6 +64,16 @@ class ImageProcessorApp:
         self.element_dropdown = tk.OptionMenu(self.coord_frame, self.selected_element, *self.element_options)
         self.element_dropdown.pack()
 
+        # Hough voting mode, full circle or along the edge gradient
+        self.voting_mode = tk.StringVar(root)
+        self.voting_mode.set(VOTING_MODES[0])
+
+        self.voting_label = tk.Label(self.coord_frame, text="Voting Mode")
+        self.voting_label.pack()
+
+        self.voting_dropdown = tk.OptionMenu(self.coord_frame, self.voting_mode, *VOTING_MODES)
+        self.voting_dropdown.pack()
+
         #PREAMPS enable/disable button
         self.amps_var = tk.BooleanVar(value=False) #create boolean value to make sure the preamps always starts disabled
 
@@ -267,79 +279,19 @@ class ImageProcessorApp:
         #start_time = time.time()
         output = self.original_image.copy() #creates a copy to be worked on so the original stays the same
 
-        # Gaussian Blurring of the image, (5,5) is the blur size and 0 is the standard deviation
-        blur_image = cv2.GaussianBlur(self.original_image, (5, 5), 0)
-
-        # Using OpenCV Canny Edge detector to detect edges, 75 and 150 are thresholds
-        edged_image = cv2.Canny(blur_image, 75, 150)
-
-        height, width = edged_image.shape
-        radii = 100
-        acc_array = np.zeros(((height, width, radii))) #this stores an array of zeros, the array is used to vote for potential circles
-
-        filter3D = np.zeros((30, 30, radii)) #creates a 3d filter array used to porcess and detect circles based on the accumulator array
-        filter3D[:, :, :] = 1 #prepares arrays for the circle detection function
-
-        #This function fills an accumulator array to keep track of possible circle centers based on the detected edges
-        def fill_acc_array(x0, y0, radius):  
-            x = radius
-            y = 0
-            decision = 1 - x
-            while y < x: 
-                if x + x0 < height and y + y0 < width:
-                    acc_array[x + x0, y + y0, radius] += 1
-                if y + x0 < height and x + y0 < width:
-                    acc_array[y + x0, x + y0, radius] += 1
-                if -x + x0 < height and y + y0 < width:
-                    acc_array[-x + x0, y + y0, radius] += 1
-                if -y + x0 < height and x + y0 < width:
-                    acc_array[-y + x0, x + y0, radius] += 1
-                if -x + x0 < height and -y + y0 < width:
-                    acc_array[-x + x0, -y + y0, radius] += 1
-                if -y + x0 < height and -x + y0 < width:
-                    acc_array[-y + x0, -x + y0, radius] += 1
-                if x + x0 < height and -y + y0 < width:
-                    acc_array[x + x0, -y + y0, radius] += 1
-                if y + x0 < height and -x + y0 < width:
-                    acc_array[y + x0, -x + y0, radius] += 1
-                y += 1
-                if decision <= 0:
-                    decision += 2 * y + 1
-                else:
-                    x = x - 1
-                    decision += 2 * (y - x) + 1
+        # blur (5x5), canny edges (75/150 thresholds), vote for radii 20 to 55 in the selected voting mode and
+        # take the local maxima at least 30 px apart, strongest circle first. same pipeline as FIBERFINDERv4
+        circles = detect_circles(self.original_image, radii=range(20, 55), blur_size=5, canny_low=75, canny_high=150,
+                                 mode=self.voting_mode.get(), min_distance=30)
 
-        edges = np.where(edged_image == 255)
         global circle_radius #make value global so it can be used in another function
         circle_radius = int()
-        for i in range(len(edges[0])):
-            x = edges[0][i]
-            y = edges[1][i]
-            for radius in range(20, 55): # seeks range of potential cirles with a raduis between 20 and 55
-                fill_acc_array(x, y, radius)
-
-        i = 0 #this block analyzes the accumulator array to find and draw circles 
-        j = 0
-        while i < height - 30: #move a 30 by 30 window over the image, identifies the maximum value in filter3D
-            while j < width - 30:
-                filter3D = acc_array[i:i+30, j:j+30, :] * filter3D
-                max_pt = np.where(filter3D == filter3D.max())
-                a = int(max_pt[0][0])
-                b = int(max_pt[1][0])
-                c = int(max_pt[2][0])
-                b = b + j
-                a = a + i
-                if filter3D.max() > 90:
-                    if (b, a) not in self.circle_centers:
-                        cv2.circle(output, (b, a), c, (0, 255, 0), 2)
-                        cv2.circle(output, (b, a), 3, (0, 0, 255), -1)
-                        self.circle_centers.append((b, a))  # Store detected circle centers
-                        circle_radius = c # this code is breaking at the moment and i dont know why 
-                        #print(f"Circle Centers After Append: {self.circle_centers}") #debugging check 
-                j = j + 30
-                filter3D[:, :, :] = 1
-            j = 0
-            i = i + 30
+        for (b, a), c, score in circles:
+            if (b, a) not in self.circle_centers:
+                cv2.circle(output, (b, a), c, (0, 255, 0), 2)
+                cv2.circle(output, (b, a), 3, (0, 0, 255), -1)
+                self.circle_centers.append((b, a))  # Store detected circle centers
+                circle_radius = c
         
         # Add to data storage with element number
         element = int(self.selected_element.get()) #get element number 
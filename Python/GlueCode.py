@@ -17,6 +17,8 @@ import serial.tools.list_ports
 import csv
 from datetime import date
 
+from fiberdetect import moments_centroid, refine_centroid
+
 # env_filename=os.getenv('ZWO_ASI_LIB') #initialize camera and find its directory where it is located 
 # asi.init('C:\\Users\\ASE\\Desktop\\Ari Lab-2023\\Pics\\ASIStudio\\ASICamera2.dll') #directory of camera 
 
@@ -267,19 +269,18 @@ class ImageProcessorApp:
         
             output = self.original_image.copy()
 
-            # convert the grayscale image to binary image
-            ret,thresh = cv2.threshold(self.original_image,127,255,0)
-            
-            # calculate moments of binary image
-            M = cv2.moments(thresh)
+            # centroid of the pixels brighter than 127
+            centroid = moments_centroid(self.original_image, threshold=127)
+            if centroid is None:
+                messagebox.showerror("Error", "No bright spot found in the image")
+                return
 
-            # calculate x,y coordinate of center
-            cX = int(M["m10"] / M["m00"])
-            cY = int(M["m01"] / M["m00"])
+            # calculate x,y coordinate of center, the moments centroid is refined with a circle fit to the edge
+            (cX, cY), _, _ = refine_centroid(self.original_image, centroid)
             
             # put text and highlight the center
-            cv2.circle(output, (cX, cY), 5, (0, 255, 255), -1)
-            cv2.putText(output, "centroid", (cX - 25, cY - 25),cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
+            cv2.circle(output, (round(cX), round(cY)), 5, (0, 255, 255), -1)
+            cv2.putText(output, "centroid", (round(cX) - 25, round(cY) - 25),cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
             #
             #  display the image
             #cv2.imshow("Image", output)
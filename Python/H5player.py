@@ -1,4 +1,3 @@
-import h5py
 import cv2
 import numpy as np
 import os
@@ -6,6 +5,8 @@ import time
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename
 
+from zwocapture import H5VideoReader, play_video
+
 # Hide the root tkinter window
 Tk().withdraw()
 
@@ -25,20 +26,19 @@ if not os.path.exists(file_path):
     print(f"[ERROR] File not found: {file_path}")
     exit()
 
-# Load frames from the HDF5 file
-with h5py.File(file_path, 'r') as f:
-    if 'frames' not in f:
-        print("[ERROR] 'frames' dataset not found in file.")
-        exit()
-    frames = f['frames'][:]
+# Open the HDF5 file, frames are read a block at a time while playing instead of all up front
+try:
+    frames = H5VideoReader(file_path)
+except KeyError:
+    print("[ERROR] 'frames' dataset not found in file.")
+    exit()
 
 frame_count = len(frames)
 
 # ==== Configuration ====
-capture_fps = 120   # Original video capture rate (e.g., high-speed camera)
+capture_fps = frames.capture_fps or 120   # Original video capture rate, from the file if it was stored
 playback_fps = 30   # Desired slow-motion playback rate
 slowdown_factor = capture_fps / playback_fps
-delay = int(1000 / playback_fps)
 
 # ==== Duration calculations ====
 original_duration = frame_count / capture_fps
@@ -49,28 +49,23 @@ print(f"[INFO] Original capture rate: {capture_fps} FPS")
 print(f"[INFO] Intended playback rate: {playback_fps} FPS (Slow motion: {slowdown_factor:.1f}x)")
 print(f"[INFO] Original video duration: {original_duration:.2f} seconds")
 print(f"[INFO] Expected playback duration: {playback_duration:.2f} seconds")
-print("Press 'q' to quit early.\n")
+print("Press 'q' to quit early, space to pause, ',' '.' to step, 'a' 'd' to seek, '-' '+' for speed.\n")
 
 # Start playback timer
 start_time = time.time()
 
-# Playback loop
-for i, frame in enumerate(frames):
-    cv2.imshow("Slow Motion Playback - Press 'q' to quit", frame)
-    
-    key = cv2.waitKey(delay)
-    if key == ord('q') or key == 27:  # 'q' or ESC to quit
-        print("[INFO] Playback stopped by user.")
-        break
+# Playback loop, frames are shown on a deadline so the decode/draw time doesn't slow it down
+engine = play_video(frames, playback_fps, "Slow Motion Playback - Press 'q' to quit")
 
 end_time = time.time()
 actual_duration = end_time - start_time
-actual_fps = frame_count / actual_duration if actual_duration > 0 else 0
+actual_fps = engine.achieved_fps()
 
-cv2.destroyAllWindows()
+frames.close()
 
 # Final stats
 print("\n[INFO] Playback finished.")
 print(f"[INFO] Actual playback time: {actual_duration:.2f} seconds")
-print(f"[INFO] Actual FPS during playback: {actual_fps:.2f}")
-print(f"[INFO] Slowdown factor (actual): {capture_fps / actual_fps:.2f}x")
+print(f"[INFO] Actual FPS during playback: {actual_fps:.2f} ({engine.shown} shown, {engine.dropped} skipped)")
+if actual_fps > 0:
+    print(f"[INFO] Slowdown factor (actual): {capture_fps / actual_fps:.2f}x")
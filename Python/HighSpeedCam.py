@@ -12,7 +12,10 @@ from tkinter import filedialog # Explicit imports, no wildcard
 import numpy as np
 import cv2
 
-import zwoasi as asi
+if os.getenv('ZWO_SIMULATE'): # no camera attached, made up frames instead (see zwocapture/simcam.py)
+    from zwocapture import simcam as asi
+else:
+    import zwoasi as asi
 import h5py
 
 from PIL import Image, ImageTk 
@@ -24,6 +27,11 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolb
 import matplotlib.animation as animation
 import matplotlib.cm as cm
 
+from fiberdetect import (moments_centroid, dataset_centroids, iter_blocks, centroid_motion, parallel_centroids,
+                         find_recordings)
+from zwocapture import (FrameRingBuffer, AcquisitionThread, H5Recorder, H5VideoReader, find_gaps,
+                        play_video)
+
 
 
 class CameraApp:
@@ -62,6 +70,23 @@ class CameraApp:
         self.target_entry.insert(30, '30')
         self.target_entry.pack()
 
+        # Live buffer size, the oldest frames are overwritten once it is full
+        tk.Label(master, text="Buffer Memory (GB):").pack()
+        self.buffer_gb_entry = tk.Entry(master)
+        self.buffer_gb_entry.insert(0, "2")
+        self.buffer_gb_entry.pack()
+
+        # Record straight to an .h5 while the feed runs instead of saving the buffer afterwards
+        self.recorder = None
+        self.record_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(master, text="Record to Disk", variable=self.record_var).pack()
+
+        # Live view refresh, the camera runs at its own rate in the acquisition thread
+        tk.Label(master, text="Display Rate (Hz):").pack()
+        self.display_rate_entry = tk.Entry(master)
+        self.display_rate_entry.insert(0, "30")
+        self.display_rate_entry.pack()
+
         # Frame Rate Buttons
         self.framerate_button_frame = tk.Frame(master)
         self.framerate_button_frame.pack()
@@ -128,8 +153,22 @@ class CameraApp:
         self.analyze_button = tk.Button(self.button_frame, text="Analyze Centroids", command=self.analyze_saved_centroids)
         self.analyze_button.pack(side=tk.LEFT, padx=5, pady=5)
 
+        self.analyze_folder_button = tk.Button(self.button_frame, text="Analyze Folder", command=self.analyze_centroid_folder)
+        self.analyze_folder_button.pack(side=tk.LEFT, padx=5, pady=5)
+
         tk.Button(master, text="Find Centroid", command=self.find_centroid_in_current_frame).pack(pady=5)
 
+        # Centroid analysis options. refining fits a circle to every frame one at a time, ~0.5 ms per frame against
+        # ~0.03 ms for the block-wise moments, so it's off unless asked for
+        self.refine_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(master, text="Sub-pixel Refine (slow, ~0.5 ms/frame)", variable=self.refine_var).pack()
+        self.preview_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(master, text="Show Analysis Preview", variable=self.preview_var).pack()
+        tk.Label(master, text="Analysis Workers (1 = serial):").pack()
+        self.workers_entry = tk.Entry(master)
+        self.workers_entry.insert(0, str(os.cpu_count() or 1))
+        self.workers_entry.pack()
+
 
 
     def dummy_command(self):
@@ -261,9 +300,40 @@ class CameraApp:
             self.camera.set_control_value(asi.ASI_GAIN, gain_value)
             self.camera.set_control_value(asi.ASI_EXPOSURE, exposure_time)
 
+            # Start a new buffer sized for the ROI the camera actually gave us
+            width, height, _, _ = self.camera.get_roi_format()
+            try:
+                memory_gb = float(self.buffer_gb_entry.get())
+            except ValueError:
+                memory_gb = 2.0
+            self.frame_buffer = FrameRingBuffer(height, width, memory_gb=memory_gb)
+            print(f"[INFO] Frame buffer: {self.frame_buffer.capacity} frames ({self.frame_buffer.nbytes / 1024**3:.2f} GB)")
+
+            self.finish_recording()  # a recording that was stopped but never saved
+            if self.record_var.get():
+                filename = filedialog.asksaveasfilename(
+                    title="Record to",
+                    defaultextension=".h5",
+                    filetypes=[("HDF5 files", "*.h5"), ("All files", "*.*")]
+                )
+                if not filename:
+                    print("[INFO] Recording cancelled.")
+                    return
+                metadata = {
+                    "gain": self.gain_entry.get(),
+                    "exposure": self.exposure_entry.get(),
+                    "roi": str(self.current_roi),
+                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+                }
+                self.recorder = H5Recorder(filename, self.frame_buffer, metadata)
+                print(f"[INFO] Recording to {filename}")
+
             self.camera.start_video_capture()
+            self.acquisition = AcquisitionThread(self.camera, self.frame_buffer, timeout=1000)  # 1000 ms timeout
+            self.acquisition.start()
+            if self.recorder is not None:
+                self.recorder.start()
             self.streaming = True
-            self.live_captured_frames = []  # Start a new buffer
             self.stop_button.config(state=tk.NORMAL)
             self.start_button.config(state=tk.DISABLED)
             self.update_feed()
@@ -278,76 +348,61 @@ class CameraApp:
             self.stream_start_time = None
         if self.streaming:
             try:
+                self.acquisition.stop()  # thread has to be done grabbing before capture is stopped
                 self.camera.stop_video_capture()
                 self.streaming = False
                 self.start_button.config(state=tk.NORMAL)
                 self.stop_button.config(state=tk.DISABLED)
-                print("Video feed stopped.")
+                print(f"Video feed stopped. {self.acquisition.frame_count} frames at {self.acquisition.fps:.2f} fps")
         
             except Exception as e:
                 messagebox.showerror("Stop Failed", str(e))
             
 
+    def get_display_rate(self):
+        try:
+            return max(1.0, float(self.display_rate_entry.get()))
+        except ValueError:
+            return 30.0  # fallback/default
+
     def update_feed(self):
-        if not self.streaming:
+        # only draws, the frames are grabbed by self.acquisition
+        if not self.streaming or getattr(self, 'acquisition', None) is None:
             return
 
         try:
-            frame_start_time = time.time()
-            # Get ROI dimensions
-            width, height, _, _ = self.camera.get_roi_format()
+            if self.acquisition.error is not None:
+                raise self.acquisition.error
             if not self.roi_info_logged:
-                print(f"[INFO] ROI Format: width={width}, height={height}")
+                print(f"[INFO] ROI Format: width={self.frame_buffer.width}, height={self.frame_buffer.height}")
                 self.roi_info_logged = True
 
-            # Prepare buffer
-            expected_buffer_size = width * height  # Grayscale
-            buffer = bytearray(expected_buffer_size)
-            
-
-            # corrected argument order: timeout first
-            self.camera.get_video_data(1000, buffer)  # 1000 ms timeout
+            frame = self.acquisition.latest()
+            if frame is not None:
+                # Resize for display, makes a copy so the camera can keep writing
+                frame_resized = cv2.resize(frame, (640, 480))
 
-            actual_buffer_size = len(buffer)
-            if actual_buffer_size != expected_buffer_size:
-                raise ValueError(f"Unexpected buffer size. Expected {expected_buffer_size}, got {actual_buffer_size}")
+                # Convert to Tkinter-compatible image
+                img = Image.fromarray(frame_resized, mode='L')
+                imgtk = ImageTk.PhotoImage(image=img)
 
-            # Convert to numpy and reshape
-            frame = np.frombuffer(buffer, dtype=np.uint8).reshape((height, width))
-
-            # Resize for display
-            
-            frame_resized = cv2.resize(frame, (640, 480))
-
-            #reset roi to involve target
-                    # Save to live frame buffer
-            if not hasattr(self, 'live_captured_frames'):
-                self.live_captured_frames = []
-            self.live_captured_frames.append(frame.copy())  # Save original (not resized) frame
-            if len(self.live_captured_frames) > 9000000:
-                self.live_captured_frames.pop(0)
-
-
-            # Convert to Tkinter-compatible image
-            img = Image.fromarray(frame_resized, mode='L')
-            imgtk = ImageTk.PhotoImage(image=img)
-
-            # Update GUI frame
-            self.video_frame.configure(image=imgtk)
-            self.video_frame.image = imgtk  # prevent garbage collection
-            self.master.after(1, self.update_feed)
+                # Update GUI frame
+                self.video_frame.configure(image=imgtk)
+                self.video_frame.image = imgtk  # prevent garbage collection
+            self.master.after(int(1000 / self.get_display_rate()), self.update_feed)
 
         except Exception as e:
             print("\n[ERROR] Live feed failed.")
             print(f"Message: {e}")
             traceback.print_exc()
             print("[INFO] Stopping video feed...\n")
+            self.stop_feed()
             return
-       #self.master.after(30, self.update_feed)
         
     def on_close(self):
         if self.streaming:
             self.stop_feed()
+        self.finish_recording()
         self.master.destroy()
 
     def run_sanity_check(self):
@@ -402,11 +457,29 @@ class CameraApp:
             print("[ERROR] Sanity check failed:", e)
             traceback.print_exc()
 
+    def finish_recording(self):
+        '''closes the file of a Record to Disk run, the frames are already on disk so this is quick.
+        returns the filename, None if nothing was being recorded'''
+        if self.recorder is None:
+            return None
+        recorder, self.recorder = self.recorder, None
+        actual_fps = self.acquisition.fps
+        frame_count = recorder.close({"actual_fps": str(actual_fps if actual_fps > 0 else "unknown")})
+        print("\n[VIDEO SAVED]")
+        print(f"File: {recorder.filename}")
+        print(f"Frame Count: {frame_count}")
+        print(f"Actual FPS: {actual_fps:.2f}")
+        print()
+        return recorder.filename
+
     def save_last_frames(self):
         self.stop_feed()
-        if hasattr(self, 'live_captured_frames') and self.live_captured_frames:
-            if hasattr(self, 'capture_duration') and self.capture_duration > 0:
-                actual_fps = len(self.live_captured_frames) / self.capture_duration
+        if self.recorder is not None:
+            self.finish_recording()
+        elif hasattr(self, 'frame_buffer') and len(self.frame_buffer):
+            # rate the camera delivered at, measured in the acquisition thread
+            if self.acquisition.fps > 0:
+                actual_fps = self.acquisition.fps
             else:
                 actual_fps = "unknown"
 
@@ -415,11 +488,13 @@ class CameraApp:
                 "exposure": self.exposure_entry.get(),
                 "roi": str(self.current_roi),
                 "actual_fps": str(actual_fps),
-                "frame_count": len(self.live_captured_frames),
+                "frame_count": len(self.frame_buffer),
+                "dropped_frames": self.acquisition.dropped_frames,
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
             }
 
-            filename = self.save_capture_data_to_h5(self.live_captured_frames, metadata)
+            filename = self.save_capture_data_to_h5(self.frame_buffer.last_segments(), metadata,
+                                                    self.frame_buffer.last_stamps())
 
             if filename:
                 print("\n[VIDEO SAVED]")
@@ -430,12 +505,16 @@ class CameraApp:
                 print(f"ROI: {metadata['roi']}")
                 print(f"Frame Count: {metadata['frame_count']}")
                 print(f"Actual FPS: {metadata['actual_fps']}")
+                print(f"Dropped Frames: {metadata['dropped_frames']}")
                 print()
         else:
             print("[INFO] No frames captured. Nothing to save.")
 
 
-    def save_capture_data_to_h5(self, frames, metadata):
+    def save_capture_data_to_h5(self, segments, metadata, stamps=None):
+        '''segments is a list of (n, H, W) frame blocks oldest first (FrameRingBuffer.last_segments()),
+        they are written one after the other so the buffer never gets copied into one big array.
+        stamps is the (timestamps, dropped) pair from FrameRingBuffer.last_stamps()'''
         try:
             filename = filedialog.asksaveasfilename(
                 title="Save capture data",
@@ -449,7 +528,17 @@ class CameraApp:
             with h5py.File(filename, 'w') as h5f:
                 for key, value in metadata.items():
                     h5f.attrs[key] = value
-                h5f.create_dataset('frames', data=np.array(frames), compression="gzip")
+                frame_count = sum(len(segment) for segment in segments)
+                _, height, width = segments[0].shape
+                dset = h5f.create_dataset('frames', shape=(frame_count, height, width), dtype=np.uint8, compression="gzip")
+                start = 0
+                for segment in segments:
+                    dset[start:start + len(segment)] = segment
+                    start += len(segment)
+                if stamps is not None:
+                    timestamps, dropped = stamps
+                    h5f.create_dataset('timestamps', data=timestamps).attrs['units'] = 'ns, time.perf_counter_ns()'
+                    h5f.create_dataset('dropped_frames', data=dropped).attrs['units'] = "camera's get_dropped_frames() counter"
             print(f"[INFO] Data saved to {filename}")
             return filename
         except Exception as e:
@@ -473,13 +562,13 @@ class CameraApp:
             return
 
         try:
-            with h5py.File(file_path, 'r') as f:
-                if 'frames' not in f:
-                    messagebox.showerror("Data Error", "'frames' dataset not found.")
-                    return
-                frames = f['frames'][:]
-                # Try reading the stored capture FPS
-                capture_fps = float(f.attrs.get('actual_fps', 120))  # fallback default if not stored
+            try:
+                frames = H5VideoReader(file_path)  # frames are read while playing, not all up front
+            except KeyError:
+                messagebox.showerror("Data Error", "'frames' dataset not found.")
+                return
+            # Try reading the stored capture FPS
+            capture_fps = frames.capture_fps or 120  # fallback default if not stored
 
             frame_count = len(frames)
 
@@ -490,7 +579,6 @@ class CameraApp:
                 playback_fps = 30  # fallback
 
             slowdown_factor = capture_fps / playback_fps
-            delay = int(1000 / playback_fps)
             original_duration = frame_count / capture_fps
             expected_playback_duration = frame_count / playback_fps
 
@@ -502,27 +590,24 @@ class CameraApp:
             print(f"Slowdown Factor: {slowdown_factor:.2f}x")
             print(f"Original Duration: {original_duration:.2f} sec")
             print(f"Expected Playback Duration: {expected_playback_duration:.2f} sec")
-            print("Press 'q' to quit playback early.\n")
+            print("Press 'q' to quit playback early, space to pause, ',' '.' to step, 'a' 'd' to seek, '-' '+' for speed.\n")
 
             start_time = time.time()
 
-            for i, frame in enumerate(frames):
-                cv2.imshow("Slow Motion Playback - Press 'q' to Quit", frame)
-                key = cv2.waitKey(delay)
-                if key == ord('q') or key == 27:
-                    print("[INFO] Playback stopped by user.")
-                    break
+            # frames are shown on a deadline so the decode/draw time doesn't slow playback down
+            engine = play_video(frames, playback_fps, "Slow Motion Playback - Press 'q' to Quit")
 
             end_time = time.time()
             actual_duration = end_time - start_time
-            actual_fps = frame_count / actual_duration if actual_duration > 0 else 0
+            actual_fps = engine.achieved_fps()
 
-            cv2.destroyAllWindows()
+            frames.close()
 
             print(f"\n[INFO] Playback finished.")
             print(f"[INFO] Actual Playback Time: {actual_duration:.2f} sec")
-            print(f"[INFO] Actual FPS: {actual_fps:.2f}")
-            print(f"[INFO] Actual Slowdown Factor: {capture_fps / actual_fps:.2f}x")
+            print(f"[INFO] Actual FPS: {actual_fps:.2f} ({engine.shown} shown, {engine.dropped} skipped)")
+            if actual_fps > 0:
+                print(f"[INFO] Actual Slowdown Factor: {capture_fps / actual_fps:.2f}x")
 
         except Exception as e:
             messagebox.showerror("Playback Error", str(e))
@@ -531,6 +616,12 @@ class CameraApp:
     
 
 
+    def get_analysis_workers(self):
+        try:
+            return max(1, int(self.workers_entry.get()))
+        except ValueError:
+            return 1
+
     def analyze_saved_centroids(self):
         file_path = filedialog.askopenfilename(
             title="Select HDF5 or AVI File for Centroid Analysis",
@@ -545,14 +636,18 @@ class CameraApp:
         is_avi = file_path.lower().endswith('.avi')
 
         frames = []
+        reader = None
         try:
             if is_hdf5:
-                with h5py.File(file_path, 'r') as f:
-                    if 'frames' not in f:
-                        messagebox.showerror("Error", "No 'frames' dataset found in the HDF5 file.")
-                        return
-                    frames = f['frames'][:]
-                    capture_fps = getattr(self, 'capture_fps', float(f.attrs.get('actual_fps', 120)))
+                try:
+                    reader = H5VideoReader(file_path)
+                except KeyError:
+                    messagebox.showerror("Error", "No 'frames' dataset found in the HDF5 file.")
+                    return
+                frames = reader  # not loaded, the centroids are done block by block straight from the file
+                capture_fps = getattr(self, 'capture_fps', reader.capture_fps or 120)
+                # real time base when the file has per frame timestamps, evenly spaced from the fps otherwise
+                times = reader.times(capture_fps)
 
             elif is_avi:
                 cap = cv2.VideoCapture(file_path)
@@ -566,112 +661,53 @@ class CameraApp:
                     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
                     frames.append(gray)
                 cap.release()
+                frames = np.array(frames)
                 capture_fps = getattr(self, 'capture_fps', 120.0)  # Default if not in HDF5
+                times = np.arange(len(frames)) / capture_fps
 
             else:
                 messagebox.showerror("Error", "Unsupported file format.")
                 return
 
             print(f"\n[INFO] Loaded {len(frames)} frames from {file_path}")
+            gap_frames, gap_missing = find_gaps(times)
+            if len(gap_frames):
+                print(f"[WARNING] {len(gap_frames)} gaps in the time base, about {gap_missing.sum()} frames missing "
+                      f"(first before frame {gap_frames[0]}). Use the Time_s column, not the frame number, for timing.")
 
-            centroids = []
-            movements = []
-            movement_x = []
-            movement_y = []
-            last_centroid = None
             total_start = time.time()
 
-            for i, frame in enumerate(frames):
-                frame_start = time.time()
-                print(f"\n--- Frame {i+1} ---")
-
-                ret, thresh = cv2.threshold(frame, 127, 255, 0)
-                M = cv2.moments(thresh)
-                debug_frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-
-                if M["m00"] != 0:
-                    cX = int(M["m10"] / M["m00"])
-                    cY = int(M["m01"] / M["m00"])
-                    centroids.append((cX, cY))
-                    print(f"[Centroid] (X: {cX}, Y: {cY})")
-
-                    if last_centroid:
-                        dx = cX - last_centroid[0]
-                        dy = cY - last_centroid[1]
-                        dist = np.sqrt(dx**2 + dy**2)
-                        print(f"[Motion] ΔX: {dx}, ΔY: {dy}, Distance: {dist:.2f} pixels")
-                        movement_x.append(dx)
-                        movement_y.append(dy)
-                        movements.append(dist)
-                    else:
-                        print("[Motion] First valid centroid, no motion calculated.")
-                        movement_x.append(0)
-                        movement_y.append(0)
-                        movements.append(0)
-
-                    last_centroid = (cX, cY)
-                    cv2.circle(debug_frame, (cX, cY), 4, (0, 0, 255), -1)
-                else:
-                    centroids.append((None, None))
-                    movement_x.append(0)
-                    movement_y.append(0)
-                    movements.append(0)
-                    print("[Centroid] Not detected — empty or invalid frame.")
-
-                cv2.putText(debug_frame, f"Frame: {i+1}", (10, 25),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 1)
-
-                cv2.imshow("Centroid Debug Preview", debug_frame)
-                key = cv2.waitKey(1)
-                if key == 27:  # ESC
-                    print("[INFO] Debug preview interrupted by user.")
-                    break
-
-                frame_end = time.time()
-                print(f"[Timing] Frame processing time: {frame_end - frame_start:.4f} sec")
-
-            cv2.destroyAllWindows()
+            # headless, thresholded moments for whole blocks at once, then the sub-pixel circle fit per valid frame
+            workers = self.get_analysis_workers()
+            if is_hdf5 and workers > 1:
+                # chunk aligned shards of the file on a process pool, same numbers as the serial path
+                cX, cY, _, valid = parallel_centroids(file_path, threshold=127, refine=self.refine_var.get(),
+                                                      workers=workers)[file_path]
+            else:
+                cX, cY, _, valid = dataset_centroids(frames, threshold=127, refine=self.refine_var.get())
+            valid_frames = np.nonzero(valid)[0]
+            _, _, movements = centroid_motion(cX, cY, valid)
 
             total_end = time.time()
             total_time = total_end - total_start
-            avg_movement = np.mean([m for m in movements if m is not None])
-            max_movement = np.max([m for m in movements if m is not None])
+
+            if self.preview_var.get():
+                self.preview_centroids(frames, cX, cY, valid)
 
             print(f"\n========== SUMMARY ==========")
             print(f"Total Frames: {len(frames)}")
-            print(f"Frames with Valid Centroid: {len([c for c in centroids if c != (None, None)])}")
-            print(f"Average Movement: {avg_movement:.2f} pixels")
-            print(f"Max Movement: {max_movement:.2f} pixels")
+            print(f"Frames with Valid Centroid: {len(valid_frames)}")
+            print(f"Average Movement: {np.mean(movements):.2f} pixels")
+            print(f"Max Movement: {np.max(movements):.2f} pixels")
             print(f"Total Processing Time: {total_time:.2f} seconds")
-            print(f"Average Per Frame: {total_time / len(frames):.4f} seconds")
+            print(f"Average Per Frame: {total_time / len(frames):.6f} seconds ({len(frames) / total_time:.0f} fps)")
             print(f"==============================\n")
 
             # Ask to save CSV
             save_prompt = input("Do you want to save the centroid data to a CSV file? (y/n): ").strip().lower()
             if save_prompt == 'y':
                 csv_path = file_path.rsplit('.', 1)[0] + '_centroids.csv'
-                playback_fps = getattr(self, 'playback_fps', 30)
-                actual_playback_time = getattr(self, 'actual_playback_time', total_time)
-                actual_fps = getattr(self, 'actual_fps', playback_fps)
-                actual_slowdown_factor = getattr(self, 'actual_slowdown_factor', capture_fps / actual_fps if actual_fps else float('nan'))
-
-                with open(csv_path, 'w', newline='') as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(['Frame', 'Centroid_X', 'Centroid_Y',
-                                    'Movement_X (dX)', 'Movement_Y (dY)', 'Movement (pixels)',
-                                    'Original_FPS', 'Playback_FPS', 'Actual_Playback_Time_s',
-                                    'Actual_FPS', 'Actual_Slowdown_Factor'])
-
-                    for i, (centroid, dx, dy, move) in enumerate(zip(centroids, movement_x, movement_y, movements)):
-                        x, y = centroid if centroid != (None, None) else ('', '')
-                        dx = dx if centroid != (None, None) else ''
-                        dy = dy if centroid != (None, None) else ''
-                        move = move if centroid != (None, None) else ''
-                        writer.writerow([
-                            i, x, y, dx, dy, move,
-                            capture_fps, playback_fps, actual_playback_time,
-                            actual_fps, actual_slowdown_factor
-                        ])
+                self.write_centroid_csv(csv_path, times, cX, cY, valid, capture_fps)
                 print(f"[INFO] CSV saved to:\n{csv_path}")
             else:
                 print("[INFO] CSV not saved.")
@@ -679,17 +715,94 @@ class CameraApp:
         except Exception as e:
             print(f"[ERROR] Centroid analysis failed: {e}")
             traceback.print_exc()
+        finally:
+            if reader is not None:
+                reader.close()
+
+    def analyze_centroid_folder(self):
+        '''centroids for every .h5 recording in a folder on one process pool, a _centroids.csv is saved next to each'''
+        directory = filedialog.askdirectory(title="Select Folder of HDF5 Recordings")
+        if not directory:
+            print("[INFO] No folder selected.")
+            return
+        paths = find_recordings(directory)
+        if not paths:
+            print(f"[INFO] No .h5 files in {directory}")
+            return
+
+        try:
+            workers = self.get_analysis_workers()
+            print(f"[INFO] Analyzing {len(paths)} recordings with {workers} workers...")
+            start = time.time()
+            results = parallel_centroids(paths, threshold=127, refine=self.refine_var.get(), workers=workers)
+            print(f"[INFO] Centroids done in {time.time() - start:.2f} seconds")
+
+            for path in paths:
+                with H5VideoReader(path) as reader:
+                    capture_fps = getattr(self, 'capture_fps', reader.capture_fps or 120)
+                    times = reader.times(capture_fps)
+                cX, cY, _, valid = results[path]
+                csv_path = path.rsplit('.', 1)[0] + '_centroids.csv'
+                self.write_centroid_csv(csv_path, times, cX, cY, valid, capture_fps)
+                print(f"[INFO] {os.path.basename(path)}: {valid.sum()}/{len(valid)} valid, CSV saved to {csv_path}")
+        except Exception as e:
+            print(f"[ERROR] Folder analysis failed: {e}")
+            traceback.print_exc()
 
+    def write_centroid_csv(self, csv_path, times, cX, cY, valid, capture_fps):
+        '''one row per frame, the centroid and motion columns are blank for frames without a centroid'''
+        movement_x, movement_y, movements = centroid_motion(cX, cY, valid)
+        playback_fps = getattr(self, 'playback_fps', 30)
+        # expected playback length at playback_fps, the analysis run time used to end up here which made every CSV different
+        actual_playback_time = getattr(self, 'actual_playback_time', len(cX) / playback_fps)
+        actual_fps = getattr(self, 'actual_fps', playback_fps)
+        actual_slowdown_factor = getattr(self, 'actual_slowdown_factor', capture_fps / actual_fps if actual_fps else float('nan'))
+
+        with open(csv_path, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['Frame', 'Time_s', 'Centroid_X', 'Centroid_Y',
+                            'Movement_X (dX)', 'Movement_Y (dY)', 'Movement (pixels)',
+                            'Original_FPS', 'Playback_FPS', 'Actual_Playback_Time_s',
+                            'Actual_FPS', 'Actual_Slowdown_Factor'])
+
+            for i in range(len(cX)):
+                if valid[i]:
+                    x, y, dx, dy, move = cX[i], cY[i], movement_x[i], movement_y[i], movements[i]
+                else:
+                    x = y = dx = dy = move = ''
+                writer.writerow([
+                    i, times[i], x, y, dx, dy, move,
+                    capture_fps, playback_fps, actual_playback_time,
+                    actual_fps, actual_slowdown_factor
+                ])
+
+    def preview_centroids(self, frames, cX, cY, valid):
+        '''steps through the frames with the found centroid drawn on, ESC stops it'''
+        for first, block in iter_blocks(frames):
+            for k, frame in enumerate(block):
+                i = first + k
+                debug_frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+                if valid[i]:
+                    cv2.circle(debug_frame, (round(cX[i]), round(cY[i])), 4, (0, 0, 255), -1)
+                cv2.putText(debug_frame, f"Frame: {i+1}", (10, 25),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 1)
 
+                cv2.imshow("Centroid Debug Preview", debug_frame)
+                key = cv2.waitKey(1)
+                if key == 27:  # ESC
+                    print("[INFO] Debug preview interrupted by user.")
+                    cv2.destroyAllWindows()
+                    return
+        cv2.destroyAllWindows()
 
 
 
     def find_centroid_in_current_frame(self):
-        if not hasattr(self, 'live_captured_frames') or not self.live_captured_frames:
+        if not hasattr(self, 'frame_buffer') or not len(self.frame_buffer):
             messagebox.showwarning("No Frame", "No frames captured yet.")
             return
 
-        frame = self.live_captured_frames[-1].copy()
+        frame = self.frame_buffer.latest()  # view, only read from below
 
         try:
             start_time = time.time()
@@ -701,19 +814,16 @@ class CameraApp:
             # Crop ROI from the frame
             roi_frame = frame[y:y + h, x:x + w]
 
-            # Threshold the ROI to binary
-            ret, thresh = cv2.threshold(frame, 127, 255, 0)
-
-            # Compute moments on ROI
-            M = cv2.moments(thresh)
+            # Threshold the ROI to binary and compute the centroid
+            centroid = moments_centroid(frame, threshold=127)
 
-            if M["m00"] == 0:
+            if centroid is None:
                 messagebox.showerror("Centroid Error", "Unable to compute centroid (m00 is zero).")
                 return
 
             # Centroid relative to ROI
-            cX = int(M["m10"] / M["m00"])
-            cY = int(M["m01"] / M["m00"])
+            cX = int(centroid.center[0])
+            cY = int(centroid.center[1])
             print(f"[CENTROID] Relative to ROI: ({cX}, {cY})")
 
             # Compute offset from center of ROI
@@ -4,7 +4,10 @@ from PIL import Image, ImageTk
 import cv2
 import numpy as np
 import os
-import zwoasi as asi
+if os.getenv('ZWO_SIMULATE'): # no camera attached, made up frames instead (see zwocapture/simcam.py)
+    from zwocapture import simcam as asi
+else:
+    import zwoasi as asi
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from time import time
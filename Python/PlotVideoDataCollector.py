@@ -5,6 +5,11 @@ from scipy.fft import fft, fftfreq
 from pathlib import Path
 from tkinter import Tk, filedialog
 
+from zwocapture.timebase import find_gaps, resample_uniform
+
+# per frame capture time, written by VideoDataCollector ("Time (s)") and HighSpeedCam's centroid analysis
+TIME_COLUMNS = ("Time (s)", "Time_s")
+
 # ─────── File Picker ───────
 def select_csv_file():
     root = Tk()
@@ -131,7 +136,21 @@ def plot_velocity_acceleration_components(df, frame_col):
     
 
 # ─────── Bode Plot ───────
-def plot_bode_subplot(df, fps):
+def even_signal(df, col, fps, times=None):
+    # with real frame times the signal is resampled onto an even grid first, the FFT assumes even sampling
+    # and a dropped frame would otherwise shift everything after it. returns (signal, sample rate)
+    signal = df[col].replace(0, np.nan)
+    if times is not None:
+        _, resampled, fps = resample_uniform(times, signal.to_numpy(dtype=float))
+        signal = pd.Series(resampled)
+    return signal.ffill().fillna(0), fps
+
+def plot_bode_subplot(df, fps, times=None):
+    if times is not None:
+        gap_frames, gap_missing = find_gaps(times)
+        if len(gap_frames):
+            print(f"{len(gap_frames)} gaps in the time base (~{gap_missing.sum()} frames missing), resampling")
+
     signals = [
         ("Displacement (Microns)", "Displacement (µm)"),
         ("Velocity (Microns/s)", "Velocity (µm/s)"),
@@ -143,13 +162,13 @@ def plot_bode_subplot(df, fps):
 
     for i, (col, label) in enumerate(signals):
         if col in df.columns:
-            signal = df[col].replace(0, np.nan).ffill().fillna(0)
+            signal, rate = even_signal(df, col, fps, times)
             n = len(signal)
             signal = signal - np.nanmean(signal)
             signal = np.nan_to_num(signal)
 
             yf = fft(signal)
-            xf = fftfreq(n, 1 / fps)
+            xf = fftfreq(n, 1 / rate)
             mask = xf > 0
             xf = xf[mask]
             yf = yf[mask]
@@ -191,4 +210,6 @@ if __name__ == "__main__":
     plot_xy_displacement(df, frame_col)
     plot_metrics_subplot(df, frame_col)
     plot_velocity_acceleration_components(df, frame_col)  # new plots for X/Y velocity & accel
-    plot_bode_subplot(df, fps)
+    time_col = next((col for col in TIME_COLUMNS if col in df.columns), None)
+    times = df[time_col].to_numpy(dtype=float) if time_col else None
+    plot_bode_subplot(df, fps, times)
@@ -6,6 +6,9 @@ from pathlib import Path
 from tqdm import tqdm
 from tkinter import Tk, filedialog
 
+from fiberdetect import contour_centroid
+from zwocapture import H5VideoReader
+
 # ─────────────────────── file selection popup ───────────────────────
 def select_file(title, filetypes):
     root = Tk()
@@ -16,9 +19,12 @@ def select_file(title, filetypes):
         raise FileNotFoundError("File selection cancelled.")
     return Path(path)
 
-TXT_PATH = select_file("Select FireCapture TXT file", [("Text files", "*.txt")])
-AVI_PATH = select_file("Select AVI video file", [("AVI files", "*.avi")])
-OUT_CSV  = AVI_PATH.with_suffix(".combined.csv")
+# a FireCapture AVI (+ its TXT) or one of our .h5 recordings, those carry a timestamp for every frame
+VIDEO_PATH = select_file("Select video file (FireCapture AVI or .h5 recording)",
+                         [("Video files", "*.avi *.h5"), ("AVI files", "*.avi"), ("H5 files", "*.h5")])
+IS_H5    = VIDEO_PATH.suffix.lower() == ".h5"
+TXT_PATH = None if IS_H5 else select_file("Select FireCapture TXT file", [("Text files", "*.txt")])
+OUT_CSV  = VIDEO_PATH.with_suffix(".combined.csv")
 
 # ─────────────────── 1. read metadata txt ──────────────────
 def read_firecapture_txt(path: Path) -> dict:
@@ -44,8 +50,25 @@ def read_firecapture_txt(path: Path) -> dict:
             continue
     return meta
 
-meta = read_firecapture_txt(TXT_PATH)
-print("Parsed FireCapture fields:", meta)
+def read_h5_meta(reader: H5VideoReader) -> dict:
+    # same fields as the FireCapture txt, from the attrs HighSpeedCam / video.py save
+    attrs = reader.attrs
+    return {
+        "date"            : str(attrs.get("timestamp", "NA")),
+        "frames_captured" : str(len(reader)),
+        "fps"             : str(attrs.get("actual_fps", "NA")),
+        "roi"             : str(attrs.get("roi", "NA")),
+        "shutter"         : str(attrs.get("exposure", "NA")),
+        "gain"            : str(attrs.get("gain", "NA")),
+    }
+
+if IS_H5:
+    reader = H5VideoReader(VIDEO_PATH)
+    meta = read_h5_meta(reader)
+    print("Parsed recording attrs:", meta)
+else:
+    meta = read_firecapture_txt(TXT_PATH)
+    print("Parsed FireCapture fields:", meta)
 
 # Fixed radius in pixels (given)
 FIXED_RADIUS_PIXELS = 14
@@ -59,35 +82,41 @@ print(f"Calculated microns per pixel: {microns_per_pixel:.4f}")
 
 # ───────────────── 2. per-frame centroid extraction ─────────────────
 def frame_centroid(gray: np.ndarray):
-    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    if not cnts:
-        return None, mask, None
-    cnt = max(cnts, key=cv2.contourArea)
-    M = cv2.moments(cnt)
-    if M["m00"] == 0:
-        return None, mask, cnt
-    cx = M["m10"] / M["m00"]
-    cy = M["m01"] / M["m00"]
-    return (cx, cy), mask, cnt
-
-cap = cv2.VideoCapture(str(AVI_PATH))
-if not cap.isOpened():
-    raise FileNotFoundError(f"Cannot open {AVI_PATH}")
-
-n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    centroid = contour_centroid(gray)  # Otsu threshold, largest blob
+    if centroid is None:
+        return None, None
+    return centroid.center, centroid.contour
+
+if IS_H5:
+    n_frames = len(reader)
+else:
+    cap = cv2.VideoCapture(str(VIDEO_PATH))
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Cannot open {VIDEO_PATH}")
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+def read_frames():
+    # (gray, bgr) for every frame, the bgr one is only drawn on for the preview
+    if IS_H5:
+        for _, block in reader.iter_blocks():
+            for gray in block:
+                yield gray, cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        return
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), frame
+    cap.release()
+
 records  = []
 
 preview = True  # Show centroid overlay
 
 with tqdm(total=n_frames, desc="Centroids") as bar:
     idx = 0
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            break
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        c, mask, cnt = frame_centroid(gray)
+    for gray, frame in read_frames():
+        c, cnt = frame_centroid(gray)
         if c is not None:
             records.append((idx, *c, FIXED_RADIUS_PIXELS))
             if preview:
@@ -105,14 +134,23 @@ with tqdm(total=n_frames, desc="Centroids") as bar:
 
         idx += 1
         bar.update()
-cap.release()
 cv2.destroyAllWindows()
 
 df = pd.DataFrame(records, columns=["frame", "x", "y", "radius"])
 
 # ─────────────── 3. displacement, velocity, acceleration in pixels ───────────────
-fps = float(meta.get("fps", 1))  # fallback to 1 if not available
-dt = 1 / fps
+try:
+    fps = float(meta.get("fps", 1))
+except ValueError:  # 'NA' or 'unknown'
+    fps = 1.0  # fallback to 1 if not available
+if IS_H5:
+    # real capture time of every frame, dropped frames show up as longer steps instead of shifting the rest
+    df["time"] = reader.times(fallback_fps=fps)[:len(df)]
+    reader.close()
+else:
+    df["time"] = df["frame"] / fps
+dt = df["time"].diff()
+dt = dt.where(dt > 0)  # two frames with the same stamp give no velocity rather than an infinite one
 
 first = df.dropna(subset=['x', 'y']).iloc[0][["x", "y"]].to_numpy()
 df["dx"] = df["x"] - first[0]
@@ -150,7 +188,7 @@ for key in ["fps", "date", "duration", "frames_captured", "roi", "shutter", "gai
 
 # ─────────────── 6. format headers + save ───────────────
 ordered = [
-    "frame", "x", "y", "radius", "Radius (Microns)", "Microns per Pixel",
+    "frame", "time", "x", "y", "radius", "Radius (Microns)", "Microns per Pixel",
     "dx", "dy", "dx (Microns)", "dy (Microns)",
     "displacement", "Displacement (Microns)",
     "vx", "vy", "vx (Microns/s)", "vy (Microns/s)",
@@ -162,7 +200,7 @@ ordered = [
 df = df[ordered]
 
 column_labels = {
-    "frame": "Frame",
+    "frame": "Frame", "time": "Time (s)",
     "x": "X (Pixels)", "y": "Y (Pixels)",
     "radius": "Radius (Pixels)", "Radius (Microns)": "Radius (Microns)",
     "Microns per Pixel": "Microns per Pixel",
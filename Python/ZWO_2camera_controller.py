@@ -9,17 +9,19 @@ import csv
 import os
 from tkinter import *
 from time import sleep
-import ctypes.wintypes
-import zwoasi as asi
+if os.getenv('ZWO_SIMULATE'): # no camera attached, made up frames instead (see zwocapture/simcam.py)
+    from zwocapture import simcam as asi
+else:
+    import zwoasi as asi
 import sys
 import h5py
+from zwocapture import FrameRingBuffer, AcquisitionThread, H5Recorder, align_streams
 
 from matplotlib.figure import Figure 
 from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg,  NavigationToolbar2Tk) 
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import matplotlib.cm as cm
-import ctypes.wintypes
 
 
 global camera1,camera2,num_cameras
@@ -33,6 +35,7 @@ default_params['n_frames']=10000
 default_params['roi_size']=64
 default_params['TXT_prefix']='2cam_'
 default_params['Folder']='/zwo_2cam'
+BUFFER_MB=64 #per camera, frames wait in here until the writer has them on disk, doesn't grow with n_frames
 
 paramstxt=['Frame_Rate','n_frames','roi_size_8','File_prefix','Folder']
 paramskeys=paramstxt
@@ -42,15 +45,6 @@ window.title("Dual ZWO camera control")
 window.geometry('800x1300')   
 
 
-def utcnow_microseconds():
-    system_time = ctypes.wintypes.FILETIME()
-    #system call used by time.time()
-    #ctypes.windll.kernel32.GetSystemTimeAsFileTime(ctypes.byref(system_time))
-    #getting high precision:
-    ctypes.windll.kernel32.GetSystemTimePreciseAsFileTime(ctypes.byref(system_time))
-    large = (system_time.dwHighDateTime << 32) + system_time.dwLowDateTime
-    return large // 10 - 11644473600000000
-
 def get_date_filename(folder,text_string):
     '''default filename using date and time. 
     creates a directory for each day and returns the file string to be used'''    
@@ -210,91 +204,91 @@ def quit_callback():
                 camera2.close()
         exit()
 
-def start_measurement_callback():
-        rate=int(entry_rate.get())
-        irate=1e6/rate
-        nframes = int(entry_nframes.get())
-        roisize=int(entry_roisize.get())
-        global camera1,camera2,num_cameras
-        global fig,ax1,ax2,canvas
-        #first get an image from each camera, check for brightest pixel and see if ROIxROI fits around it
-        #make sure it's full frame first
-        camera1.set_roi()
-        im1 = camera1.capture()
-        max_y,max_x = im1.shape
+def roi_around_brightest(camera,roisize,name):
+        #full frame shot, check for brightest pixel and see if ROIxROI fits around it, otherwise take the middle
+        camera.set_roi()
+        im = camera.capture()
+        max_y,max_x = im.shape
         print('max_y,max_x',max_y,max_x)
-        maxpix1 = np.unravel_index(np.argmax(im1, axis=None), im1.shape)
-        start_x = int(maxpix1[1] - roisize/2)
-        start_y = int(maxpix1[0] - roisize/2)
+        maxpix = np.unravel_index(np.argmax(im, axis=None), im.shape)
+        start_x = int(maxpix[1] - roisize/2)
+        start_y = int(maxpix[0] - roisize/2)
         if ((start_x<0) or(start_y<0) or ((start_x+roisize)>max_x) or ((start_y + roisize) > max_y)):
                 #roi outside image
                 start_x=int(max_x/2 - roisize/2)
                 start_y=int(max_y/2 - roisize/2)
-        print('cam1 startx,y,roisize',start_x,start_y,roisize)
-        camera1.set_roi(start_x=start_x,start_y=start_y,width=roisize,height=roisize)
-        camera1.start_video_capture()
-        cam1_images=[]
+        print(name+' startx,y,roisize',start_x,start_y,roisize)
+        camera.set_roi(start_x=start_x,start_y=start_y,width=roisize,height=roisize)
 
-        if num_cameras==2:
-                camera2.set_roi()
-                im2 = camera2.capture()
-                max_y,max_x = im2.shape
-                print('max_y,max_x',max_y,max_x)
-                maxpix2 = np.unravel_index(np.argmax(im2, axis=None), im2.shape)
-                start_x = int(maxpix2[1] - roisize/2)
-                start_y = int(maxpix2[0] - roisize/2)
-                if ((start_x<0) or(start_y<0) or ((start_x+roisize)>max_x) or ((start_y + roisize) > max_y)):
-                        #if roi is outside image
-                        start_x=int(max_x/2 - roisize/2)
-                        start_y=int(max_y/2 - roisize/2)
-                print('cam2 startx,y',start_x,start_y)
-                camera2.set_roi(start_x=start_x,start_y=start_y,width=roisize,height=roisize)
-                camera2.start_video_capture()
-                cam2_images=[]
-        
-        
-        t_start=time.time()
-        tstart=utcnow_microseconds()
-
-        for i in range(nframes):
-                tlast=utcnow_microseconds()
-                im1=camera1.capture_video_frame(timeout=1000)
-                cam1_images.append(im1)
-                
-                if num_cameras==2:
-                        im2=camera2.capture_video_frame(timeout=1000)
-                        cam2_images.append(im2)
-                while(utcnow_microseconds()-tlast)<irate:
-                        continue
-
-        t_stop=time.time()
-        actual_rate = nframes/(t_stop-t_start)
-        print('actual rate: ',actual_rate)
-        camera1.stop_video_capture()
-        if num_cameras==2:
-                camera2.stop_video_capture()
-        outdict={}
-        outdict['cam_'+entry_cam1_id.get()+'_images']=cam1_images
-        if num_cameras==2:
-                outdict['cam_'+entry_cam2_id.get()+'_images']=cam2_images
-        outdict['rate']=actual_rate
-        #save to file
+def start_measurement_callback():
+        rate=int(entry_rate.get()) #0 runs both cameras as fast as they go
+        nframes = int(entry_nframes.get())
+        roisize=int(entry_roisize.get())
+        global camera1,camera2,num_cameras
+        global fig,ax1,ax2,canvas
+        cameras=[camera1,camera2] if num_cameras==2 else [camera1]
+        names=['cam_'+entry_cam1_id.get(),'cam_'+entry_cam2_id.get()][:len(cameras)]
+        buffers={}
+        camera_attrs={}
+        for n,(name,camera) in enumerate(zip(names,cameras)):
+                roi_around_brightest(camera,roisize,'cam%d' % (n+1))
+                buffers[name]=FrameRingBuffer(roisize,roisize,capacity=max(2,min(nframes,BUFFER_MB*2**20//(roisize*roisize))))
+                camera_attrs[name]={'camera_id':name[4:],
+                                    'gain':camera.get_control_value(asi.ASI_GAIN)[0],
+                                    'exposure':camera.get_control_value(asi.ASI_EXPOSURE)[0],
+                                    'roi':str(camera.get_roi())}
+
+        #frames go to disk as they come in, chunked and compressed, one group per camera
         folder=entry_folder.get()
         prefix=entry_prefix.get()
         filename=get_date_filename(folder,prefix)
         print(filename)
-        save_dict_to_h5(outdict,filename=filename)
+        recorder=H5Recorder(filename,buffers,
+                            attrs={'requested_rate':rate,'n_frames':nframes,'roi_size':roisize,
+                                   'timestamp':time.strftime("%Y-%m-%d %H:%M:%S")},
+                            group_attrs=camera_attrs,frames_per_chunk=max(1,2**20//(roisize*roisize)),
+                            compression='lzf')
+        for camera in cameras:
+                camera.start_video_capture()
+
+        #one thread per camera so they grab at the same time instead of one after the other. both pace on the same grid
+        #of deadlines (sleep until just before, spin the rest, see zwocapture/clock.py) so frame i of each lines up
+        start_time=time.perf_counter()+0.05
+        threads=[AcquisitionThread(camera,buffers[name],rate=rate or None,start_time=start_time,max_frames=nframes)
+                 for name,camera in zip(names,cameras)]
+        recorder.start()
+        for thread in threads:
+                thread.start()
+        for thread in threads:
+                thread.join()
+        for camera in cameras:
+                camera.stop_video_capture()
+        recorder.stop()
+
+        rates=[]
+        times=[]
+        group_attrs={}
+        for name,thread in zip(names,threads):
+                if thread.error is not None:
+                        print('[ERROR] '+name+' acquisition failed: '+str(thread.error))
+                rates.append(thread.fps)
+                times.append(recorder.timestamps(name)/1e9)
+                group_attrs[name]={'actual_fps':thread.fps,'missed_deadlines':thread.missed_deadlines,
+                                   'camera_dropped_frames':thread.dropped_frames}
+                print(name+' actual rate: %.1f, %d frames, %d missed deadlines, %d dropped by the camera'
+                      % (thread.fps,len(times[-1]),thread.missed_deadlines,thread.dropped_frames))
+        datasets={}
+        if len(cameras)==2:
+                #frame pairs taken at the same time, by timestamp so a missed deadline on one camera doesn't shift the rest
+                index1,index2,offsets=align_streams(times[0],times[1],tolerance=0.5/rate if rate else None)
+                datasets['aligned_index']=np.stack([index1,index2],axis=1)
+                if len(offsets):
+                        print('aligned pairs: %d, cam2-cam1 offset median %.3f ms, max %.3f ms'
+                              % (len(offsets),np.median(offsets)*1e3,np.abs(offsets).max()*1e3))
+        actual_rate=min(rates)
+        print('actual rate: ',actual_rate)
+        recorder.close(attrs={'rate':actual_rate},group_attrs=group_attrs,datasets=datasets)
         return
-        
-def save_dict_to_h5(ddict,filename='star_images.h5', initialdir="../zwo_2cam"):
-    #use group with attributes to mock up dictionary, save to h5 file 'h5f'
-    #h5file=initialdir+'\\'+filename
-    h5file = filename
-    keys=ddict.keys()
-    with h5py.File(h5file,'w') as h5f:
-        for key in keys:
-            h5f.create_dataset(key,data=np.array(ddict[key]))
-        h5f.close()
 
 settings_label=Label(window,text='Camera settings',font = "Helvetica 14 bold")
 settings_label.pack(side=TOP)
@@ -0,0 +1,12 @@
+"""
+Detection code shared by the fiber finder apps, no tkinter in here so it can be run headless.
+Everything takes a numpy frame and gives back the NamedTuples in results.py
+"""
+from .results import Circle, RefinedCircle, Centroid
+from .hough import (circle_offsets, vote_circles, vote_circles_gradient, vote, find_peaks, detect_circles,
+                    detect_circles_pyramid, VOTING_MODES, DEFAULT_THRESHOLDS)
+from .refine import edge_points, fit_circle_kasa, fit_circle_lm, refine_circle, refine_centroid
+from .centroid import moments_centroid, contour_centroid
+from .lens import detect_lens
+from .batch import moments_centroids, block_size, iter_blocks, dataset_centroids, centroid_motion
+from .parallel import shard_ranges, parallel_centroids, find_recordings
@@ -0,0 +1,75 @@
+"""
+Batch centroiding for recorded videos. Same thresholded binary moments as moments_centroid,
+but a whole (N, H, W) block is done with numpy reductions instead of one cv2.moments call per frame.
+"""
+import numpy as np
+
+from .refine import refine_circle
+
+
+def moments_centroids(frames, threshold=127):
+    '''centroids of every pixel brighter than threshold for a (N, H, W) uint8 block.
+    returns cx, cy, m00 and a valid mask (False where nothing was above threshold, cx/cy are nan there)'''
+    frames = np.asarray(frames)
+    mask = (frames > threshold).view(np.uint8)
+    # project onto the axes first, then the first moments are just the projections against a coordinate ramp
+    rows = np.add.reduce(mask, axis=2, dtype=np.int32) # (N, H)
+    cols = np.add.reduce(mask, axis=1, dtype=np.int32) # (N, W)
+    m00 = rows.sum(axis=1, dtype=np.int64)
+    m10 = cols @ np.arange(frames.shape[2], dtype=np.int64)
+    m01 = rows @ np.arange(frames.shape[1], dtype=np.int64)
+    valid = m00 > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cx = np.where(valid, m10 / m00, np.nan)
+        cy = np.where(valid, m01 / m00, np.nan)
+    return cx, cy, m00, valid
+
+
+def block_size(frames, target_bytes=64 * 1024**2):
+    '''frames per block, a whole number of h5 chunks (if frames is a chunked dataset) about target_bytes big'''
+    frame_bytes = int(np.prod(frames.shape[1:]))
+    n = max(1, target_bytes // frame_bytes)
+    chunks = getattr(frames, 'chunks', None)
+    if chunks:
+        n = max(chunks[0], n // chunks[0] * chunks[0])
+    return n
+
+
+def iter_blocks(frames, block_frames=None, start=0, stop=None):
+    '''yields (first frame number, (n, H, W) array) blocks of an array or h5 dataset'''
+    if block_frames is None:
+        block_frames = block_size(frames)
+    stop = len(frames) if stop is None else stop
+    for first in range(start, stop, block_frames):
+        yield first, frames[first:min(first + block_frames, stop)]
+
+
+def dataset_centroids(frames, threshold=127, block_frames=None, refine=False, start=0, stop=None):
+    '''moments_centroids over a whole array or h5 dataset, read block by block so it never has to fit in memory.
+    refine=True puts the found centroids through refine_circle (like refine_centroid) for sub-pixel centers,
+    that is one python call per frame (~0.5 ms each against ~0.03 ms for the moments) so it's off by default.
+    returns cx, cy, m00, valid for frames start..stop'''
+    stop = len(frames) if stop is None else stop
+    cx = np.full(stop - start, np.nan)
+    cy = np.full(stop - start, np.nan)
+    m00 = np.zeros(stop - start, dtype=np.int64)
+    valid = np.zeros(stop - start, dtype=bool)
+    for first, block in iter_blocks(frames, block_frames, start, stop):
+        i = first - start
+        sl = slice(i, i + len(block))
+        cx[sl], cy[sl], m00[sl], valid[sl] = moments_centroids(block, threshold)
+        if refine:
+            for k in np.nonzero(valid[sl])[0]:
+                (cx[i + k], cy[i + k]), _, _ = refine_circle(block[k], (cx[i + k], cy[i + k]), np.sqrt(m00[i + k] / np.pi))
+    return cx, cy, m00, valid
+
+
+def centroid_motion(cx, cy, valid):
+    '''frame to frame motion from the previous valid centroid, 0 for the first one and for frames without a centroid.
+    returns dx, dy, distance'''
+    dx = np.zeros(len(cx))
+    dy = np.zeros(len(cy))
+    valid_frames = np.nonzero(valid)[0]
+    dx[valid_frames[1:]] = np.diff(cx[valid_frames])
+    dy[valid_frames[1:]] = np.diff(cy[valid_frames])
+    return dx, dy, np.sqrt(dx**2 + dy**2)
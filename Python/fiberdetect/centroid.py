@@ -0,0 +1,38 @@
+"""
+Centroid detectors, the thresholded moments one used by Centroid/GlueCode/HighSpeedCam and
+the largest contour one used by micron_per_DAC and VideoDataCollector.
+"""
+import numpy as np
+import cv2
+
+from .results import Centroid
+
+
+def moments_centroid(image, threshold=127):
+    '''centroid of every pixel brighter than threshold. returns a Centroid, or None if nothing is above threshold'''
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(image, threshold, 255, cv2.THRESH_BINARY)
+    M = cv2.moments(thresh, binaryImage=True)
+    if M["m00"] == 0:
+        return None
+    return Centroid((M["m10"] / M["m00"], M["m01"] / M["m00"]), M["m00"])
+
+
+def contour_centroid(image, threshold=None):
+    '''centroid of the largest bright blob. threshold=None picks it with Otsu.
+    returns a Centroid with the contour, or None if there is no blob'''
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if threshold is None:
+        _, mask = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    else:
+        _, mask = cv2.threshold(image, threshold, 255, cv2.THRESH_BINARY)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    contour = max(contours, key=cv2.contourArea)
+    M = cv2.moments(contour)
+    if M["m00"] == 0:
+        return None
+    return Centroid((M["m10"] / M["m00"], M["m01"] / M["m00"]), M["m00"], contour)
@@ -0,0 +1,172 @@
+"""
+Circle Hough transform used to find the fiber tip in the ZWO frames.
+The accumulator is filled with numpy instead of the python midpoint loop that used to live in FIBERFINDERv4.process_image
+"""
+import heapq
+
+import numpy as np
+import cv2
+from scipy import ndimage
+
+from .results import Circle
+
+
+def circle_offsets(radius):
+    '''(row, col) offsets of the midpoint circle of a given radius.
+    same 8 octants and same duplicate points as the old fill_acc_array loop so the vote counts match'''
+    rows = []
+    cols = []
+    x = radius
+    y = 0
+    decision = 1 - x
+    while y <= x:
+        rows += [x, y, -x, -y, -x, -y, x, y]
+        cols += [y, x, y, x, -y, -x, -y, -x]
+        y += 1
+        if decision <= 0:
+            decision += 2 * y + 1
+        else:
+            x -= 1
+            decision += 2 * (y - x) + 1
+    return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+
+
+def vote_circles(edge_image, radii=range(20, 55), max_votes=2**24):
+    '''fills the (height, width, len(radii)) accumulator from every edge pixel of a canny image.
+    only the radius band that is searched is allocated, index k of the last axis is radii[k]'''
+    radii = list(radii)
+    height, width = edge_image.shape
+    acc_array = np.zeros((height, width, len(radii)), dtype=np.uint16)
+
+    edge_rows, edge_cols = np.nonzero(edge_image == 255)
+    if len(edge_rows) == 0:
+        return acc_array
+
+    for k, radius in enumerate(radii):
+        d_rows, d_cols = circle_offsets(radius)
+        plane = np.zeros(height * width, dtype=np.int64)
+        # chunk the edge pixels so the vote index arrays stay a sane size on full frames
+        step = max(1, max_votes // len(d_rows))
+        for start in range(0, len(edge_rows), step):
+            rows = edge_rows[start:start + step, None] + d_rows[None, :]
+            cols = edge_cols[start:start + step, None] + d_cols[None, :]
+            inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width) # votes that land off the image are dropped
+            plane += np.bincount(rows[inside] * width + cols[inside], minlength=height * width)
+        acc_array[:, :, k] = plane.reshape(height, width)
+    return acc_array
+
+
+def vote_circles_gradient(edge_image, blur_image, radii=range(20, 55)):
+    '''same accumulator as vote_circles but each edge pixel only votes along its sobel gradient direction.
+    one vote each way (+/- normal) per radius so it works for bright and dark fibers, about 2 votes per radius instead of ~8r'''
+    radii = list(radii)
+    height, width = edge_image.shape
+    acc_array = np.zeros((height, width, len(radii)), dtype=np.uint16)
+
+    edge_rows, edge_cols = np.nonzero(edge_image == 255)
+    grad_x = cv2.Sobel(blur_image, cv2.CV_32F, 1, 0, ksize=3)[edge_rows, edge_cols]
+    grad_y = cv2.Sobel(blur_image, cv2.CV_32F, 0, 1, ksize=3)[edge_rows, edge_cols]
+    magnitude = np.hypot(grad_x, grad_y)
+    keep = magnitude > 0 # flat pixels have no direction to vote along
+    edge_rows, edge_cols = edge_rows[keep], edge_cols[keep]
+    normal_rows = grad_y[keep] / magnitude[keep]
+    normal_cols = grad_x[keep] / magnitude[keep]
+    if len(edge_rows) == 0:
+        return acc_array
+
+    # so few votes that they can all be scattered straight into the accumulator in one go
+    steps = np.concatenate([np.array(radii), -np.array(radii)])[:, None]
+    rows = np.rint(edge_rows[None, :] + steps * normal_rows[None, :]).astype(np.int64)
+    cols = np.rint(edge_cols[None, :] + steps * normal_cols[None, :]).astype(np.int64)
+    k = np.broadcast_to(np.tile(np.arange(len(radii)), 2)[:, None], rows.shape)
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    np.add.at(acc_array.reshape(-1), (rows[inside] * width + cols[inside]) * len(radii) + k[inside], 1)
+    return acc_array
+
+
+# full circle voting gets ~8r votes per edge pixel, gradient voting only 2, so the peaks are a lot lower
+VOTING_MODES = ('full', 'gradient')
+DEFAULT_THRESHOLDS = {'full': 90, 'gradient': 30}
+
+
+def vote(edge_image, blur_image, radii=range(20, 55), mode='full'):
+    '''fills the accumulator with the selected voting mode, see VOTING_MODES'''
+    if mode == 'full':
+        return vote_circles(edge_image, radii)
+    if mode == 'gradient':
+        return vote_circles_gradient(edge_image, blur_image, radii)
+    raise ValueError(f"Unknown voting mode '{mode}', expected one of {VOTING_MODES}")
+
+
+def find_peaks(acc_array, radii=range(20, 55), min_distance=30, threshold=90, top_k=10):
+    '''3-D non-maximum suppression of the accumulator.
+    a cell is a candidate if it is the max of its (2*min_distance+1)^2 neighbourhood over every radius and above threshold.
+    candidates go through a heap (highest score, then lowest row/col/radius) so the result is deterministic,
+    and ones closer than min_distance to a better circle are dropped (plateaus give several equal maxima).
+    returns up to top_k Circle((x, y), radius, score) ranked best first, x is the column and y the row'''
+    radii = list(radii)
+    # the neighbourhood spans every radius, so collapse that axis first and filter a 2-D plane instead of the whole volume
+    best_k = np.argmax(acc_array, axis=2)
+    best_score = np.take_along_axis(acc_array, best_k[:, :, None], axis=2)[:, :, 0]
+    local_max = ndimage.maximum_filter(best_score, size=2 * min_distance + 1, mode='constant', cval=0)
+    rows, cols = np.nonzero((best_score == local_max) & (best_score > threshold))
+    ks = best_k[rows, cols]
+
+    heap = list(zip(-best_score[rows, cols].astype(np.int64), rows, cols, ks))
+    heapq.heapify(heap)
+    circles = []
+    while heap and (top_k is None or len(circles) < top_k):
+        neg_score, row, col, k = heapq.heappop(heap)
+        if any(abs(x - col) <= min_distance and abs(y - row) <= min_distance for (x, y), _, _ in circles):
+            continue
+        circles.append(Circle((int(col), int(row)), radii[k], int(-neg_score)))
+    return circles
+
+
+def detect_circles(image, radii=range(20, 55), blur_size=9, canny_low=75, canny_high=150, threshold=None, mode='full',
+                   min_distance=30):
+    '''blur, canny, vote and peak search in one call. image is the grayscale camera frame, returns ranked circles'''
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS[mode]
+    blur_image = cv2.GaussianBlur(image, (blur_size, blur_size), 0)
+    edged_image = cv2.Canny(blur_image, canny_low, canny_high)
+    acc_array = vote(edged_image, blur_image, radii, mode=mode)
+    return find_peaks(acc_array, radii, min_distance=min_distance, threshold=threshold)
+
+
+def detect_circles_pyramid(image, radii=range(20, 55), scale=4, blur_size=9, canny_low=75, canny_high=150,
+                           threshold=None, mode='full', min_distance=30, top_k=10):
+    '''coarse to fine search. the frame is shrunk by scale (4 or 8), circles are found there with scaled radii
+    and then each one is refined at full resolution in a small window around it.
+    returns the same ranked Circle list as detect_circles, scores are the full resolution ones'''
+    radii = list(radii)
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS[mode]
+    height, width = image.shape[:2]
+
+    # coarse pass, the circumference (and so the votes) shrinks with the scale too
+    small = cv2.resize(image, (width // scale, height // scale), interpolation=cv2.INTER_AREA)
+    small_radii = range(max(2, radii[0] // scale), -(-radii[-1] // scale) + 1)
+    small_blur = max(3, (blur_size // scale) | 1)
+    candidates = detect_circles(small, small_radii, small_blur, canny_low, canny_high,
+                                threshold=threshold / scale, mode=mode, min_distance=max(2, min_distance // scale))
+
+    circles = []
+    for (x, y), radius, _ in candidates[:top_k]:
+        # only the radii the coarse radius could have come from
+        fine_radii = [r for r in radii if abs(r - radius * scale) <= scale]
+        if not fine_radii:
+            continue
+        half = fine_radii[-1] + 2 * scale + blur_size
+        cx, cy = x * scale + scale // 2, y * scale + scale // 2
+        x0, y0 = max(0, cx - half), max(0, cy - half)
+        x1, y1 = min(width, cx + half + 1), min(height, cy + half + 1)
+        found = detect_circles(image[y0:y1, x0:x1], fine_radii, blur_size, canny_low, canny_high,
+                               threshold=threshold, mode=mode)
+        if found:
+            (fx, fy), fine_radius, score = found[0]
+            center = (fx + x0, fy + y0)
+            if center not in [c.center for c in circles]:
+                circles.append(Circle(center, fine_radius, score))
+    circles.sort(key=lambda c: (-c.score, c.center[1], c.center[0]))
+    return circles
@@ -0,0 +1,21 @@
+"""
+Lens / ferrule detection with cv2.HoughCircles, moved out of lensedetect.process_image
+"""
+import cv2
+
+from .results import Circle
+
+
+def detect_lens(image, median_size=5, min_dist=None, param1=100, param2=30, min_radius=1, max_radius=30):
+    '''median blur then HoughCircles. min_dist defaults to an eighth of the image height like lensedetect used.
+    returns a list of Circle (score is None, HoughCircles doesn't report votes)'''
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = cv2.medianBlur(image, median_size)
+    if min_dist is None:
+        min_dist = gray.shape[0] / 8
+    circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, 1, min_dist,
+                               param1=param1, param2=param2, minRadius=min_radius, maxRadius=max_radius)
+    if circles is None:
+        return []
+    return [Circle((float(x), float(y)), float(r)) for x, y, r in circles[0, :, :3]]
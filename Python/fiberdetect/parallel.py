@@ -0,0 +1,59 @@
+"""
+Process pool centroid analysis for recorded .h5 files. A file's 'frames' dataset is cut into chunk aligned shards,
+every worker opens the file read only and does dataset_centroids on its shard, and the results are put back in frame order.
+Shards of several files go into the same pool so a whole folder of recordings keeps every core busy.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import h5py
+
+from .batch import block_size, dataset_centroids
+
+
+def shard_ranges(n_frames, chunk_frames, n_shards):
+    '''splits frames 0..n_frames into about n_shards (start, stop) ranges that start on a chunk boundary'''
+    chunks = -(-n_frames // chunk_frames)
+    step = max(1, -(-chunks // n_shards)) * chunk_frames
+    return [(start, min(start + step, n_frames)) for start in range(0, n_frames, step)]
+
+
+def _centroid_shard(path, start, stop, threshold, refine):
+    # runs in the worker process, has to be importable at module level for spawn (windows)
+    with h5py.File(path, 'r') as f:
+        return dataset_centroids(f['frames'], threshold, refine=refine, start=start, stop=stop)
+
+
+def parallel_centroids(paths, threshold=127, refine=False, workers=None, shards_per_worker=4):
+    '''centroids of every frame of one or more .h5 recordings on a process pool.
+    returns {path: (cx, cy, m00, valid)}, the same arrays dataset_centroids gives for the whole file
+    (refine is passed on to it, off by default like there)'''
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    workers = workers or os.cpu_count()
+
+    jobs = []
+    results = {}
+    for path in paths:
+        with h5py.File(path, 'r') as f:
+            frames = f['frames']
+            n_frames = len(frames)
+            chunk_frames = frames.chunks[0] if frames.chunks else block_size(frames)
+        results[path] = (np.full(n_frames, np.nan), np.full(n_frames, np.nan),
+                         np.zeros(n_frames, dtype=np.int64), np.zeros(n_frames, dtype=bool))
+        jobs += [(path, start, stop) for start, stop in shard_ranges(n_frames, chunk_frames, workers * shards_per_worker)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(path, start, stop, pool.submit(_centroid_shard, path, start, stop, threshold, refine))
+                   for path, start, stop in jobs]
+        for path, start, stop, future in futures:
+            for merged, part in zip(results[path], future.result()):
+                merged[start:stop] = part
+    return results
+
+
+def find_recordings(directory):
+    '''.h5/.hdf5 files in a folder, sorted by name'''
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith(('.h5', '.hdf5')))
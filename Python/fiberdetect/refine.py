@@ -0,0 +1,107 @@
+"""
+Sub-pixel refinement of a coarse circle (hough peak, HoughCircles result or a moments centroid).
+Edge points are found along rays out of the coarse center, then a Kasa fit gives a start for a Levenberg-Marquardt geometric fit.
+"""
+import numpy as np
+import cv2
+
+from .results import RefinedCircle
+
+
+def edge_points(image, center, radius, band=None, n_angles=180, step=0.5, min_gradient=5.0):
+    '''sub-pixel edge points around a coarse circle. samples the image along n_angles rays from
+    radius-band to radius+band and puts a parabola through the strongest radial gradient of each ray.
+    returns x, y arrays (rays with a weak or clipped edge are dropped)'''
+    if band is None:
+        band = max(3.0, 0.25 * radius)
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    image = np.asarray(image, dtype=np.float32)
+
+    angles = np.linspace(0, 2 * np.pi, n_angles, endpoint=False, dtype=np.float32)
+    radii = np.arange(max(1.0, radius - band), radius + band + step, step, dtype=np.float32)
+    cos_a, sin_a = np.cos(angles)[:, None], np.sin(angles)[:, None]
+    map_x = (center[0] + radii[None, :] * cos_a).astype(np.float32)
+    map_y = (center[1] + radii[None, :] * sin_a).astype(np.float32)
+    profiles = cv2.remap(image, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    gradient = np.abs(np.diff(profiles, axis=1))
+    peak = np.argmax(gradient, axis=1)
+    rows = np.arange(n_angles)
+    # drop rays whose edge sits on the end of the profile, a parabola can't be put through those
+    ok = (peak > 0) & (peak < gradient.shape[1] - 1) & (gradient[rows, peak] > min_gradient)
+    rows, peak = rows[ok], peak[ok]
+
+    left, middle, right = gradient[rows, peak - 1], gradient[rows, peak], gradient[rows, peak + 1]
+    denominator = left - 2 * middle + right
+    offset = np.where(denominator != 0, 0.5 * (left - right) / np.where(denominator != 0, denominator, 1), 0)
+    # diff sits halfway between two samples
+    edge_radius = radii[0] + (peak + 0.5 + offset) * step
+    x = center[0] + edge_radius * cos_a[rows, 0]
+    y = center[1] + edge_radius * sin_a[rows, 0]
+    return x.astype(np.float64), y.astype(np.float64)
+
+
+def fit_circle_kasa(x, y):
+    '''algebraic least squares circle, x^2 + y^2 + D x + E y + F = 0. returns cx, cy, r'''
+    x_mean, y_mean = x.mean(), y.mean()
+    u, v = x - x_mean, y - y_mean # centering keeps the normal equations well conditioned
+    A = np.column_stack([u, v, np.ones_like(u)])
+    b = -(u * u + v * v)
+    (D, E, F), *_ = np.linalg.lstsq(A, b, rcond=None)
+    cx, cy = -D / 2, -E / 2
+    r = np.sqrt(max(cx * cx + cy * cy - F, 0.0))
+    return cx + x_mean, cy + y_mean, r
+
+
+def fit_circle_lm(x, y, cx, cy, r, iterations=20, tolerance=1e-6):
+    '''geometric fit, minimizes the distance of every point to the circle with Levenberg-Marquardt.
+    cx, cy, r is the starting guess (kasa). returns cx, cy, r, rms residual in pixels'''
+    params = np.array([cx, cy, r], dtype=np.float64)
+    damping = 1e-3
+
+    def residuals(p):
+        dx, dy = x - p[0], y - p[1]
+        distance = np.hypot(dx, dy)
+        return distance - p[2], dx, dy, distance
+
+    res, dx, dy, distance = residuals(params)
+    cost = res @ res
+    for _ in range(iterations):
+        distance = np.where(distance == 0, 1e-12, distance)
+        J = np.column_stack([-dx / distance, -dy / distance, -np.ones_like(distance)])
+        JtJ = J.T @ J
+        Jtr = J.T @ res
+        while True:
+            delta = np.linalg.solve(JtJ + damping * np.diag(np.diag(JtJ)), -Jtr)
+            trial = params + delta
+            trial_res, trial_dx, trial_dy, trial_distance = residuals(trial)
+            trial_cost = trial_res @ trial_res
+            if trial_cost <= cost:
+                damping = max(damping / 10, 1e-12)
+                break
+            damping *= 10
+            if damping > 1e12:
+                return params[0], params[1], params[2], np.sqrt(cost / len(x))
+        params, res, dx, dy, distance = trial, trial_res, trial_dx, trial_dy, trial_distance
+        converged = cost - trial_cost <= tolerance * cost
+        cost = trial_cost
+        if converged or np.abs(delta).max() < tolerance:
+            break
+    return params[0], params[1], params[2], np.sqrt(cost / len(x))
+
+
+def refine_circle(image, center, radius, band=None, n_angles=180):
+    '''refines a coarse (x, y), radius to sub-pixel. returns a RefinedCircle,
+    or the coarse circle with rms None if there weren't enough edge points to fit'''
+    x, y = edge_points(image, center, radius, band=band, n_angles=n_angles)
+    if len(x) < 6:
+        return RefinedCircle((float(center[0]), float(center[1])), float(radius), None)
+    cx, cy, r = fit_circle_kasa(x, y)
+    cx, cy, r, rms = fit_circle_lm(x, y, cx, cy, r)
+    return RefinedCircle((float(cx), float(cy)), float(r), float(rms))
+
+
+def refine_centroid(image, centroid):
+    '''refines a Centroid from the centroid detectors, the radius guess comes from the blob area = pi r^2'''
+    return refine_circle(image, centroid.center, np.sqrt(centroid.area / np.pi))
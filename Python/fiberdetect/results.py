@@ -0,0 +1,25 @@
+"""
+Result types returned by the detectors. They are plain NamedTuples so the old tuple unpacking
+((x, y), radius, score) still works in the apps.
+"""
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+class Circle(NamedTuple):
+    center: Tuple[float, float]  # (x, y), x is the column and y the row
+    radius: float  # pixels
+    score: Optional[float] = None  # accumulator votes, None when the detector doesn't give one
+
+
+class RefinedCircle(NamedTuple):
+    center: Tuple[float, float]
+    radius: float
+    rms: Optional[float] = None  # rms distance of the edge points to the fitted circle, None if the fit was skipped
+
+
+class Centroid(NamedTuple):
+    center: Tuple[float, float]
+    area: float  # pixels in the thresholded blob
+    contour: Optional[np.ndarray] = None  # only set by the contour based centroid
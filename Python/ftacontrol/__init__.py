@@ -0,0 +1,9 @@
+"""
+FTA actuator controller code shared by the apps, no tkinter in here either.
+"""
+from .simserial import SimulatedFTA, SimulatedSerial
+from .settle import SettleResult, CentroidStream, SettleWatcher, snapshot_sampler, wait_for_settle, settle_async
+from .scanplan import LinearFit, AdaptiveScanPlanner
+from .centering import CenteringStats, CenteringLoop
+from .transport import CommandResult, TransportStats, SerialTransport
+from .scanrunner import ScanPoint, ScanEvent, ScanRunner
@@ -0,0 +1,116 @@
+"""
+Closed loop centering: holds the fiber tip on a target pixel by driving the DACs from the live centroid.
+Every new frame from the AcquisitionThread gives a centroid, the pixel error goes through a PI controller and the
+result is sent as a DAC move. The calibrated um per DAC gains (from the micron_per_DAC scan) are the plant model,
+so the controller works in pixels and the gains turn that into DAC steps:
+
+    dac = start + (kp * error + ki * integral(error)) * microns_per_pixel / gain
+
+With the plant inverted like that the loop crosses over at about ki rad/s whatever the FTA, which has to stay
+well below the actuator resonance (~30 Hz) and the frame rate.
+"""
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+import numpy as np
+
+from .settle import CentroidStream
+
+DAC_MAX = 4095
+
+
+class CenteringStats(NamedTuple):
+    updates: int  # frames acted on
+    missed: int  # frames without a centroid
+    rate: float  # updates per second over the window
+    rms_error: float  # pixels, over the window
+    max_error: float  # pixels, over the window
+    mean_latency: float  # seconds from the frame being grabbed to its DAC command being sent
+    max_latency: float
+    dac: tuple  # last DAC command (x, y)
+    saturated: bool  # a DAC is at the end of its range, the target can't be reached
+
+
+class CenteringLoop(threading.Thread):
+    def __init__(self, acquisition, move, target, gain=(0.37, 0.33), microns_per_pixel=125 / 27.12, bandwidth=4.0,
+                 kp=0.2, start_dac=(2048, 2048), threshold=127, window=500, poll=0.0005):
+        '''holds the centroid at target (x, y pixels in the ROI) by calling move(dac_x, dac_y).
+        gain is the calibrated um per DAC step of each axis, signed (negative if the image axis runs against the DAC).
+        bandwidth (Hz) sets the integral gain, kp is the proportional gain (1 would correct the whole error at once).
+        the stats are over the last window updates. start() runs it, stop() ends it'''
+        super().__init__(daemon=True)
+        self.stream = CentroidStream(acquisition, threshold)
+        self.move = move
+        self.target = np.asarray(target, dtype=float)
+        self.dac_per_pixel = microns_per_pixel / np.asarray(gain, dtype=float)
+        self.ki = 2 * np.pi * bandwidth
+        self.kp = kp
+        self.start_dac = np.asarray(start_dac, dtype=float)
+        self.poll = poll
+        self.stop_event = threading.Event()
+        self.error = None # exception that stopped the loop, if any
+
+        self.lock = threading.Lock()
+        self.integral = np.zeros(2) # pixel seconds
+        self.last_time = None
+        self.dac = tuple(int(v) for v in self.start_dac)
+        self.saturated = False
+        self.updates = 0
+        self.missed = 0
+        self.history = deque(maxlen=window) # (frame time, error, latency)
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                sample = self.stream.latest()
+                if sample is None:
+                    time.sleep(self.poll)
+                    continue
+                t, x, y = sample
+                if not (np.isfinite(x) and np.isfinite(y)):
+                    self.missed += 1 # tip lost, hold the last command
+                    continue
+                self.update(t, x, y)
+        except Exception as e:
+            self.error = e
+            print(f"\n[ERROR] Centering loop failed: {e}")
+
+    def update(self, t, x, y):
+        '''one control step for a centroid (x, y) seen in a frame grabbed at t (time.perf_counter)'''
+        error = self.target - (x, y)
+        dt = 0.0 if self.last_time is None else min(t - self.last_time, 0.1) # no big jump after a gap
+        self.last_time = t
+        integral = self.integral + error * dt
+        command = self.start_dac + (self.kp * error + self.ki * integral) * self.dac_per_pixel
+        clipped = np.clip(command, 0, DAC_MAX)
+        # anti windup, stop integrating on an axis that is pinned at the end of the range
+        free = clipped == command
+        self.integral = np.where(free, integral, self.integral)
+        dac = tuple(int(round(v)) for v in clipped)
+        if dac != self.dac:
+            self.move(*dac)
+        latency = time.perf_counter() - t
+        with self.lock:
+            self.dac = dac
+            self.saturated = not free.all()
+            self.updates += 1
+            self.history.append((t, float(np.hypot(*error)), latency))
+
+    def stats(self):
+        with self.lock:
+            history = np.array(self.history).reshape(-1, 3)
+            dac, saturated, updates, missed = self.dac, self.saturated, self.updates, self.missed
+        if len(history) == 0:
+            return CenteringStats(updates, missed, 0.0, np.nan, np.nan, np.nan, np.nan, dac, saturated)
+        times, errors, latency = history.T
+        span = times[-1] - times[0]
+        rate = float((len(times) - 1) / span) if span > 0 else 0.0
+        return CenteringStats(updates, missed, rate, float(np.sqrt(np.mean(errors**2))), float(errors.max()),
+                              float(latency.mean()), float(latency.max()), dac, saturated)
+
+    def stop(self, timeout=1.0):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
@@ -0,0 +1,135 @@
+"""
+Adaptive point picking for the micron per DAC calibration scans. Rather than every 100 DAC from 500 to 3000,
+a coarse pass is measured first and more points are only added where the response needs them: where the local
+slope changes from one interval to the next, or a point sits off the straight line through its neighbours, the
+intervals get split, and points keep being added until the fitted slope is known to the requested confidence. Ask the planner for a batch, measure it, give the results back.
+
+    planner = AdaptiveScanPlanner(500, 3000)
+    while True:
+        batch = planner.next_points()
+        if not batch:
+            break
+        for dac in batch:
+            planner.add(dac, measure(dac))
+"""
+from typing import NamedTuple
+
+import numpy as np
+from scipy import stats
+
+
+class LinearFit(NamedTuple):
+    slope: float  # position units per DAC step
+    intercept: float
+    slope_ci: float  # half width of the confidence interval of the slope
+    residual_rms: float
+    points: int
+
+
+class AdaptiveScanPlanner:
+    def __init__(self, lo=500, hi=3000, coarse=6, min_step=25, slope_tol=0.1, residual_tol=2.0, confidence=0.01,
+                 level=0.95, batch=4, max_points=52):
+        '''lo..hi is the DAC range, measured at coarse evenly spaced points first. intervals are split down to min_step.
+        intervals are refined where the slope changes by more than slope_tol (relative to the fitted slope) or a point
+        is more than residual_tol (position units, e.g. um) off the line through its neighbours. it is done when
+        nothing needs refining and the slope's level confidence interval is within confidence (relative) of it,
+        or after max_points points. batch is how many points are asked for at once after the coarse pass'''
+        self.lo, self.hi = lo, hi
+        self.min_step = min_step
+        self.slope_tol = slope_tol
+        self.residual_tol = residual_tol
+        self.confidence = confidence
+        self.level = level
+        self.batch = batch
+        self.max_points = max_points
+        self.positions = {} # dac -> measured position, nan if nothing was found
+        self.pending = sorted({int(round(v)) for v in np.linspace(lo, hi, coarse)})
+        self.done = False
+        self.reason = ''
+
+    def add(self, dac, position):
+        '''measured position at dac, None if the tip wasn't found'''
+        self.positions[int(dac)] = np.nan if position is None else float(position)
+
+    def measured(self):
+        '''(dac, position) arrays of the points that have a position, sorted by dac'''
+        dacs = np.array(sorted(d for d, p in self.positions.items() if np.isfinite(p)), dtype=float)
+        return dacs, np.array([self.positions[int(d)] for d in dacs])
+
+    def fit(self):
+        '''least squares line through the measured points, None with fewer than 3'''
+        dacs, positions = self.measured()
+        n = len(dacs)
+        if n < 3:
+            return None
+        slope, intercept = np.polyfit(dacs, positions, 1)
+        residuals = positions - (slope * dacs + intercept)
+        sigma = np.sqrt(residuals @ residuals / (n - 2))
+        slope_se = sigma / np.sqrt(((dacs - dacs.mean())**2).sum())
+        slope_ci = stats.t.ppf(0.5 + self.level / 2, n - 2) * slope_se
+        return LinearFit(float(slope), float(intercept), float(slope_ci), float(np.sqrt(np.mean(residuals**2))), n)
+
+    def _split(self, intervals):
+        # midpoints of the intervals that can still be split and haven't been measured
+        points = []
+        for left, right in intervals:
+            if right - left >= 2 * self.min_step:
+                mid = int(round((left + right) / 2))
+                if mid not in self.positions and mid not in points:
+                    points.append(mid)
+        return points
+
+    def next_points(self):
+        '''the next DAC values to measure (sorted), [] once the scan is finished (reason says why)'''
+        if self.done:
+            return []
+        todo = [d for d in self.pending if d not in self.positions]
+        if todo: # coarse pass not finished
+            return todo
+        room = self.max_points - len(self.positions)
+        if room <= 0:
+            return self._finish('max points')
+
+        fit = self.fit()
+        if fit is None:
+            return self._finish('fewer than 3 points with a centroid')
+        dacs, positions = self.measured()
+        steps = np.diff(dacs)
+        local = np.diff(positions) / steps
+        # every inner point against the straight line through its two neighbours, this is what curvature
+        # (or a bad point) looks like, and a nonlinear end doesn't make the whole range look bad like the global fit would
+        w = (dacs[1:-1] - dacs[:-2]) / (dacs[2:] - dacs[:-2])
+        residuals = positions[1:-1] - ((1 - w) * positions[:-2] + w * positions[2:])
+        # measurement noise from those (MAD), so noise alone doesn't look like a slope change on short intervals
+        noise = 1.4826 * np.median(np.abs(residuals)) / np.sqrt(1.5)
+
+        score = np.zeros(len(steps)) # > 0 for intervals that need a point, bigger is worse
+        slope_change = np.abs(np.diff(local))
+        slope_noise = 3 * np.sqrt(2) * noise * np.sqrt(1 / steps[:-1]**2 + 1 / steps[1:]**2)
+        changed = slope_change > np.maximum(self.slope_tol * abs(fit.slope), slope_noise)
+        error = np.where(changed, slope_change * (steps[:-1] + steps[1:]), 0) # position error it amounts to
+        off_line = np.where(np.abs(residuals) > max(self.residual_tol, 3 * np.sqrt(1.5) * noise), np.abs(residuals), 0)
+        for both in (error, off_line): # each inner point flags the intervals on both sides of it
+            score[:-1] = np.maximum(score[:-1], both)
+            score[1:] = np.maximum(score[1:], both)
+        flagged = np.nonzero(score)[0]
+        flagged = flagged[np.argsort(-score[flagged], kind='stable')]
+        points = self._split([(dacs[i], dacs[i + 1]) for i in flagged])
+
+        if not points and fit.slope_ci > self.confidence * abs(fit.slope):
+            if fit.residual_rms > 3 * noise + self.residual_tol / 2:
+                # the interval is wide because the response isn't a straight line, more points won't narrow it
+                return self._finish('bends refined, response is not linear over the range')
+            # response looks linear but the slope isn't pinned down yet, fill in the widest gaps
+            widest = np.argsort(-steps, kind='stable')
+            points = self._split([(dacs[i], dacs[i + 1]) for i in widest])
+        if not points:
+            if fit.slope_ci <= self.confidence * abs(fit.slope):
+                return self._finish('slope confidence reached')
+            return self._finish('no interval left to split')
+        return sorted(points[:min(self.batch, room)])
+
+    def _finish(self, reason):
+        self.done = True
+        self.reason = reason
+        return []
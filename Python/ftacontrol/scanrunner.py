@@ -0,0 +1,112 @@
+"""
+Runs DAC scans on an asyncio event loop in a worker thread. The serial replies, the settle waits and the frame
+analysis are all awaited, so they overlap instead of running one after the other: as soon as the tip has settled
+at point k its frame is handed to a worker thread for the centroid and the move to point k + 1 goes out straight
+away. The scan then takes about (settle time) x (points) and the analysis is hidden behind the moves.
+
+Nothing in here touches tkinter. Progress goes into a queue.Queue as ScanEvents, the GUI polls it with after():
+
+    runner = ScanRunner(link, acquisition, analyze, events)
+    runner.start(my_scan(runner))       # my_scan awaits runner.measure([...]) / runner.move(...)
+    ...
+    event = events.get_nowait()
+"""
+import asyncio
+import threading
+import time
+import traceback
+from typing import Any, NamedTuple, Optional
+
+from .settle import CentroidStream, SettleResult, settle_async
+
+
+class ScanPoint(NamedTuple):
+    dac: tuple  # (x, y) that was set
+    centroid: Any  # whatever analyze() returned for the settled frame, None if the move failed
+    settle: SettleResult
+    reply: str  # controller's answer to the move
+
+
+class ScanEvent(NamedTuple):
+    kind: str  # 'point', 'message', 'done' or 'error'
+    message: str
+    point: Optional[ScanPoint] = None
+    done: int = 0  # points measured so far
+    total: int = 0  # points in the current batch of moves
+    result: Any = None  # what the scan coroutine returned, for 'done'
+
+
+class ScanRunner:
+    def __init__(self, link, acquisition, analyze, events, settle_timeout=3.0, threshold=127, **settle_kw):
+        '''link is a SerialTransport, acquisition the running AcquisitionThread. analyze(frame) gives the centroid
+        of a settled frame, it runs in a worker thread on its own copy of the frame. events is a queue.Queue the
+        ScanEvents go into, settle_kw are passed on to settle_async'''
+        self.link = link
+        self.acquisition = acquisition
+        self.analyze = analyze
+        self.events = events
+        self.settle_timeout = settle_timeout
+        self.threshold = threshold
+        self.settle_kw = settle_kw
+        self.dac = None # last DAC values sent
+        self.measured = 0
+        self.thread = None
+
+    def report(self, message, kind='message', **fields):
+        self.events.put(ScanEvent(kind, message, done=self.measured, **fields))
+
+    async def move(self, x, y, timeout=None):
+        '''sets both DACs and waits for the tip to settle, returns (SettleResult, reply), reply is the first failed
+        command's CommandResult if there is one'''
+        stream = CentroidStream(self.acquisition, self.threshold) # only frames from after the move
+        sent = time.perf_counter()
+        self.dac = (x, y)
+        replies, settle = await asyncio.gather(
+            asyncio.gather(*(asyncio.wrap_future(future) for future in self.link.set_xy(x, y))),
+            settle_async(stream.read, timeout=self.settle_timeout if timeout is None else timeout, start=sent,
+                         **self.settle_kw))
+        failed = [reply for reply in replies if not reply.ok]
+        for reply in failed:
+            self.report(f"{reply.command} failed: {reply.reply or 'no reply'}")
+        return settle, failed[0] if failed else replies[-1]
+
+    async def measure(self, moves, timeout=None):
+        '''visits every (x, y) in moves, returns a ScanPoint for each (in order).
+        the analysis of each point runs while the tip is moving to the next one'''
+        loop = asyncio.get_running_loop()
+        analyses = []
+        for x, y in moves:
+            settle, reply = await self.move(x, y, timeout)
+            frame = self.acquisition.latest()
+            if not reply.ok or frame is None:
+                analysis = loop.create_future()
+                analysis.set_result(None)
+            else:
+                analysis = loop.run_in_executor(None, self.analyze, frame.copy())
+            analyses.append(asyncio.ensure_future(self._finish_point((x, y), settle, reply, analysis, len(moves))))
+        return list(await asyncio.gather(*analyses))
+
+    async def _finish_point(self, dac, settle, reply, analysis, total):
+        point = ScanPoint(dac, await analysis, settle, reply.reply)
+        self.measured += 1
+        self.report(f"DAC {dac[0]}, {dac[1]}: {point.centroid}, settled in {settle.settle_time:.3f} s"
+                    + ("" if settle.settled else " (timed out)"), kind='point', point=point, total=total)
+        return point
+
+    def start(self, scan):
+        '''runs the coroutine scan on its own event loop in a worker thread. a 'done' event with its return value
+        (or an 'error' event) is the last thing put in the queue'''
+        def run():
+            started = time.perf_counter()
+            try:
+                result = asyncio.run(scan)
+            except Exception as e:
+                traceback.print_exc()
+                self.report(str(e), kind='error')
+                return
+            self.report(f"Scan finished, {self.measured} points in {time.perf_counter() - started:.1f} s",
+                        kind='done', result=result)
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        return self.thread
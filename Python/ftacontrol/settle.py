@@ -0,0 +1,150 @@
+"""
+Waiting for the fiber tip to stop moving after a DAC change. Instead of sleeping a fixed few seconds the centroid is
+watched and the tip counts as settled once, over the last window seconds, it is neither drifting (fitted speed)
+nor wobbling (spread) by more than the limits. How long that took is returned so the scans can log it.
+"""
+import asyncio
+import time
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from fiberdetect import moments_centroid, moments_centroids
+
+
+class SettleResult(NamedTuple):
+    settled: bool  # False if the timeout ran out first
+    settle_time: float  # seconds from the start of the wait to the end of the window that passed (or the timeout)
+    center: Optional[Tuple[float, float]]  # mean centroid over the last window, None if there were no centroids
+    std: float  # pixels, spread of the centroid over the window
+    speed: float  # pixels / s, fitted drift over the window
+    samples: int  # centroids in the window
+
+
+class CentroidStream:
+    '''centroids of the frames an AcquisitionThread grabs, every frame and not just the latest one.
+    read() gives the ones that came in since the previous read (or since the stream was made)'''
+    def __init__(self, acquisition, threshold=127):
+        self.acquisition = acquisition
+        self.threshold = threshold
+        self.next = acquisition.frame_buffer.count
+
+    def read(self):
+        '''(times, x, y) arrays, times in seconds on time.perf_counter, x/y are nan where nothing was above threshold'''
+        frame_buffer = self.acquisition.frame_buffer
+        with self.acquisition.lock:
+            stop = frame_buffer.count
+            # don't go near the slots the camera is about to overwrite
+            start = max(self.next, stop - frame_buffer.capacity // 2)
+            segments = frame_buffer.segments(start, stop)
+            stamps, _ = frame_buffer.stamps(start, stop)
+        self.next = stop
+        if not segments:
+            return np.empty(0), np.empty(0), np.empty(0)
+        cx, cy = [], []
+        for segment in segments:
+            x, y, _, _ = moments_centroids(segment, self.threshold)
+            cx.append(x)
+            cy.append(y)
+        return stamps / 1e9, np.concatenate(cx), np.concatenate(cy)
+
+    def latest(self):
+        '''(time, x, y) of just the newest frame, None if no frame came in since the last read/latest.
+        for control loops, which only care where the tip is now and would fall behind centroiding every frame'''
+        frame_buffer = self.acquisition.frame_buffer
+        with self.acquisition.lock:
+            stop = frame_buffer.count
+            if stop <= self.next:
+                return None
+            frame = frame_buffer.latest()
+            stamps, _ = frame_buffer.stamps(stop - 1, stop)
+        self.next = stop
+        centroid = moments_centroid(frame, self.threshold)
+        if centroid is None:
+            return stamps[0] / 1e9, np.nan, np.nan
+        return stamps[0] / 1e9, centroid.center[0], centroid.center[1]
+
+
+def snapshot_sampler(capture, threshold=127):
+    '''read function for wait_for_settle when there is no video stream, each call takes one picture with capture()'''
+    def read():
+        centroid = moments_centroid(capture(), threshold)
+        t = time.perf_counter()
+        if centroid is None:
+            return np.array([t]), np.array([np.nan]), np.array([np.nan])
+        return np.array([t]), np.array([centroid.center[0]]), np.array([centroid.center[1]])
+    return read
+
+
+class SettleWatcher:
+    '''the stillness test behind wait_for_settle, fed centroids as they come in instead of polling for them.
+    see wait_for_settle for the arguments'''
+    def __init__(self, window=0.1, max_speed=5.0, max_std=0.5, min_wait=0.05, min_samples=5, start=None):
+        self.window = window
+        self.max_speed = max_speed
+        self.max_std = max_std
+        self.min_wait = min_wait
+        self.min_samples = min_samples
+        self.start = time.perf_counter() if start is None else start
+        self.times, self.xs, self.ys = np.empty(0), np.empty(0), np.empty(0)
+        self.result = SettleResult(False, 0.0, None, np.inf, np.inf, 0)
+
+    def feed(self, t, x, y):
+        '''adds (times, x, y) arrays of new centroids, returns the SettleResult so far (settled=True once it is)'''
+        keep = (t >= self.start + self.min_wait) & np.isfinite(x) & np.isfinite(y)
+        times = np.concatenate((self.times, t[keep]))
+        xs = np.concatenate((self.xs, x[keep]))
+        ys = np.concatenate((self.ys, y[keep]))
+
+        if len(times):
+            # only the last window is looked at, older samples aren't needed anymore
+            in_window = times >= times[-1] - self.window
+            if not in_window[0]: # there is history going back at least a whole window
+                wx, wy, wt = xs[in_window], ys[in_window], times[in_window]
+                std = float(np.sqrt(wx.var() + wy.var()))
+                speed = np.inf
+                if len(wt) >= 2 and wt[-1] > wt[0]:
+                    speed = float(np.hypot(np.polyfit(wt, wx, 1)[0], np.polyfit(wt, wy, 1)[0]))
+                settled = len(wt) >= self.min_samples and speed <= self.max_speed and std <= self.max_std
+                self.result = SettleResult(settled, float(wt[-1] - self.start), (float(wx.mean()), float(wy.mean())),
+                                           std, speed, len(wt))
+            first = max(0, np.argmax(in_window) - 1) # keep one sample before the window so it stays covered
+            times, xs, ys = times[first:], xs[first:], ys[first:]
+        self.times, self.xs, self.ys = times, xs, ys
+        return self.result
+
+    def timed_out(self, now):
+        '''the result to give up with at time now'''
+        return self.result._replace(settled=False, settle_time=now - self.start)
+
+
+def wait_for_settle(read, window=0.1, max_speed=5.0, max_std=0.5, timeout=5.0, min_wait=0.05, min_samples=5,
+                    poll=0.005, start=None):
+    '''blocks until the centroid has been still for window seconds or timeout seconds have gone by.
+    read() returns (times, x, y) arrays of new centroids (CentroidStream.read or snapshot_sampler).
+    call it right after sending the move, start is when the move was sent (time.perf_counter, now if None).
+    centroids from before start + min_wait are ignored so the tip isn't declared settled before it has even
+    started moving'''
+    watcher = SettleWatcher(window, max_speed, max_std, min_wait, min_samples, start)
+    while True:
+        result = watcher.feed(*read())
+        if result.settled:
+            return result
+        now = time.perf_counter()
+        if now - watcher.start >= timeout:
+            return watcher.timed_out(now)
+        time.sleep(poll)
+
+
+async def settle_async(read, window=0.1, max_speed=5.0, max_std=0.5, timeout=5.0, min_wait=0.05, min_samples=5,
+                       poll=0.005, start=None):
+    '''wait_for_settle for asyncio code, the event loop keeps running in between polls'''
+    watcher = SettleWatcher(window, max_speed, max_std, min_wait, min_samples, start)
+    while True:
+        result = watcher.feed(*read())
+        if result.settled:
+            return result
+        now = time.perf_counter()
+        if now - watcher.start >= timeout:
+            return watcher.timed_out(now)
+        await asyncio.sleep(poll)
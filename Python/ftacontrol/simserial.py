@@ -0,0 +1,224 @@
+"""
+Stand-in for the FTA DAC / amp controller on the serial port, so scans can run without the bench.
+SimulatedFTA is the actuator: commands take effect after a processing latency, the tip follows the DAC setpoint
+with a second order (spring, mass, damping) response and moves gain um per DAC step. SimulatedSerial looks like a
+pyserial Serial to the apps (write, readline, read, in_waiting, ...) and talks to it.
+Attached to the simulated camera (zwocapture.simcam) the fiber tip in the frames moves with it.
+
+Commands, one per line (\n or \r\n), each answered with one line:
+    set_x N / set_y N      DAC setpoint of one axis, 0-4095             -> "OK set_x N"
+    DAC_set,X,Y            both axes (Centroid.py / FiberFinder)         -> "OK DAC_set,X,Y"
+    amp_enable / amp_disable                                             -> "OK amp_enable"
+    stop                   both DACs back to mid scale                   -> "OK stop"
+anything else gets "ERR <line>".
+"""
+import heapq
+import threading
+import time
+
+import numpy as np
+
+DAC_MAX = 4095
+DAC_MID = 2048
+
+
+class SimulatedFTA:
+    def __init__(self, gain=(0.37, 0.33), microns_per_pixel=125 / 27.12, natural_freq=30.0, damping=0.3,
+                 latency=0.002, jitter=0.0005, baudrate=115200, amp_enabled=True, seed=0):
+        '''gain is um per DAC step for x and y (FTA#6 calibration by default), microns_per_pixel the camera scale
+        (125 um fiber over the 27.12 px radius micron_per_DAC uses). natural_freq (Hz) and damping set the step
+        response, latency (+- jitter) is how long the controller takes to act on a command.
+        micron_per_DAC's scan never sends amp_enable, so the amp starts on unless amp_enabled=False'''
+        self.gain = np.asarray(gain, dtype=float)
+        self.microns_per_pixel = microns_per_pixel
+        self.latency = latency
+        self.jitter = jitter
+        self.byte_time = 10 / baudrate # start + 8 data + stop bits
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.dac = np.array([DAC_MID, DAC_MID])
+        self.amp_enabled = amp_enabled
+        self.commands = [] # heap of (time it takes effect, sequence number, line)
+        self.sequence = 0
+        self.replies = [] # (time the whole line has come back, bytes)
+        self.command_count = 0
+
+        # tip state per axis: position (um from rest) and velocity, at self.time
+        self.position = np.zeros(2)
+        self.velocity = np.zeros(2)
+        self.time = time.perf_counter()
+        w = 2 * np.pi * natural_freq
+        self.w2, self.two_zeta_w = w * w, 2 * damping * w
+
+    # ---- dynamics ----
+
+    def setpoint(self):
+        '''where the tip is heading, um from rest'''
+        if not self.amp_enabled:
+            return np.zeros(2)
+        return (self.dac - DAC_MID) * self.gain
+
+    def _integrate(self, t):
+        # exact step of x'' = w^2 (u - x) - 2 zeta w x' with u constant, e(t) = expm(A t) e(0) for e = (x - u, x')
+        # and A = [[0, 1], [-w^2, -2 zeta w]]. 2x2 matrix exponential in closed form:
+        # expm(A t) = exp(s t) ((cosh(q t) - s sinh(q t) / q) I + sinh(q t) / q A), s = trace / 2, q = sqrt(s^2 - det)
+        dt = t - self.time
+        if dt <= 0:
+            return
+        s = -self.two_zeta_w / 2
+        q = np.sqrt(complex(s * s - self.w2))
+        c = np.cosh(q * dt)
+        sq = np.sinh(q * dt) / q if q != 0 else dt # sinh(q t) / q -> t for critical damping
+        a = (c - s * sq).real
+        b = sq.real
+        scale = np.exp(s * dt)
+        u = self.setpoint()
+        e, v = self.position - u, self.velocity
+        self.position = u + scale * (a * e + b * v)
+        self.velocity = scale * (a * v + b * (-self.w2 * e - self.two_zeta_w * v))
+        self.time = t
+
+    def _advance(self, now):
+        # run every command that has taken effect by now, in order, moving the tip in between
+        while self.commands and self.commands[0][0] <= now:
+            at, _, line = heapq.heappop(self.commands)
+            self._integrate(at)
+            reply = self._execute(line) + '\r\n'
+            self.replies.append((at + len(reply) * self.byte_time, reply.encode('ascii')))
+        self._integrate(now)
+
+    def _execute(self, line):
+        self.command_count += 1
+        try:
+            if line.startswith(('set_x ', 'set_y ')):
+                value = int(line.split()[1])
+                if not 0 <= value <= DAC_MAX:
+                    return f"ERR {line}"
+                self.dac[0 if line.startswith('set_x') else 1] = value
+            elif line.startswith('DAC_set,'):
+                x, y = (int(v) for v in line.split(',')[1:3])
+                if not (0 <= x <= DAC_MAX and 0 <= y <= DAC_MAX):
+                    return f"ERR {line}"
+                self.dac[:] = x, y
+            elif line == 'amp_enable':
+                self.amp_enabled = True
+            elif line == 'amp_disable':
+                self.amp_enabled = False
+            elif line == 'stop':
+                self.dac[:] = DAC_MID, DAC_MID
+            else:
+                return f"ERR {line}"
+        except (IndexError, ValueError):
+            return f"ERR {line}"
+        return f"OK {line}"
+
+    # ---- used by SimulatedSerial ----
+
+    def submit(self, line, arrived):
+        '''a command line that finished arriving at time arrived, it acts latency later'''
+        at = arrived + self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        with self.lock:
+            heapq.heappush(self.commands, (at, self.sequence, line))
+            self.sequence += 1
+
+    def take_replies(self, now):
+        '''reply bytes that have fully come back by now'''
+        with self.lock:
+            self._advance(now)
+            ready = [data for t, data in self.replies if t <= now]
+            self.replies = [(t, data) for t, data in self.replies if t > now]
+        return b''.join(ready)
+
+    # ---- used by the simulated camera ----
+
+    def offset(self, t):
+        '''(dx, dy) of the tip in camera pixels at perf_counter time t'''
+        with self.lock:
+            self._advance(t) # a t behind the last update just gets the latest position
+            return tuple(self.position / self.microns_per_pixel)
+
+    def tip_microns(self):
+        with self.lock:
+            self._advance(time.perf_counter())
+            return self.position.copy()
+
+    def attach(self):
+        '''moves the fiber tip of every simulated camera (open now or opened later) with this actuator'''
+        from zwocapture import simcam
+        simcam.stage = self
+        for camera in simcam.cameras.values():
+            camera.scene.stage = self
+        return self
+
+
+class SimulatedSerial:
+    '''the parts of serial.Serial the apps use, wired to a SimulatedFTA'''
+    def __init__(self, fta=None, port='SIM-FTA', timeout=1.0):
+        self.fta = fta if fta is not None else SimulatedFTA()
+        self.port = port
+        self.name = port
+        self.timeout = timeout
+        self.is_open = True
+        self._pending = b'' # partial command line written so far
+        self._received = b'' # replies that arrived but haven't been read
+
+    def _check_open(self):
+        if not self.is_open:
+            raise OSError("Attempting to use a port that is not open")
+
+    def write(self, data):
+        self._check_open()
+        now = time.perf_counter()
+        self._pending += bytes(data)
+        lines = self._pending.split(b'\n')
+        self._pending = lines.pop()
+        sent = 0
+        for line in lines:
+            sent += len(line) + 1
+            self.fta.submit(line.decode('ascii', 'replace').strip(), now + sent * self.fta.byte_time)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _collect(self):
+        self._received += self.fta.take_replies(time.perf_counter())
+
+    @property
+    def in_waiting(self):
+        self._check_open()
+        self._collect()
+        return len(self._received)
+
+    def read(self, size=1):
+        '''up to size bytes, waits up to timeout for them'''
+        self._check_open()
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        while True:
+            self._collect()
+            if len(self._received) >= size or (deadline is not None and time.perf_counter() >= deadline):
+                data, self._received = self._received[:size], self._received[size:]
+                return data
+            time.sleep(0.0002)
+
+    def readline(self):
+        '''one line including the newline, or whatever arrived before the timeout (b'' if nothing)'''
+        self._check_open()
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        while True:
+            self._collect()
+            end = self._received.find(b'\n')
+            if end >= 0:
+                data, self._received = self._received[:end + 1], self._received[end + 1:]
+                return data
+            if deadline is not None and time.perf_counter() >= deadline:
+                data, self._received = self._received, b''
+                return data
+            time.sleep(0.0002)
+
+    def reset_input_buffer(self):
+        self._collect()
+        self._received = b''
+
+    def close(self):
+        self.is_open = False
@@ -0,0 +1,198 @@
+"""
+Serial link to the FTA controller that doesn't wait on every reply before sending the next command.
+The controller answers each command line with one line of its own, in order. Commands are written as soon as they
+are sent (up to max_in_flight unanswered at once) and a reader thread matches the replies to them as they come in,
+so a caller only waits when it actually needs the answer:
+
+    link = SerialTransport(serial.Serial(port, 115200))
+    link.set_xy(1000, 2000)                 # set_x and set_y back to back, no wait in between
+    reply = link.command("amp_enable")      # waits for this one
+    print(link.stats().mean_rtt)
+
+Replies that echo their command ("OK set_x 100", like the simulator's) are matched by text, a reply without an echo
+goes to the oldest command still waiting. A command that gets no reply within its timeout is given up on
+and counted, so a lost line doesn't hang the caller like the old readline loops did. Its reply may still turn up
+late, so timed out commands are remembered for another (default) timeout and a late reply is dropped instead of being taken
+for the next command's (without an echo a reply that never comes at all can't be told from a late one).
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import NamedTuple
+
+import numpy as np
+
+
+class CommandResult(NamedTuple):
+    command: str
+    reply: str  # '' if it timed out
+    ok: bool  # replied and not with ERR
+    rtt: float  # seconds from writing the command to its reply, nan if it timed out
+
+
+class TransportStats(NamedTuple):
+    sent: int
+    replied: int
+    timeouts: int
+    errors: int  # ERR replies
+    in_flight: int  # sent and not answered yet
+    late: int  # replies that came after their command had timed out, or matched nothing, dropped
+    mean_rtt: float  # seconds, over the last window replies
+    max_rtt: float
+
+
+class _Pending:
+    def __init__(self, command, timeout):
+        self.command = command
+        self.timeout = timeout
+        self.sent = None # perf_counter once written
+        self.future = Future()
+
+
+class SerialTransport:
+    def __init__(self, port, timeout=0.5, max_in_flight=8, eol='\n', poll=0.002, window=1000, combined_set=False):
+        '''port is an open serial.Serial (or SimulatedSerial). timeout is the default seconds to wait for a reply,
+        max_in_flight how many commands may be unanswered at once (the controller's input buffer is small),
+        eol what commands are terminated with. the port's own timeout is set to poll so the reader never blocks long.
+        combined_set makes set_xy send one DAC_set,x,y line, only for firmware known to take it (FiberFinder's pyboard)'''
+        self.port = port
+        self.combined_set = combined_set
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.eol = eol
+        self.port.timeout = poll
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.slots = threading.Semaphore(max_in_flight)
+        self.pending = deque() # _Pending in the order they were written
+        self.expired = deque() # timed out ones whose reply may still come, oldest first
+        self.rtts = deque(maxlen=window)
+        self.sent = self.replied = self.timeouts = self.errors = self.late = 0
+        self.stop_event = threading.Event()
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.reader.start()
+
+    def send(self, command, timeout=None):
+        '''writes command without waiting for the reply, returns a Future of its CommandResult.
+        only blocks if max_in_flight commands are already waiting for replies'''
+        if self.stop_event.is_set():
+            raise OSError("Serial transport is closed")
+        pending = _Pending(command, self.timeout if timeout is None else timeout)
+        self.slots.acquire()
+        try:
+            with self.write_lock: # keeps the order on the wire the same as in self.pending
+                with self.lock:
+                    pending.sent = time.perf_counter()
+                    self.pending.append(pending) # before writing, the reply can be quicker than the next line
+                    self.sent += 1
+                self.port.write((command + self.eol).encode('ascii'))
+        except Exception as e:
+            self._finish(pending, CommandResult(command, '', False, np.nan), exception=e)
+            raise
+        return pending.future
+
+    def command(self, command, timeout=None):
+        '''sends command and waits for its reply, returns the CommandResult'''
+        return self.send(command, timeout).result()
+
+    def set_xy(self, x, y, wait=False, timeout=None):
+        '''both DACs, set_x and set_y pipelined (or one DAC_set line with combined_set).
+        returns a list of CommandResults if wait, otherwise a list of their Futures'''
+        if self.combined_set:
+            commands = [f"DAC_set,{int(x)},{int(y)}"]
+        else:
+            commands = [f"set_x {int(x)}", f"set_y {int(y)}"]
+        futures = [self.send(command, timeout) for command in commands]
+        return [future.result() for future in futures] if wait else futures
+
+    def _finish(self, pending, result, exception=None):
+        # takes pending out of the queue (if it's still there) and hands the caller the result
+        with self.lock:
+            try:
+                self.pending.remove(pending)
+            except ValueError:
+                return # already finished
+        self.slots.release()
+        if exception is not None:
+            pending.future.set_exception(exception)
+        else:
+            pending.future.set_result(result)
+
+    def _match(self, line, now):
+        status, _, echo = line.partition(' ')
+        echoed = status in ('OK', 'ERR') and echo != ''
+        with self.lock:
+            if echoed:
+                pending = next((p for p in self.pending if p.command == echo), None)
+                late = next((p for p in self.expired if p.command == echo), None)
+            else:
+                pending = self.pending[0] if self.pending else None
+                late = self.expired[0] if self.expired else None
+            if late is not None and pending is not None and pending.sent < late.sent:
+                late = None # replies come in order, this one is for whichever of the two was sent first
+            if late is not None or pending is None:
+                if late is not None:
+                    while self.expired[0] is not late: # older ones are past, their replies were lost
+                        self.expired.popleft()
+                    self.expired.popleft()
+                self.late += 1
+                what = f"late reply to '{late.command}'" if late is not None else "unexpected reply"
+                print(f"[INFO] Dropped {what} from {self.port.name}: {line}")
+                return
+            while self.expired and self.expired[0].sent < pending.sent:
+                self.expired.popleft()
+            ok = status != 'ERR'
+            rtt = now - pending.sent
+            self.replied += 1
+            self.errors += not ok
+            self.rtts.append(rtt)
+        self._finish(pending, CommandResult(pending.command, line, ok, rtt))
+
+    def _expire(self, now):
+        with self.lock:
+            late = [p for p in self.pending if now - p.sent > p.timeout]
+            self.timeouts += len(late)
+            self.expired.extend(late)
+            # given the default timeout again to turn up late, after that it's not coming anymore
+            while self.expired and now - self.expired[0].sent > self.expired[0].timeout + self.timeout:
+                self.expired.popleft()
+        for pending in late:
+            print(f"[ERROR] No reply to '{pending.command}' within {pending.timeout} s")
+            self._finish(pending, CommandResult(pending.command, '', False, np.nan))
+
+    def _read_loop(self):
+        buffer = b''
+        while not self.stop_event.is_set():
+            try:
+                data = self.port.read(max(1, self.port.in_waiting))
+            except Exception as e:
+                if not self.stop_event.is_set():
+                    print(f"[ERROR] Serial read failed: {e}")
+                break
+            now = time.perf_counter()
+            if data:
+                buffer += data
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    line = line.decode('ascii', 'replace').strip()
+                    if line:
+                        self._match(line, now)
+            self._expire(now)
+        # nothing will answer the rest anymore
+        with self.lock:
+            left = list(self.pending)
+        for pending in left:
+            self._finish(pending, CommandResult(pending.command, '', False, np.nan))
+
+    def stats(self):
+        with self.lock:
+            rtts = np.array(self.rtts)
+            return TransportStats(self.sent, self.replied, self.timeouts, self.errors, len(self.pending), self.late,
+                                  float(rtts.mean()) if len(rtts) else np.nan,
+                                  float(rtts.max()) if len(rtts) else np.nan)
+
+    def close(self, timeout=1.0):
+        '''stops the reader (commands still waiting get a timed out result), the port itself stays open'''
+        self.stop_event.set()
+        self.reader.join(timeout)
@@ -18,6 +18,8 @@ import serial.tools.list_ports
 import csv
 from datetime import date
 
+from fiberdetect import detect_lens, refine_circle
+
 # env_filename=os.getenv('ZWO_ASI_LIB') #initialize camera and find its directory where it is located 
 # asi.init('C:\\Users\\ASE\\Desktop\\Ari Lab-2023\\Pics\\ASIStudio\\ASICamera2.dll') #directory of camera 
 
@@ -233,28 +235,20 @@ class ImageProcessorApp:
         
             output = self.original_image.copy()
 
-            # convert the grayscale image to binary image
-            gray = output
-            
-    
-            gray = cv.medianBlur(gray, 5)
-    
-    
-            rows = gray.shape[0]
-            circles = cv.HoughCircles(gray, cv.HOUGH_GRADIENT, 1, rows / 8,
-                                    param1=100, param2=30,
-                                    minRadius=1, maxRadius=30)
-            
+            # median blur + HoughCircles, circles at least an eighth of the image height apart
+            circles = detect_lens(self.original_image, median_size=5, param1=100, param2=30, min_radius=1, max_radius=30)
             
-            if circles is not None:
-                circles = np.uint16(np.around(circles))
-                for i in circles[0, :]:
-                    center = (i[0], i[1])
+            if circles:
+                for circle in circles:
+                    # fit the edge of the lens for a sub-pixel center, HoughCircles only gives half pixel steps
+                    (x, y), radius, rms = refine_circle(self.original_image, circle.center, circle.radius)
+                    self.circle_centers.append((x, y))
+                    print(f"Refined circle: ({x:.2f}, {y:.2f}) r={radius:.2f} rms={rms}")
+                    center = (round(x), round(y))
                     # circle center
                     cv.circle(output, center, 1, (0, 100, 100), 3)
                     # circle outline
-                    radius = i[2]
-                    cv.circle(output, center, radius, (255, 0, 255), 3)
+                    cv.circle(output, center, round(radius), (255, 0, 255), 3)
             else:
         # If no circles were detected, display a message
                 messagebox.showinfo("No Circles Detected", "No circles were detected in the image.")
@@ -13,7 +13,10 @@ import serial.tools.list_ports
 import numpy as np
 import cv2
 
-import zwoasi as asi
+if os.getenv('ZWO_SIMULATE'): # no camera attached, made up frames instead (see zwocapture/simcam.py)
+    from zwocapture import simcam as asi
+else:
+    import zwoasi as asi
 import h5py
 
 from PIL import Image, ImageTk
@@ -25,6 +28,12 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolb
 import matplotlib.animation as animation
 import matplotlib.cm as cm
 import threading
+import queue
+
+from fiberdetect import contour_centroid
+from zwocapture import FrameRingBuffer, AcquisitionThread
+from ftacontrol import (SimulatedFTA, SimulatedSerial, SerialTransport, AdaptiveScanPlanner, CenteringLoop,
+                        ScanRunner)
 
 
 class TestingApp:
@@ -34,12 +43,17 @@ class TestingApp:
 
         self.serial = None
         self.port_name = None
+        self.link = None # SerialTransport on self.serial, matches the replies to the commands
 
         self.streaming = False
         self.camera_initialized = False
         self.roi_info_logged = False
         self.camera = None
         self.current_roi = (0, 0, 1936, 1096)  # Default full-frame ROI
+        self.dac = (2048, 2048) # last DAC values sent
+        self.calibrated_gain = [0.37, 0.33] # um per DAC step (signed) of x and y, the scan replaces these
+        self.centering = None # CenteringLoop while the tip is being held
+        self.scan_runner = None # ScanRunner while a scan is going
 
         self.button_frame = tk.Frame(master)
         self.button_frame.pack(pady=10)
@@ -78,6 +92,17 @@ class TestingApp:
         self.dacy_entry.insert(2048, '2048')
         self.dacy_entry.pack()
 
+        # Live view refresh, the camera runs at its own rate in the acquisition thread
+        tk.Label(master, text="Display Rate (Hz):").pack()
+        self.display_rate_entry = tk.Entry(master)
+        self.display_rate_entry.insert(0, "30")
+        self.display_rate_entry.pack()
+
+        # Closed loop centering target, blank for the middle of the ROI
+        tk.Label(master, text="Hold Target (x, y px):").pack()
+        self.target_entry = tk.Entry(master)
+        self.target_entry.pack()
+
 
         # Control buttons
         self.connect_button = tk.Button(self.button_frame, text="Connect Camera", command=self.connect_camera)
@@ -116,20 +141,39 @@ class TestingApp:
         self.dacy_scan_button = tk.Button(self.button_frame, text="Run DAC Y Scan", command=self.start_dacy_scan)
         self.dacy_scan_button.pack(side=tk.LEFT, padx=5, pady=5)
 
+        # only measure where the planner asks for points instead of every 100 DAC
+        self.adaptive_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.button_frame, text="Adaptive Scan", variable=self.adaptive_var).pack(side=tk.LEFT, padx=5, pady=5)
+
+        self.hold_button = tk.Button(self.button_frame, text="Hold Center", command=self.toggle_centering)
+        self.hold_button.pack(side=tk.LEFT, padx=5, pady=5)
+
 
         tk.Button(master, text="Find Centroid", command=self.find_centroid_in_current_frame).pack(pady=5)
 
+        self.centering_label = tk.Label(master, text="")
+        self.centering_label.pack()
+        self.scan_label = tk.Label(master, text="")
+        self.scan_label.pack()
+
         self.video_frame = tk.Label(master)
         self.video_frame.pack()
 
     # ---- Serial Communication Functions ----
 
     def connect_serial(self):
+        if os.getenv('FTA_SIMULATE'): # no controller attached (see ftacontrol/simserial.py)
+            self.serial = SimulatedSerial(SimulatedFTA().attach(), timeout=1)
+            self.port_name = self.serial.port
+            self.link = SerialTransport(self.serial)
+            print(f"✓ Connected to simulated controller {self.port_name}")
+            return
         ports = list(serial.tools.list_ports.comports())
         for p in ports:
             try:
                 self.serial = serial.Serial(p.device, baudrate=115200, timeout=1)
                 self.port_name = p.device
+                self.link = SerialTransport(self.serial)
                 print(f"✓ Connected to {p.device}")
                 messagebox.showinfo("Serial Connected", f"Connected to {p.device}")
                 return
@@ -138,24 +182,26 @@ class TestingApp:
         messagebox.showerror("Connection Error", "Could not connect to any serial port.")
 
     def send(self, text):
-        if self.serial and self.serial.is_open:
-            print(f'to {self.port_name}: {text}')
-            self.serial.write((text + '\n').encode('utf-8'))
-        else:
+        '''sends one command and waits for its reply, returns the CommandResult (None if not connected)'''
+        if not (self.serial and self.serial.is_open):
             print("Serial not connected")
-
-    def read_response(self):
-        if self.serial and self.serial.in_waiting > 0:
-            line = self.serial.readline()
-            print(f'From {self.port_name}: {line}')
-            return line.decode().strip()
-        return ""
+            return None
+        print(f'to {self.port_name}: {text}')
+        result = self.link.command(text)
+        if result.reply:
+            print(f'From {self.port_name}: {result.reply} ({result.rtt * 1000:.1f} ms)')
+        return result
 
     def set_xy(self, x, y):
-        self.send(f"set_x {x}")
-        self.read_response()
-        self.send(f"set_y {y}")
-        self.read_response()
+        # both axes go out back to back, the replies are only waited for after that
+        if not (self.serial and self.serial.is_open):
+            print("Serial not connected")
+            return
+        for result in self.link.set_xy(x, y, wait=True):
+            print(f'to {self.port_name}: {result.command}')
+            if result.reply:
+                print(f'From {self.port_name}: {result.reply} ({result.rtt * 1000:.1f} ms)')
+        self.dac = (x, y)
 
     def set_dac_from_gui(self):
         try:
@@ -167,15 +213,12 @@ class TestingApp:
 
     def amp_enable(self):
         self.send("amp_enable")
-        self.read_response()
 
     def amp_disable(self):
         self.send("amp_disable")
-        self.read_response()
 
     def stop(self):
         self.send("stop")
-        self.read_response()
 
     # ---- ROI Input Parser ----
 
@@ -215,10 +258,10 @@ class TestingApp:
             messagebox.showerror("Connection Failed", str(e))
 
     def start_dacx_scan(self):
-        threading.Thread(target=self.run_dacx_scan, daemon=True).start()
+        self.start_automation(axes=('x',))
 
     def start_dacy_scan(self):
-        threading.Thread(target=self.run_dacy_scan, daemon=True).start()
+        self.start_automation(axes=('y',))
 
 
     def start_feed(self):
@@ -242,9 +285,13 @@ class TestingApp:
             self.camera.set_control_value(asi.ASI_GAIN, gain_value)
             self.camera.set_control_value(asi.ASI_EXPOSURE, exposure_time)
 
+            width, height, _, _ = self.camera.get_roi_format()
+            self.frame_buffer = FrameRingBuffer(height, width, capacity=5000)
+
             self.camera.start_video_capture()
+            self.acquisition = AcquisitionThread(self.camera, self.frame_buffer, timeout=1000)
+            self.acquisition.start()
             self.streaming = True
-            self.live_captured_frames = []
             self.stop_button.config(state=tk.NORMAL)
             self.start_button.config(state=tk.DISABLED)
             self.update_feed()
@@ -257,8 +304,10 @@ class TestingApp:
             duration = time.time() - self.stream_start_time
             print(f"[INFO] Video feed duration: {duration:.2f} seconds")
             self.stream_start_time = None
+        self.stop_centering()
         if self.streaming:
             try:
+                self.acquisition.stop()  # thread has to be done grabbing before capture is stopped
                 self.camera.stop_video_capture()
                 self.streaming = False
                 self.start_button.config(state=tk.NORMAL)
@@ -267,134 +316,248 @@ class TestingApp:
             except Exception as e:
                 messagebox.showerror("Stop Failed", str(e))
 
+    def get_display_rate(self):
+        try:
+            return max(1.0, float(self.display_rate_entry.get()))
+        except ValueError:
+            return 30.0
+
     def update_feed(self):
+        # only draws, the frames are grabbed by self.acquisition
         if not self.streaming:
             return
 
         try:
-            width, height, _, _ = self.camera.get_roi_format()
+            if self.acquisition.error is not None:
+                raise self.acquisition.error
             if not self.roi_info_logged:
-                print(f"[INFO] ROI Format: width={width}, height={height}")
+                print(f"[INFO] ROI Format: width={self.frame_buffer.width}, height={self.frame_buffer.height}")
                 self.roi_info_logged = True
 
-            expected_buffer_size = width * height
-            buffer = bytearray(expected_buffer_size)
-
-            self.camera.get_video_data(1000, buffer)
-
-            frame = np.frombuffer(buffer, dtype=np.uint8).reshape((height, width))
-            frame_resized = cv2.resize(frame, (640, 480))
-
-            if not hasattr(self, 'live_captured_frames'):
-                self.live_captured_frames = []
-            self.live_captured_frames.append(frame.copy())
-            if len(self.live_captured_frames) > 5000:
-                self.live_captured_frames.pop(0)
-
-            img = Image.fromarray(frame_resized, mode='L')
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.video_frame.configure(image=imgtk)
-            self.video_frame.image = imgtk
-            self.master.after(1, self.update_feed)
+            frame = self.acquisition.latest()
+            if frame is not None:
+                frame_resized = cv2.resize(frame, (640, 480))
+                img = Image.fromarray(frame_resized, mode='L')
+                imgtk = ImageTk.PhotoImage(image=img)
+                self.video_frame.configure(image=imgtk)
+                self.video_frame.image = imgtk
+            if self.centering is not None:
+                self.show_centering_stats()
+            self.master.after(int(1000 / self.get_display_rate()), self.update_feed)
 
         except Exception as e:
             print("\n[ERROR] Live feed failed.")
             print(f"Message: {e}")
             traceback.print_exc()
             print("[INFO] Stopping video feed...\n")
+            self.stop_feed()
             return
 
     def on_close(self):
         if self.streaming:
             self.stop_feed()
+        if self.link is not None:
+            self.link.close()
         self.master.destroy()
         
 
-    def start_automation(self):
-    # Run the automation in a separate thread so the GUI stays responsive
-        threading.Thread(target=self.automate_scan, daemon=True).start()
+    # ---- Closed Loop Centering ----
+
+    def toggle_centering(self):
+        if self.centering is None:
+            self.start_centering()
+        else:
+            self.stop_centering()
+
+    def centering_move(self, x, y):
+        # one move per frame, far too many to print and nothing waits for the replies (the link still times them)
+        self.link.set_xy(x, y)
+        self.dac = (x, y)
 
-    def automate_scan(self):
+    def start_centering(self):
         if not self.serial or not self.serial.is_open:
             messagebox.showerror("Error", "Serial port not connected.")
             return
         if not self.streaming:
             messagebox.showerror("Error", "Start the camera feed first.")
             return
-
-        results = []
-        fixed_radius = 27.12  # Fixed radius in pixels
-        actual_radius_microns = 125
-        pixel_to_micron_scale = actual_radius_microns / fixed_radius
-
-        # ---- X DAC Scan (Y fixed) ----
-        fixed_dacy = 2048
-        print("Starting DAC X scan...")
-        previous_centroid = None
-
-        for dacx in range(500, 3001, 100):
-            self.set_xy(dacx, fixed_dacy)
-            time.sleep(3)
-
-            centroid, _ = self.find_centroid_in_current_frame()
-            dx_pix = dy_pix = dx_um = dy_um = ''
-            microns_per_dac_x = microns_per_dac_y = ''
-
-            if centroid is not None:
-                cx, cy = centroid
-                if previous_centroid is not None:
-                    dx_pix = cx - previous_centroid[0]
-                    dy_pix = cy - previous_centroid[1]
-                    dx_um = dx_pix * pixel_to_micron_scale
-                    dy_um = dy_pix * pixel_to_micron_scale
-                    microns_per_dac_x = abs(dx_um / 100)
-                    microns_per_dac_y = abs(dy_um / 100)
-
-                previous_centroid = (cx, cy)
+        try:
+            text = self.target_entry.get().strip()
+            if text:
+                target = tuple(float(v) for v in text.split(','))
             else:
-                cx = cy = ''
-
-            results.append([
-                dacx, fixed_dacy, cx, cy, fixed_radius,
-                dx_pix, dy_pix, dx_um, dy_um,
-                microns_per_dac_x, microns_per_dac_y
-            ])
-
-        # ---- Y DAC Scan (X fixed) ----
-        fixed_dacx = 2048
-        print("Starting DAC Y scan...")
-        self.set_xy(2048, 2048)
-        time.sleep(10)
-        previous_centroid = None
-
-        for dacy in range(500, 3001, 100):
-            self.set_xy(fixed_dacx, dacy)
-            time.sleep(3)
-
-            centroid, _ = self.find_centroid_in_current_frame()
+                target = (self.frame_buffer.width / 2, self.frame_buffer.height / 2)
+            if len(target) != 2:
+                raise ValueError("need x, y")
+        except ValueError as e:
+            messagebox.showerror("Invalid Target", f"Target has to be x, y in pixels: {e}")
+            return
+        self.centering = CenteringLoop(self.acquisition, self.centering_move, target, gain=self.calibrated_gain,
+                                       microns_per_pixel=125 / 27.12, start_dac=self.dac)
+        self.centering.start()
+        self.hold_button.config(text="Release")
+        print(f"[INFO] Holding the tip at ({target[0]:.1f}, {target[1]:.1f}) px, "
+              f"gains {self.calibrated_gain[0]:.4f} / {self.calibrated_gain[1]:.4f} µm/DAC")
+
+    def stop_centering(self):
+        if self.centering is None:
+            return
+        self.centering.stop()
+        stats = self.centering.stats()
+        self.centering = None
+        self.hold_button.config(text="Hold Center")
+        self.centering_label.config(text="")
+        print(f"[INFO] Centering stopped after {stats.updates} updates ({stats.missed} frames without the tip), "
+              f"rms error {stats.rms_error:.2f} px, latency {stats.mean_latency * 1000:.2f} ms "
+              f"(max {stats.max_latency * 1000:.2f} ms), command round trip {self.link.stats().mean_rtt * 1000:.2f} ms")
+
+    def show_centering_stats(self):
+        if self.centering.error is not None:
+            messagebox.showerror("Centering Failed", str(self.centering.error))
+            self.stop_centering()
+            return
+        stats = self.centering.stats()
+        self.centering_label.config(text=(
+            f"Hold: {stats.rate:.0f} Hz, error rms {stats.rms_error:.2f} px (max {stats.max_error:.2f}), "
+            f"latency {stats.mean_latency * 1000:.2f} ms, round trip {self.link.stats().mean_rtt * 1000:.2f} ms, "
+            f"DAC {stats.dac[0]}, {stats.dac[1]}"
+            + (" SATURATED" if stats.saturated else "")))
+
+    def start_automation(self, axes=('x', 'y')):
+        # checks and dialogs stay on the Tk thread, the scan itself runs on the ScanRunner's event loop
+        if not self.serial or not self.serial.is_open:
+            messagebox.showerror("Error", "Serial port not connected.")
+            return
+        if not self.streaming:
+            messagebox.showerror("Error", "Start the camera feed first.")
+            return
+        if self.centering is not None:
+            messagebox.showerror("Error", "Release the held tip first.")
+            return
+        if self.scan_runner is not None:
+            messagebox.showerror("Error", "A scan is already running.")
+            return
+        self.scan_events = queue.Queue()
+        self.scan_runner = ScanRunner(self.link, self.acquisition, self.analyze_frame, self.scan_events)
+        self.scan_runner.start(self.automate_scan(self.scan_runner, self.adaptive_var.get(), axes))
+        self.poll_scan_events()
+
+    def poll_scan_events(self):
+        # progress from the scan thread, handled here so only the Tk thread touches widgets
+        while True:
+            try:
+                event = self.scan_events.get_nowait()
+            except queue.Empty:
+                break
+            if event.kind == 'error':
+                self.scan_runner = None
+                self.scan_label.config(text="")
+                messagebox.showerror("Automation Failed", event.message)
+                return
+            print(f"[INFO] {event.message}")
+            if event.kind == 'point':
+                self.scan_label.config(text=f"Scan: {event.done} points, {event.message}")
+            if event.kind == 'done':
+                self.scan_runner = None
+                self.scan_label.config(text="")
+                self.finish_scan(*event.result)
+                return
+        self.master.after(50, self.poll_scan_events)
+
+    async def scan_axis(self, runner, axis, fixed_dac, adaptive, pixel_to_micron_scale):
+        '''steps DAC axis ('x' or 'y') with the other one at fixed_dac, every 100 from 500 to 3000 or, if adaptive,
+        only where the planner asks for points. returns {dac: (centroid, SettleResult)}'''
+        def moves(dacs):
+            return [(dac, fixed_dac) if axis == 'x' else (fixed_dac, dac) for dac in dacs]
+
+        measured = {}
+        if not adaptive:
+            dacs = list(range(500, 3001, 100))
+            for dac, point in zip(dacs, await runner.measure(moves(dacs))):
+                measured[dac] = (point.centroid, point.settle)
+            return measured
+
+        planner = AdaptiveScanPlanner(500, 3000)
+        k = 0 if axis == 'x' else 1
+        while True:
+            batch = planner.next_points()
+            if not batch:
+                break
+            for dac, point in zip(batch, await runner.measure(moves(batch))):
+                measured[dac] = (point.centroid, point.settle)
+                # the mean over the settle window is sub-pixel, the contour centroid is whole pixels
+                center = point.settle.center if point.settle.settled else point.centroid
+                planner.add(dac, None if center is None else center[k] * pixel_to_micron_scale)
+        print(f"[INFO] Adaptive {axis.upper()} scan: {len(measured)} moves, {planner.reason}")
+        fit = planner.fit()
+        if fit is not None:
+            print(f"[INFO] Fitted µm/DAC ({axis.upper()}): {fit.slope:.4f} ± {fit.slope_ci:.4f} (95%)")
+        return measured
+
+    def update_calibrated_gain(self, axis, measured, pixel_to_micron_scale):
+        # signed um/DAC of the axis from a line through the scan, the centering loop uses it as its plant model
+        k = 0 if axis == 'x' else 1
+        points = [(dac, centroid[k]) for dac, (centroid, _) in measured.items() if centroid is not None]
+        if len(points) >= 2:
+            dacs, pixels = np.array(points, dtype=float).T
+            self.calibrated_gain[k] = float(np.polyfit(dacs, pixels, 1)[0] * pixel_to_micron_scale)
+            print(f"[INFO] Calibrated gain ({axis.upper()}): {self.calibrated_gain[k]:.4f} µm/DAC")
+
+    def scan_rows(self, measured, axis, fixed_dac, fixed_radius, pixel_to_micron_scale):
+        # CSV rows in DAC order, movement is from the previous point that had a centroid
+        rows = []
+        previous = None # (dac, centroid)
+        for dac in sorted(measured):
+            centroid, settle = measured[dac]
             dx_pix = dy_pix = dx_um = dy_um = ''
             microns_per_dac_x = microns_per_dac_y = ''
 
             if centroid is not None:
                 cx, cy = centroid
-                if previous_centroid is not None:
-                    dx_pix = cx - previous_centroid[0]
-                    dy_pix = cy - previous_centroid[1]
+                if previous is not None:
+                    step = dac - previous[0]
+                    dx_pix = cx - previous[1][0]
+                    dy_pix = cy - previous[1][1]
                     dx_um = dx_pix * pixel_to_micron_scale
                     dy_um = dy_pix * pixel_to_micron_scale
-                    microns_per_dac_x = abs(dx_um / 100)
-                    microns_per_dac_y = abs(dy_um / 100)
+                    microns_per_dac_x = abs(dx_um / step)
+                    microns_per_dac_y = abs(dy_um / step)
 
-                previous_centroid = (cx, cy)
+                previous = (dac, centroid)
             else:
                 cx = cy = ''
 
-            results.append([
-                fixed_dacx, dacy, cx, cy, fixed_radius,
+            dacx, dacy = (dac, fixed_dac) if axis == 'x' else (fixed_dac, dac)
+            rows.append([
+                dacx, dacy, cx, cy, fixed_radius,
                 dx_pix, dy_pix, dx_um, dy_um,
-                microns_per_dac_x, microns_per_dac_y
+                microns_per_dac_x, microns_per_dac_y, settle.settle_time
             ])
+        return rows
 
+    async def automate_scan(self, runner, adaptive=False, axes=('x', 'y')):
+        '''the scan itself, on the runner's event loop (no Tk in here). returns (rows, averages) for finish_scan'''
+        results = []
+        fixed_radius = 27.12  # Fixed radius in pixels
+        actual_radius_microns = 125
+        pixel_to_micron_scale = actual_radius_microns / fixed_radius
+        averages = {}
+
+        for axis in axes:
+            if results:
+                # back to the middle before the next axis
+                await runner.move(2048, 2048, timeout=10)
+            runner.report(f"Starting DAC {axis.upper()} scan...")
+            measured = await self.scan_axis(runner, axis, 2048, adaptive, pixel_to_micron_scale)
+            self.update_calibrated_gain(axis, measured, pixel_to_micron_scale)
+            rows = self.scan_rows(measured, axis, 2048, fixed_radius, pixel_to_micron_scale)
+            values = [row[9 if axis == 'x' else 10] for row in rows]
+            averages[axis] = np.mean([v for v in values if v != ''] or [np.nan])
+            results += rows
+        self.dac = runner.dac
+        return results, averages
+
+    def finish_scan(self, results, averages):
         # ---- Save to CSV ----
         filename = filedialog.asksaveasfilename(defaultextension=".csv",
                                                 filetypes=[("CSV files", "*.csv")],
@@ -405,23 +568,18 @@ class TestingApp:
                 writer.writerow([
                     'DAC_X', 'DAC_Y', 'Centroid_X', 'Centroid_Y', 'Fixed_Radius_px',
                     'Delta_X_pixels', 'Delta_Y_pixels', 'Delta_X_microns', 'Delta_Y_microns',
-                    'Microns/DAC_X', 'Microns/DAC_Y'
+                    'Microns/DAC_X', 'Microns/DAC_Y', 'Settle_Time_s'
                 ])
                 for row in results:
                     writer.writerow(row)
             messagebox.showinfo("Save Complete", f"Results saved to {filename}")
 
-        # ---- Final µm/ADC Step Stats ----
-        dx_um_values = [row[7] for row in results if isinstance(row[7], (int, float, np.float64))]
-        dy_um_values = [row[8] for row in results if isinstance(row[8], (int, float, np.float64))]
-
-        if dx_um_values:
-            avg_dx_um_per_adc = np.mean([abs(v) for v in dx_um_values]) / 100
-            print(f"Avg µm/DAC step (X): {avg_dx_um_per_adc:.3f}")
-
-        if dy_um_values:
-            avg_dy_um_per_adc = np.mean([abs(v) for v in dy_um_values]) / 100
-            print(f"Avg µm/DAC step (Y): {avg_dy_um_per_adc:.3f}")
+        # ---- Final µm/DAC Step Stats, each axis from its own scan rows ----
+        for axis, average in averages.items():
+            print(f"Avg µm/DAC step ({axis.upper()}): {average:.3f}")
+        link = self.link.stats()
+        print(f"[INFO] {link.replied} commands, round trip {link.mean_rtt * 1000:.2f} ms (max {link.max_rtt * 1000:.2f} ms), "
+              f"{link.timeouts} timed out")
 
         print("Automation complete.")
 
@@ -437,39 +595,29 @@ class TestingApp:
 
     def find_centroid_in_current_frame(self):
         # Ensure we have a captured frame to analyze
-        if not hasattr(self, 'live_captured_frames') or not self.live_captured_frames:
+        if not hasattr(self, 'acquisition') or self.acquisition.latest() is None:
             print("No frames available to find centroid.")
             return None, None
 
-        frame = self.live_captured_frames[-1]
-
-        # Threshold the image (assumes bright object on dark background)
-        _, thresh = cv2.threshold(frame, 127, 255, cv2.THRESH_BINARY)
-
-        # Find contours
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        if not contours:
+        frame = self.acquisition.latest().copy()  # the camera keeps writing into the ring buffer
+        centroid = self.analyze_frame(frame)
+        if centroid is None:
             print("No contours found.")
             return None, None
 
-        # Choose largest contour (assumed to be the object)
-        largest_contour = max(contours, key=cv2.contourArea)
-
-        # Compute centroid from image moments
-        moments = cv2.moments(largest_contour)
-        if moments["m00"] == 0:
-            print("Zero contour area; centroid undefined.")
-            return None, None
-
-        cX = int(moments["m10"] / moments["m00"])
-        cY = int(moments["m01"] / moments["m00"])
-
         fixed_radius = 27.12  # pixels
 
-        print(f"Centroid: ({cX}, {cY}), Fixed Radius: {fixed_radius:.2f} px")
+        print(f"Centroid: ({centroid[0]}, {centroid[1]}), Fixed Radius: {fixed_radius:.2f} px")
+
+        return centroid, fixed_radius
 
-        return (cX, cY), fixed_radius
+    def analyze_frame(self, frame):
+        '''(x, y) whole pixel centroid of the largest contour above 127 (assumes bright object on dark background),
+        None if there isn't one. the scan runner calls this from a worker thread'''
+        centroid = contour_centroid(frame, threshold=127)
+        if centroid is None:
+            return None
+        return int(centroid.center[0]), int(centroid.center[1])
 
 
 
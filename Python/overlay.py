@@ -1,17 +1,33 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 import numpy as np
 import pandas as pd
-import h5py
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename, asksaveasfilename
 
+from fiberdetect import shard_ranges
+from zwocapture import H5VideoReader
+
+# ==== Export configuration ====
+EXPORT_CODEC = 'mp4v'   # fourcc of the output, e.g. 'mp4v', 'avc1', 'XVID', 'MJPG'
+EXPORT_QUALITY = None   # 0-100 for codecs that take a quality setting (MJPG), None keeps the codec default
+EXPORT_SPEED = 1.0      # 1 plays back at the capture rate, 0.25 is 4x slow motion
+EXPORT_WORKERS = None   # annotation processes, None for one per core, 1 draws everything in this process
+FALLBACK_FPS = 120      # capture rate used when the file doesn't have an actual_fps attr
+
 def load_h5_video(h5_path):
-    """Load video frames from .h5 file (assuming frames stored as dataset 'frames')."""
-    with h5py.File(h5_path, 'r') as f:
-        frames = f['frames'][:]  # shape: (num_frames, H, W) or (num_frames, H, W, C)
-        if len(frames.shape) == 3:  # grayscale
-            frames = np.stack([frames]*3, axis=-1)
-    return frames
+    """Open the video frames of an .h5 file (dataset 'frames') lazily, nothing is read until a frame is used.
+    shape is (num_frames, H, W) or (num_frames, H, W, C), grayscale frames are converted to BGR one at a time."""
+    return H5VideoReader(h5_path)
+
+def to_bgr(frame):
+    if frame.ndim == 2:  # grayscale
+        return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    return frame.copy()
 
 def load_centroids(csv_path):
     df = pd.read_csv(csv_path)
@@ -30,6 +46,131 @@ def get_trail_colors(length):
         colors.append((b, g, r))  # OpenCV uses BGR
     return colors
 
+def trail_points(centroids, frame_count):
+    """(x, y) int pixel for every frame with a valid centroid, None for the rest."""
+    points = []
+    for cx_raw, cy_raw in centroids[:frame_count]:
+        cx_str, cy_str = str(cx_raw), str(cy_raw)
+        point = None
+        # Valid centroid check
+        if cx_str != 'None' and cy_str != 'None':
+            try:
+                point = (int(float(cx_str)), int(float(cy_str)))
+            except ValueError:
+                pass  # skip invalid conversion (empty cells come in as nan)
+        points.append(point)
+    return points
+
+class TrailRenderer:
+    """Draws the centroid trail incrementally. Every point is drawn once onto a persistent trail layer and the layer
+    is copied onto each frame, so a frame costs the same however long the trail already is.
+    The red to blue colors are spread over the whole recording's points (one LUT up front), a point keeps its color.
+    state (from state()) carries on from a trail drawn elsewhere instead of starting empty."""
+    def __init__(self, height, width, n_points, radius=3, state=None):
+        if state is None:
+            self.layer = np.zeros((height, width, 3), dtype=np.uint8)
+            self.mask = np.zeros((height, width), dtype=np.uint8)  # 1 where the trail has been drawn
+            self.count = 0
+        else:
+            self.layer, self.mask, self.count = state
+        self.colors = get_trail_colors(n_points)
+        self.radius = radius
+
+    def add(self, point):
+        cv2.circle(self.layer, point, self.radius, self.colors[self.count], -1)
+        cv2.circle(self.mask, point, self.radius, 1, -1)
+        self.count += 1
+
+    def draw(self, frame):
+        np.copyto(frame, self.layer, where=self.mask.view(bool)[..., None])
+        return frame
+
+    def state(self):
+        """copy of the trail so far, to hand to another TrailRenderer"""
+        return self.layer.copy(), self.mask.copy(), self.count
+
+def _annotate_shard(h5_path, start, stop, points, trail_state, n_points, radius):
+    # runs in a worker process, has to be importable at module level for spawn (windows).
+    # points are the shard's own frames' points, trail_state the trail of every frame before start.
+    # n_points is the whole video's count so the colors come out the same in every shard
+    with H5VideoReader(h5_path) as frames:
+        height, width = frames.shape[1:3]
+        block = frames[start:stop]
+    trail = TrailRenderer(height, width, n_points, radius, trail_state)
+    out = np.empty((len(block), height, width, 3), dtype=np.uint8)
+    for k, frame in enumerate(block):
+        if points[k] is not None:
+            trail.add(points[k])
+        out[k] = trail.draw(to_bgr(frame))
+    return out
+
+def export_overlay(h5_path, points, save_path, fps, codec=EXPORT_CODEC, quality=None, workers=None, radius=3,
+                   target_bytes=32 * 1024**2):
+    """Writes the trail video for frames 0..len(points) of an .h5 recording. Shards of frames are read and annotated
+    on a process pool while this process encodes the finished shards in frame order with one VideoWriter.
+    Only about two shards per worker are in flight at a time so memory stays flat. The trail each shard starts from is
+    drawn here, one point at a time as the shards are handed out. Returns the number of frames written."""
+    workers = workers or os.cpu_count()
+    n_points = sum(point is not None for point in points)
+    with H5VideoReader(h5_path) as frames:
+        height, width = frames.shape[1:3]
+        chunk_frames = frames.chunks[0] if frames.chunks else frames.block_frames
+    points = list(points)
+    frame_count = len(points)
+    frame_bytes = height * width * 3
+    n_shards = max(workers * 4, -(-frame_count * frame_bytes // target_bytes))
+    shards = shard_ranges(frame_count, chunk_frames, n_shards)
+
+    if codec == 'MJPG' and quality is not None:
+        # only opencv's own MJPEG writer takes a quality setting, the ffmpeg one ignores it
+        out = cv2.VideoWriter(save_path, cv2.CAP_OPENCV_MJPEG, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+    else:
+        out = cv2.VideoWriter(save_path, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+    if not out.isOpened():
+        raise RuntimeError(f"could not open a '{codec}' video writer for {save_path}")
+    if quality is not None and not out.set(cv2.VIDEOWRITER_PROP_QUALITY, quality):
+        print(f"[INFO] '{codec}' doesn't take a quality setting, using its default.")
+
+    trail = TrailRenderer(height, width, n_points, radius)
+    drawn = 0 # points already on trail, shards come in order so each point is drawn here once
+
+    def shard_args(start, stop):
+        nonlocal drawn
+        for point in points[drawn:start]:
+            if point is not None:
+                trail.add(point)
+        drawn = start
+        return h5_path, start, stop, points[start:stop], trail.state(), n_points, radius
+
+    written = 0
+    try:
+        if workers == 1:
+            for start, stop in shards:
+                for frame in _annotate_shard(*shard_args(start, stop)):
+                    out.write(frame)
+                    written += 1
+            return written
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            todo = iter(shards)
+            pending = deque()
+
+            def submit_next():
+                for start, stop in todo:
+                    pending.append(pool.submit(_annotate_shard, *shard_args(start, stop)))
+                    return
+
+            for _ in range(workers * 2):
+                submit_next()
+            while pending:
+                annotated = pending.popleft().result()
+                submit_next() # keep the workers busy while this shard is encoded
+                for frame in annotated:
+                    out.write(frame)
+                    written += 1
+    finally:
+        out.release()
+    return written
+
 def main():
     Tk().withdraw()
 
@@ -45,15 +186,18 @@ def main():
         print("No .csv file selected, exiting.")
         return
 
-    print("Loading video frames...")
+    print("Opening video frames...")
     frames = load_h5_video(h5_path)
-    print(f"Loaded {len(frames)} frames.")
+    print(f"Found {len(frames)} frames.")
+    capture_fps = frames.capture_fps or FALLBACK_FPS
+    frame_total = len(frames)
+    frames.close() # the export workers open the file themselves
 
     print("Loading centroid data...")
     centroids = load_centroids(csv_path)
     print(f"Loaded {len(centroids)} centroid points.")
 
-    if len(centroids) != len(frames):
+    if len(centroids) != frame_total:
         print("Warning: Number of centroids and frames differ. Will overlay up to the minimum count.")
 
     save_path = asksaveasfilename(defaultextension=".mp4",
@@ -63,36 +207,20 @@ def main():
         print("No save path selected, exiting.")
         return
 
-    height, width = frames[0].shape[:2]
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    fps = 5
-    out = cv2.VideoWriter(save_path, fourcc, fps, (width, height))
-
-    frame_count = min(len(frames), len(centroids))
-    trail_buffer = []
+    frame_count = min(frame_total, len(centroids))
+    points = trail_points(centroids, frame_count)
+    fps = capture_fps * EXPORT_SPEED
+    print(f"Exporting {frame_count} frames at {fps:g} FPS ({EXPORT_CODEC})...")
 
-    for i in range(frame_count):
-        frame = frames[i].copy()
-        cx_raw, cy_raw = centroids[i]
-        cx_str, cy_str = str(cx_raw), str(cy_raw)
-
-        # Valid centroid check
-        if cx_str != 'None' and cy_str != 'None':
-            try:
-                cx, cy = int(float(cx_str)), int(float(cy_str))
-                trail_buffer.append((cx, cy))  # update trail
-            except ValueError:
-                pass  # skip invalid conversion
-
-        # Draw persistent trail (all valid points so far)
-        trail_colors = get_trail_colors(len(trail_buffer))
-        for idx, (x, y) in enumerate(trail_buffer):
-            cv2.circle(frame, (x, y), 3, trail_colors[idx], -1)
-
-        out.write(frame)
-
-    out.release()
+    start_time = time.perf_counter()
+    try:
+        written = export_overlay(h5_path, points, save_path, fps, EXPORT_CODEC, EXPORT_QUALITY, EXPORT_WORKERS)
+    except RuntimeError as e:
+        print(f"[ERROR] {e}")
+        return
+    elapsed = time.perf_counter() - start_time
     print(f"Video saved successfully at: {save_path}")
+    print(f"[INFO] {written} frames in {elapsed:.1f} s ({written / max(elapsed, 1e-9):.0f} frames/s)")
 
 if __name__ == "__main__":
     main()
@@ -12,7 +12,10 @@ from tkinter import filedialog # Explicit imports, no wildcard
 import numpy as np
 import cv2
 
-import zwoasi as asi
+if os.getenv('ZWO_SIMULATE'): # no camera attached, made up frames instead (see zwocapture/simcam.py)
+    from zwocapture import simcam as asi
+else:
+    import zwoasi as asi
 import h5py
 
 from PIL import Image, ImageTk 
@@ -24,6 +27,8 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolb
 import matplotlib.animation as animation
 import matplotlib.cm as cm
 
+from zwocapture import FrameRingBuffer, AcquisitionThread
+
 
 
 class CameraApp:
@@ -62,6 +67,12 @@ class CameraApp:
         self.target_entry.insert(100, '100')
         self.target_entry.pack()
 
+        # Live view refresh, the acquisition thread grabs at the target rate on its own
+        tk.Label(master, text="Display Rate (Hz):").pack()
+        self.display_rate_entry = tk.Entry(master)
+        self.display_rate_entry.insert(0, "30")
+        self.display_rate_entry.pack()
+
         # Frame Rate Buttons
         self.framerate_button_frame = tk.Frame(master)
         self.framerate_button_frame.pack()
@@ -247,9 +258,19 @@ class CameraApp:
             self.camera.set_control_value(asi.ASI_GAIN, gain_value)
             self.camera.set_control_value(asi.ASI_EXPOSURE, exposure_time)
 
+            # Start a new buffer, keeps the last 5000 frames
+            width, height, _, _ = self.camera.get_roi_format()
+            self.frame_buffer = FrameRingBuffer(height, width, capacity=5000)
+
+            # grabs are paced at the target rate, 0 grabs as fast as the camera delivers
+            target_rate = self.get_target_rate()
+            target_rate = target_rate if target_rate > 0 else None
+            print(f"[INFO] Target rate: {target_rate or 'camera max'} fps")
             self.camera.start_video_capture()
+            self.acquisition = AcquisitionThread(self.camera, self.frame_buffer, timeout=1000,  # 1000 ms timeout
+                                                 rate=target_rate)
+            self.acquisition.start()
             self.streaming = True
-            self.live_captured_frames = []  # Start a new buffer
             self.stop_button.config(state=tk.NORMAL)
             self.start_button.config(state=tk.DISABLED)
             self.update_feed()
@@ -263,6 +284,7 @@ class CameraApp:
             self.stream_start_time = None
         if self.streaming:
             try:
+                self.acquisition.stop()  # thread has to be done grabbing before capture is stopped
                 self.camera.stop_video_capture()
                 self.streaming = False
                 self.start_button.config(state=tk.NORMAL)
@@ -273,65 +295,45 @@ class CameraApp:
                 messagebox.showerror("Stop Failed", str(e))
             
 
+    def get_display_rate(self):
+        try:
+            return max(1.0, float(self.display_rate_entry.get()))
+        except ValueError:
+            return 30.0  # fallback/default
+
     def update_feed(self):
-        if not self.streaming:
+        # only draws, the frames are grabbed by self.acquisition
+        if not self.streaming or getattr(self, 'acquisition', None) is None:
             return
 
         try:
-            frame_start_time = time.time()
-            # Get ROI dimensions
-            width, height, _, _ = self.camera.get_roi_format()
+            if self.acquisition.error is not None:
+                raise self.acquisition.error
             if not self.roi_info_logged:
-                print(f"[INFO] ROI Format: width={width}, height={height}")
+                print(f"[INFO] ROI Format: width={self.frame_buffer.width}, height={self.frame_buffer.height}")
                 self.roi_info_logged = True
 
-            # Prepare buffer
-            expected_buffer_size = width * height  # Grayscale
-            buffer = bytearray(expected_buffer_size)
-            
-
-            # corrected argument order: timeout first
-            self.camera.get_video_data(1000, buffer)  # 1000 ms timeout
-
-            actual_buffer_size = len(buffer)
-            if actual_buffer_size != expected_buffer_size:
-                raise ValueError(f"Unexpected buffer size. Expected {expected_buffer_size}, got {actual_buffer_size}")
-
-            # Convert to numpy and reshape
-            frame = np.frombuffer(buffer, dtype=np.uint8).reshape((height, width))
+            frame = self.acquisition.latest()
+            if frame is not None:
+                # Resize for display
+                frame_resized = cv2.resize(frame, (640, 480))
 
-            # Resize for display
-            frame_resized = cv2.resize(frame, (640, 480))
+                # Convert to Tkinter-compatible image
+                img = Image.fromarray(frame_resized, mode='L')
+                imgtk = ImageTk.PhotoImage(image=img)
 
-            #reset roi to involve target
-                    # Save to live frame buffer
-            if not hasattr(self, 'live_captured_frames'):
-                self.live_captured_frames = []
-            self.live_captured_frames.append(frame.copy())  # Save original (not resized) frame
-            if len(self.live_captured_frames) > 5000:
-                self.live_captured_frames.pop(0)
-
-
-            # Convert to Tkinter-compatible image
-            img = Image.fromarray(frame_resized, mode='L')
-            imgtk = ImageTk.PhotoImage(image=img)
-
-            # Update GUI frame
-            self.video_frame.configure(image=imgtk)
-            self.video_frame.image = imgtk  # prevent garbage collection
-            rate = self.get_target_rate()
-            frame_interval_us = 1e6 / rate
-            elapsed_us = (time.time() - frame_start_time) * 1e6
-            delay_ms = max(1, int((frame_interval_us - elapsed_us) / 1000))
-            self.master.after(delay_ms, self.update_feed)
+                # Update GUI frame
+                self.video_frame.configure(image=imgtk)
+                self.video_frame.image = imgtk  # prevent garbage collection
+            self.master.after(int(1000 / self.get_display_rate()), self.update_feed)
 
         except Exception as e:
             print("\n[ERROR] Live feed failed.")
             print(f"Message: {e}")
             traceback.print_exc()
             print("[INFO] Stopping video feed...\n")
+            self.stop_feed()
             return
-       #self.master.after(30, self.update_feed)
         
     def on_close(self):
         if self.streaming:
@@ -391,20 +393,22 @@ class CameraApp:
 
     def save_last_frames(self):
         self.stop_feed()
-        if hasattr(self, 'live_captured_frames') and self.live_captured_frames:
+        if hasattr(self, 'frame_buffer') and len(self.frame_buffer):
             metadata = {
                 "gain": self.gain_entry.get(),
                 "exposure": self.exposure_entry.get(),
                 "roi": str(self.current_roi),
                 "target_fps": self.target_entry.get(),
-                "frame_count": len(self.live_captured_frames),
+                "actual_fps": str(self.acquisition.fps),
+                "frame_count": len(self.frame_buffer),
+                "dropped_frames": self.acquisition.dropped_frames,
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
             }
-            self.save_capture_data_to_h5(self.live_captured_frames, metadata)
+            self.save_capture_data_to_h5(self.frame_buffer.last(), metadata, self.frame_buffer.last_stamps())
         else:
             messagebox.showinfo("No Frames", "No frames have been captured during live feed.")
 
-    def save_capture_data_to_h5(self, frames, metadata):
+    def save_capture_data_to_h5(self, frames, metadata, stamps=None):
         try:
             filename = filedialog.asksaveasfilename(
                 title="Save capture data",
@@ -418,7 +422,11 @@ class CameraApp:
             with h5py.File(filename, 'w') as h5f:
                 for key, value in metadata.items():
                     h5f.attrs[key] = value
-                h5f.create_dataset('frames', data=np.array(frames), compression="gzip")
+                h5f.create_dataset('frames', data=frames, compression="gzip")
+                if stamps is not None:
+                    timestamps, dropped = stamps
+                    h5f.create_dataset('timestamps', data=timestamps).attrs['units'] = 'ns, time.perf_counter_ns()'
+                    h5f.create_dataset('dropped_frames', data=dropped).attrs['units'] = "camera's get_dropped_frames() counter"
             print(f"[INFO] Data saved to {filename}")
         except Exception as e:
             print(f"[ERROR] Saving failed: {e}")
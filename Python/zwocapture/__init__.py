@@ -0,0 +1,12 @@
+"""
+Frame acquisition code shared by the ZWO camera apps, no tkinter in here either.
+"""
+from .ringbuffer import FrameRingBuffer
+from .camera import grab_into
+from .acquisition import AcquisitionThread
+from .h5record import H5Recorder
+from .timebase import frame_times, find_gaps, resample_uniform, align_streams
+from .h5reader import H5VideoReader
+from .clock import sleep_until
+from .playback import PlaybackEngine, play_video
+from .simcam import SimulatedCamera, FiberTipScene
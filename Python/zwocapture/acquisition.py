@@ -0,0 +1,97 @@
+"""
+Producer thread that pulls frames off the camera as fast as the sensor delivers them.
+The GUI doesn't grab anything anymore, it just looks at the newest frame in the ring buffer at its own display rate,
+so the capture rate is set by the camera and not by how fast Tk can draw.
+Given a rate it grabs on a fixed grid of deadlines instead (start_time + i / rate, slept to with clock.sleep_until),
+threads for several cameras that share start_time then grab at the same instants.
+"""
+import math
+import threading
+import time
+import traceback
+
+from .camera import grab_into
+from .clock import sleep_until
+
+
+class AcquisitionThread(threading.Thread):
+    def __init__(self, camera, frame_buffer, timeout=1000, rate=None, start_time=None, max_frames=None):
+        '''camera has to be in video capture mode already (start_video_capture), frames go into frame_buffer.
+        rate (Hz) paces the grabs on deadlines start_time + i / rate (perf_counter, default when the thread starts),
+        None grabs as fast as the camera delivers. the thread ends by itself after max_frames frames if given'''
+        super().__init__(daemon=True)
+        if frame_buffer.capacity < 2:
+            raise ValueError("Frame buffer needs room for at least 2 frames") # otherwise latest() is always being written
+        self.camera = camera
+        self.frame_buffer = frame_buffer
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.error = None # exception that stopped the thread, if any
+        self.first_frame_time = None # perf_counter ns
+        self.last_frame_time = None
+        self.dropped_frames = 0 # camera's counter, frames it had to throw away because we didn't read them in time
+        self.rate = rate
+        self.start_time = start_time
+        self.max_frames = max_frames
+        self.missed_deadlines = 0 # paced grabs skipped because the one before took longer than a period
+
+    def run(self):
+        try:
+            has_dropped_counter = hasattr(self.camera, 'get_dropped_frames')
+            start = time.perf_counter() if self.start_time is None else self.start_time
+            tick = grabbed = 0
+            while not self.stop_event.is_set():
+                if self.max_frames is not None and grabbed >= self.max_frames:
+                    break
+                if self.rate:
+                    # next deadline on the grid. one we're more than half a period late for is skipped, so a slow
+                    # grab doesn't make it race through a backlog and the frames stay on the grid
+                    due = max(tick, math.floor((time.perf_counter() - start) * self.rate + 0.5))
+                    self.missed_deadlines += due - tick
+                    sleep_until(start + due / self.rate)
+                    tick = due + 1
+                grab_into(self.camera, self.frame_buffer.next_slot(), self.timeout)
+                grabbed += 1
+                now = time.perf_counter_ns()
+                dropped = self.camera.get_dropped_frames() if has_dropped_counter else 0
+                with self.lock:
+                    self.frame_buffer.commit(now, dropped)
+                    if self.first_frame_time is None:
+                        self.first_frame_time = now
+                    self.last_frame_time = now
+                    self.dropped_frames = dropped
+        except Exception as e:
+            if not self.stop_event.is_set(): # a grab timing out because we were stopped isn't an error
+                self.error = e
+                print("\n[ERROR] Frame acquisition failed.")
+                traceback.print_exc()
+
+    def stop(self, timeout=None):
+        '''asks the thread to finish and waits for it, call this before camera.stop_video_capture()'''
+        self.stop_event.set()
+        if self.is_alive():
+            self.join(timeout if timeout is not None else 2 * self.timeout / 1000)
+
+    @property
+    def frame_count(self):
+        return self.frame_buffer.count
+
+    def latest(self):
+        '''newest frame as a view into the ring buffer, None before the first frame.
+        it stays valid until the camera has wrapped around the whole buffer, copy it if you keep it longer'''
+        with self.lock:
+            return self.frame_buffer.latest()
+
+    def last_segments(self, n=None):
+        with self.lock:
+            return self.frame_buffer.last_segments(n)
+
+    @property
+    def fps(self):
+        '''rate the camera actually delivered frames at, measured between the first and last grab'''
+        with self.lock:
+            count = self.frame_buffer.count
+            if count < 2 or self.last_frame_time <= self.first_frame_time:
+                return 0.0
+            return (count - 1) * 1e9 / (self.last_frame_time - self.first_frame_time)
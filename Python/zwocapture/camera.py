@@ -0,0 +1,21 @@
+"""
+Helpers around the zwoasi camera object.
+"""
+import ctypes
+
+import numpy as np
+import zwoasi as asi
+
+
+def grab_into(camera, out, timeout=1000):
+    '''reads the next video frame straight into out (a contiguous uint8 array, e.g. FrameRingBuffer.next_slot()).
+    zwoasi's get_video_data only takes a bytearray, so for a real camera the SDK call is made directly on out's memory'''
+    if isinstance(camera, asi.Camera):
+        buffer_ = out.ctypes.data_as(ctypes.POINTER(ctypes.c_char))
+        r = asi.zwolib.ASIGetVideoData(camera.id, buffer_, out.nbytes, int(timeout))
+        if r:
+            raise asi.zwo_errors[r]
+        return out
+    # anything else that looks like a camera, costs one copy
+    out[...] = np.frombuffer(camera.get_video_data(timeout), dtype=np.uint8).reshape(out.shape)
+    return out
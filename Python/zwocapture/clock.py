@@ -0,0 +1,17 @@
+"""
+Deadline timing on the monotonic clock, the same on windows and linux.
+time.sleep alone can oversleep by a whole scheduler tick (~15 ms on windows), so the last bit is spun.
+"""
+import time
+
+
+def sleep_until(deadline, spin=0.002):
+    '''waits until time.perf_counter() reaches deadline. sleeps most of the way and busy waits the last spin seconds.
+    returns how late it woke up in seconds (0 or a tiny positive number, more if deadline had already passed)'''
+    remaining = deadline - time.perf_counter()
+    if remaining > spin:
+        time.sleep(remaining - spin)
+    now = time.perf_counter()
+    while now < deadline:
+        now = time.perf_counter()
+    return now - deadline
@@ -0,0 +1,150 @@
+"""
+Lazy reader for recorded .h5 videos. Nothing is loaded when the file is opened, frames are read in chunk aligned blocks
+as they are needed and sequential reads go through a small read-ahead thread, so a multi GB recording opens instantly
+and memory stays flat however long it is.
+"""
+import ast
+import queue
+import threading
+
+import h5py
+import numpy as np
+
+from .timebase import frame_times
+
+
+class H5VideoReader:
+    def __init__(self, path, dataset='frames', block_frames=None, read_ahead=2, target_bytes=16 * 1024**2):
+        '''block_frames is how many frames are read at once (a whole number of h5 chunks about target_bytes big
+        if None), read_ahead is how many blocks the background thread may get ahead of the consumer'''
+        self.path = path
+        self.h5f = h5py.File(path, 'r')
+        if dataset not in self.h5f:
+            self.h5f.close()
+            raise KeyError(f"'{dataset}' dataset not found in {path}")
+        self.frames = self.h5f[dataset]
+        self.attrs = dict(self.h5f.attrs)
+        self.read_ahead = read_ahead
+        if block_frames is None:
+            frame_bytes = max(1, int(np.prod(self.frames.shape[1:])) * self.frames.dtype.itemsize)
+            block_frames = max(1, target_bytes // frame_bytes)
+            if self.frames.chunks:
+                block_frames = max(self.frames.chunks[0], block_frames // self.frames.chunks[0] * self.frames.chunks[0])
+        self.block_frames = block_frames
+        self._block_start = None # one cached block for random access
+        self._block = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.h5f.close()
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def shape(self):
+        return self.frames.shape
+
+    @property
+    def dtype(self):
+        return self.frames.dtype
+
+    @property
+    def chunks(self):
+        return self.frames.chunks
+
+    @property
+    def capture_fps(self):
+        '''actual_fps attr as a float, None if it wasn't stored (or was stored as "unknown")'''
+        try:
+            return float(self.attrs['actual_fps'])
+        except (KeyError, ValueError):
+            return None
+
+    @property
+    def roi(self):
+        '''(start_x, start_y, width, height) from the roi attr, None if it isn't there'''
+        try:
+            return tuple(ast.literal_eval(str(self.attrs['roi'])))
+        except (KeyError, ValueError, SyntaxError):
+            return None
+
+    def times(self, fallback_fps=120.0):
+        '''seconds since the first frame, from the timestamps dataset if there is one'''
+        return frame_times(self.h5f, self.capture_fps or fallback_fps)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step > 0:
+                return self.frames[start:stop:step]
+            wanted = np.arange(start, stop, step) # h5py can't do negative steps, read the span and pick from it
+            if len(wanted) == 0:
+                return self.frames[0:0]
+            return self.frames[wanted[-1]:wanted[0] + 1][wanted - wanted[-1]]
+        if isinstance(index, tuple): # e.g. reader[i, y0:y1, x0:x1]
+            return self.frames[index]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"frame {index} out of range for {len(self)} frames")
+        start = index // self.block_frames * self.block_frames
+        if start != self._block_start:
+            self._block = self.frames[start:start + self.block_frames]
+            self._block_start = start
+        return self._block[index - start]
+
+    def iter_blocks(self, start=0, stop=None):
+        '''yields (first frame number, block) in order, the next blocks are read in the background meanwhile'''
+        stop = len(self) if stop is None else min(stop, len(self))
+        blocks = queue.Queue(maxsize=self.read_ahead)
+        done = threading.Event()
+
+        def put(item):
+            # gives up once the consumer is gone, so the thread can't hang on a full queue
+            while not done.is_set():
+                try:
+                    blocks.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def reader():
+            try:
+                # first block ends on a block boundary so every read after it is chunk aligned
+                first = start
+                while first < stop and not done.is_set():
+                    last = min(stop, (first // self.block_frames + 1) * self.block_frames)
+                    put((first, self.frames[first:last]))
+                    first = last
+            except Exception as e:
+                put(e)
+                return
+            put(None)
+
+        thread = threading.Thread(target=reader, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = blocks.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            done.set() # consumer stopped early, let the reader thread finish
+            thread.join()
+
+    def __iter__(self):
+        return self.iter_frames()
+
+    def iter_frames(self, start=0, stop=None):
+        for _, block in self.iter_blocks(start, stop):
+            yield from block
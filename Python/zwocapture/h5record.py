@@ -0,0 +1,143 @@
+"""
+Stream to disk recording. The .h5 is opened when the feed starts and a writer thread follows the ring buffer,
+appending every new frame to a resizable 'frames' dataset, so a recording is only limited by the disk.
+"""
+import threading
+
+import h5py
+import numpy as np
+
+
+class _FrameStream:
+    '''the datasets one frame buffer is appended to (frames, timestamps, dropped_frames under group) and how far
+    the writer has got in the buffer'''
+    def __init__(self, parent, frame_buffer, frames_per_chunk=1, compression=None, batch=64):
+        self.parent = parent # the h5 file or a group in it
+        self.frame_buffer = frame_buffer
+        self.batch = batch
+        height, width = frame_buffer.height, frame_buffer.width
+        self.dataset = parent.create_dataset('frames', shape=(0, height, width), maxshape=(None, height, width),
+                                             chunks=(frames_per_chunk, height, width), dtype=np.uint8,
+                                             compression=compression)
+        # per frame time base, so analysis doesn't have to assume the camera ran at a perfectly steady rate
+        self.timestamps = parent.create_dataset('timestamps', shape=(0,), maxshape=(None,), chunks=(4096,), dtype=np.int64)
+        self.timestamps.attrs['units'] = 'ns, time.perf_counter_ns()'
+        self.dropped = parent.create_dataset('dropped_frames', shape=(0,), maxshape=(None,), chunks=(4096,), dtype=np.int64)
+        self.dropped.attrs['units'] = "camera's get_dropped_frames() counter"
+        self.next_frame = frame_buffer.count # absolute frame number of the next one to write
+        self.frames_written = 0
+        self.frames_lost = 0 # overwritten in the ring buffer before the writer got to them
+
+    def write_pending(self):
+        '''writes up to batch frames, returns how many were taken off the buffer (written or lost)'''
+        count = self.frame_buffer.count
+        # keep one slot of margin, that one may be in the middle of being filled by the camera
+        oldest = count - self.frame_buffer.capacity + 1
+        if self.next_frame < oldest:
+            self.frames_lost += oldest - self.next_frame
+            self.next_frame = oldest
+        stop = min(count, self.next_frame + self.batch)
+        if stop <= self.next_frame:
+            return 0
+        # copy out of the ring first, the camera keeps filling slots while we copy. then check again which of the
+        # copied frames it got to in the meantime, those may be torn or newer than their timestamps and are dropped
+        timestamps, dropped = self.frame_buffer.stamps(self.next_frame, stop)
+        frames = np.concatenate(self.frame_buffer.segments(self.next_frame, stop))
+        overwritten = max(0, self.frame_buffer.count - self.frame_buffer.capacity + 1 - self.next_frame)
+        overwritten = min(overwritten, stop - self.next_frame)
+        self.frames_lost += overwritten
+        taken = stop - self.next_frame
+        self.next_frame = stop
+        frames, timestamps, dropped = frames[overwritten:], timestamps[overwritten:], dropped[overwritten:]
+        n = len(frames)
+        if n:
+            start = self.frames_written
+            self.dataset.resize(start + n, axis=0)
+            self.timestamps.resize(start + n, axis=0)
+            self.dropped.resize(start + n, axis=0)
+            self.timestamps[start:] = timestamps
+            self.dropped[start:] = dropped
+            self.dataset[start:] = frames
+            self.frames_written += n
+        return taken
+
+    def finish(self, attrs=None):
+        for key, value in (attrs or {}).items():
+            self.parent.attrs[key] = value
+        self.parent.attrs['frame_count'] = self.frames_written
+        self.parent.attrs['frames_lost'] = self.frames_lost
+
+
+class H5Recorder(threading.Thread):
+    def __init__(self, filename, frame_buffers, attrs=None, frames_per_chunk=1, compression=None, batch=64,
+                 group_attrs=None):
+        '''records every frame committed to the frame buffers from now on until close().
+        frame_buffers is one FrameRingBuffer (frames, timestamps, dropped_frames at the top of the file) or
+        {group name: FrameRingBuffer} for several cameras, each in its own group with its own group_attrs
+        ({group name: attrs}). one writer thread does them all.
+        frames_per_chunk is the h5 chunk size along the frame axis, batch is the most frames written per resize'''
+        super().__init__(daemon=True)
+        self.filename = filename
+        if not isinstance(frame_buffers, dict):
+            frame_buffers = {'': frame_buffers}
+        self.h5f = h5py.File(filename, 'w')
+        for key, value in (attrs or {}).items():
+            self.h5f.attrs[key] = value
+        self.streams = {}
+        for name, frame_buffer in frame_buffers.items():
+            parent = self.h5f.create_group(name) if name else self.h5f
+            for key, value in (group_attrs or {}).get(name, {}).items():
+                parent.attrs[key] = value
+            self.streams[name] = _FrameStream(parent, frame_buffer, frames_per_chunk, compression, batch)
+        self.stop_event = threading.Event()
+        self.error = None
+
+    @property
+    def frames_written(self):
+        return sum(stream.frames_written for stream in self.streams.values())
+
+    @property
+    def frames_lost(self):
+        return sum(stream.frames_lost for stream in self.streams.values())
+
+    def run(self):
+        try:
+            while True:
+                stopping = self.stop_event.is_set() # read before count so the last frames still get written
+                if not self.write_pending():
+                    if stopping:
+                        break
+                    self.stop_event.wait(0.005)
+        except Exception as e:
+            self.error = e
+            print(f"[ERROR] Recording to {self.filename} failed: {e}")
+
+    def write_pending(self):
+        '''writes up to batch frames of every stream, returns how many were written'''
+        return sum(stream.write_pending() for stream in self.streams.values())
+
+    def stop(self):
+        '''writes whatever is left in the buffers and ends the writer thread, the file stays open'''
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def timestamps(self, name=''):
+        '''perf_counter ns timestamps of group name's frames in the file, all of them once stop() has been called'''
+        return self.streams[name].timestamps[:]
+
+    def close(self, attrs=None, group_attrs=None, datasets=None):
+        '''writes whatever is left in the buffers, adds attrs (e.g. the measured fps) to the file, group_attrs per
+        group and datasets ({name: array}) at the top level, then closes the file. returns the number of frames in it'''
+        self.stop()
+        for key, value in (attrs or {}).items():
+            self.h5f.attrs[key] = value
+        for name, data in (datasets or {}).items():
+            self.h5f.create_dataset(name, data=data)
+        for name, stream in self.streams.items():
+            stream.finish((group_attrs or {}).get(name))
+        frames_written, frames_lost = self.frames_written, self.frames_lost
+        self.h5f.close()
+        if frames_lost:
+            print(f"[WARNING] Writer fell behind, {frames_lost} frames were overwritten before they were saved")
+        return frames_written
@@ -0,0 +1,213 @@
+"""
+Paced playback of recorded videos. A decoder thread reads frames into a small queue and the display side shows each
+one at its deadline on the monotonic clock, instead of cv2.waitKey(1000 / fps) which adds the decode and draw time
+on top of every frame. When the display falls behind, frames whose time has passed are skipped so the speed holds.
+"""
+import queue
+import threading
+import time
+
+import cv2
+
+from .clock import sleep_until
+
+
+class PlaybackEngine:
+    def __init__(self, frames, fps=30.0, speed=1.0, start=0, queue_size=8):
+        '''frames is an H5VideoReader (or anything with len() and frames[i]), fps is the playback rate at speed 1'''
+        self.frames = frames
+        self.fps = float(fps)
+        self.speed = float(speed)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.generation = 0 # bumped on every seek, queued frames from an older generation are thrown away
+        self.position = start # next frame the decoder reads
+        self.current = None # frame number on screen
+        self.paused = False
+        self.shown = 0
+        self.dropped = 0
+        self.first_shown = None # (time, frame number) of the first frame shown, for the achieved rate
+        self.last_shown = None
+        self._anchor(start)
+        self.thread = threading.Thread(target=self._decode, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    # ---- timing ----
+
+    def _anchor(self, index):
+        # frame index is due now, later frames every 1 / (fps * speed) after it
+        self.anchor_index = index
+        self.anchor_time = time.perf_counter()
+
+    @property
+    def rate(self):
+        '''frames of the file per second of playback'''
+        return self.fps * self.speed
+
+    def deadline(self, index):
+        return self.anchor_time + (index - self.anchor_index) / self.rate
+
+    def frame_due(self):
+        '''the frame the clock says should be on screen right now'''
+        return self.anchor_index + int((time.perf_counter() - self.anchor_time) * self.rate)
+
+    # ---- decoder thread ----
+
+    def _decode(self):
+        while not self.stop_event.is_set():
+            with self.lock:
+                generation, index = self.generation, self.position
+                if not self.paused:
+                    # too far behind to show these anyway, don't spend time reading them
+                    due = self.frame_due()
+                    if index < due - 1:
+                        self.dropped += due - 1 - index
+                        index = due - 1
+                self.position = index + 1
+            frame = self.frames[index] if index < len(self.frames) else None # None marks the end
+            while not self.stop_event.is_set() and generation == self.generation:
+                try:
+                    self.queue.put((generation, index, frame), timeout=0.05)
+                    break
+                except queue.Full:
+                    pass
+            if frame is None:
+                # wait at the end until a seek (new generation) or stop
+                while not self.stop_event.is_set() and generation == self.generation:
+                    time.sleep(0.01)
+
+    # ---- display side ----
+
+    def next_frame(self):
+        '''blocks until the next frame is due and returns (index, frame), None at the end of the video.
+        frames that are already late when they come out of the queue are dropped'''
+        while True:
+            generation, index, frame = self.queue.get()
+            if generation != self.generation:
+                continue
+            if frame is None:
+                return None
+            if not self.paused and time.perf_counter() >= self.deadline(index + 1) and index + 1 < len(self.frames):
+                self.dropped += 1 # the next one is already due
+                continue
+            sleep_until(self.deadline(index))
+            now = time.perf_counter()
+            self.current = index
+            self.shown += 1
+            if self.first_shown is None:
+                self.first_shown = (now, index)
+            self.last_shown = (now, index)
+            return index, frame
+
+    def seek(self, index):
+        '''jumps to a frame, the next next_frame() returns it straight away'''
+        index = max(0, min(int(index), len(self.frames) - 1))
+        with self.lock:
+            self.generation += 1
+            self.position = index
+            self._anchor(index)
+            self.first_shown = self.last_shown = None # the achieved rate is measured per uninterrupted run
+        while True: # drop what was already decoded
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def set_speed(self, speed):
+        with self.lock:
+            resume = self.current + 1 if self.current is not None else self.position
+            self.speed = float(speed)
+            self._anchor(resume)
+            self.first_shown = self.last_shown = None
+
+    def pause(self):
+        with self.lock:
+            self.paused = True
+
+    def resume(self):
+        '''carries on from the frame after the one on screen'''
+        self.seek(self.current + 1 if self.current is not None else self.position)
+        with self.lock:
+            self.paused = False
+
+    def achieved_fps(self):
+        '''file frames per second actually played over the current run, should be fps * speed'''
+        if self.first_shown is None or self.last_shown[0] <= self.first_shown[0]:
+            return 0.0
+        return (self.last_shown[1] - self.first_shown[1]) / (self.last_shown[0] - self.first_shown[0])
+
+
+def play_video(frames, fps=30.0, title="Playback", speed=1.0):
+    '''plays frames in an opencv window with a scrub bar.
+    keys: q/ESC quit, space pause, , and . step a frame, a/d seek -/+ 1 second, - and + half/double the speed.
+    returns the engine so the caller can print its stats'''
+    engine = PlaybackEngine(frames, fps, speed).start()
+    last_frame = len(frames) - 1
+    cv2.namedWindow(title)
+    trackbar = {'pos': 0, 'updated': 0.0, 'moved': False}
+
+    def on_trackbar(pos):
+        if pos != trackbar['pos']: # setTrackbarPos below calls this too
+            trackbar['pos'] = pos
+            trackbar['moved'] = True
+            engine.seek(pos)
+    cv2.createTrackbar("Frame", title, 0, max(1, last_frame), on_trackbar)
+
+    def show_next():
+        item = engine.next_frame()
+        if item is None:
+            return False
+        index, frame = item
+        cv2.imshow(title, frame)
+        now = time.perf_counter()
+        if now - trackbar['updated'] > 0.1: # moving the bar every frame costs more than the frame
+            trackbar['pos'] = index
+            trackbar['updated'] = now
+            cv2.setTrackbarPos("Frame", title, index)
+        return True
+
+    try:
+        while True:
+            if engine.paused:
+                if trackbar['moved']: # scrubbing while paused, show where the bar is
+                    trackbar['moved'] = False
+                    show_next()
+                key = cv2.waitKey(30) & 0xFF
+            else:
+                if not show_next():
+                    break
+                key = cv2.waitKey(1) & 0xFF
+
+            if key in (ord('q'), 27):
+                print("[INFO] Playback stopped by user.")
+                break
+            elif key == ord(' '):
+                if engine.paused:
+                    engine.resume()
+                else:
+                    engine.pause()
+            elif key in (ord(','), ord('.')) and engine.paused:
+                engine.seek((engine.current or 0) + (1 if key == ord('.') else -1))
+                show_next()
+            elif key in (ord('a'), ord('d')):
+                engine.seek((engine.current or 0) + int(engine.fps) * (1 if key == ord('d') else -1))
+                if engine.paused:
+                    show_next()
+            elif key in (ord('+'), ord('=')):
+                engine.set_speed(engine.speed * 2)
+                print(f"[INFO] Speed {engine.speed:g}x")
+            elif key == ord('-'):
+                engine.set_speed(engine.speed / 2)
+                print(f"[INFO] Speed {engine.speed:g}x")
+    finally:
+        engine.stop()
+        cv2.destroyWindow(title)
+    return engine
@@ -0,0 +1,90 @@
+"""
+Fixed size frame buffer for the live feed. One contiguous (N, H, W) uint8 block is allocated up front,
+the camera writes straight into the next slot and the oldest frame gets overwritten once it is full.
+"""
+import time
+
+import numpy as np
+
+
+class FrameRingBuffer:
+    def __init__(self, height, width, capacity=None, memory_gb=2.0):
+        '''capacity is the number of frames kept, if None it is as many as fit in memory_gb'''
+        frame_bytes = height * width
+        if capacity is None:
+            capacity = int(memory_gb * 1024**3) // frame_bytes
+        if capacity < 1:
+            raise ValueError(f"Buffer of {memory_gb} GB can't hold a single {width}x{height} frame")
+        self.height = height
+        self.width = width
+        self.capacity = capacity
+        self.frames = np.empty((capacity, height, width), dtype=np.uint8)
+        self.timestamps = np.zeros(capacity, dtype=np.int64) # time.perf_counter_ns() when the frame came in
+        self.dropped = np.zeros(capacity, dtype=np.int64) # camera's dropped frame counter at that frame
+        self.count = 0 # frames committed since the start, the slot is count % capacity
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes
+
+    def clear(self):
+        self.count = 0
+
+    def next_slot(self):
+        '''view of the slot the next frame goes in, fill it and then call commit()'''
+        return self.frames[self.count % self.capacity]
+
+    def commit(self, timestamp=None, dropped=0):
+        '''timestamp is in time.perf_counter_ns(), taken now if not given'''
+        slot = self.count % self.capacity
+        self.timestamps[slot] = time.perf_counter_ns() if timestamp is None else timestamp
+        self.dropped[slot] = dropped
+        self.count += 1
+
+    def append(self, frame, timestamp=None, dropped=0):
+        '''copies a frame in, for frames that didn't come from next_slot()'''
+        self.next_slot()[...] = frame
+        self.commit(timestamp, dropped)
+
+    def latest(self):
+        '''view of the newest frame, None if nothing has been captured yet'''
+        if self.count == 0:
+            return None
+        return self.frames[(self.count - 1) % self.capacity]
+
+    def segments(self, start, stop):
+        '''frames start..stop (absolute frame numbers, like count) as one or two views.
+        the caller has to make sure they haven't been overwritten yet, i.e. count - start <= capacity'''
+        if stop <= start:
+            return []
+        first, end = start % self.capacity, stop % self.capacity or self.capacity
+        if first < end:
+            return [self.frames[first:end]]
+        return [self.frames[first:], self.frames[:end]]
+
+    def stamps(self, start, stop):
+        '''timestamps and dropped counters of frames start..stop, as copies'''
+        slots = np.arange(start, stop) % self.capacity
+        return self.timestamps[slots], self.dropped[slots]
+
+    def last_stamps(self, n=None):
+        n = len(self) if n is None else min(n, len(self))
+        return self.stamps(self.count - n, self.count)
+
+    def last_segments(self, n=None):
+        '''the last n frames (all of them if n is None) oldest first, as one or two views.
+        it is two views when the frames wrap around the end of the buffer'''
+        n = len(self) if n is None else min(n, len(self))
+        return self.segments(self.count - n, self.count)
+
+    def last(self, n=None):
+        '''last n frames as one (n, H, W) array. a view if they don't wrap, otherwise a copy'''
+        segments = self.last_segments(n)
+        if not segments:
+            return self.frames[:0]
+        if len(segments) == 1:
+            return segments[0]
+        return np.concatenate(segments)
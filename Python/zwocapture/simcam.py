@@ -0,0 +1,244 @@
+"""
+Stand-in for the zwoasi module so the capture code can run without a camera (linux CI, benchmarks).
+It has the same init / get_num_cameras / Camera interface and ASI_* constants the apps use, and the cameras
+make up frames of a bright fiber tip disc on a noisy background that moves with a sine drive.
+Frames come out at a fixed rate on the monotonic clock like the real sensor, and the ones that aren't read
+in time are dropped and counted. The apps use it instead of zwoasi when ZWO_SIMULATE is set, e.g.
+
+    ZWO_SIMULATE=1 python HighSpeedCam.py
+    ZWO_SIMULATE=2 python ZWO_2camera_controller.py   (the number is how many cameras there are)
+
+A script can call configure() first to change the rate, sensor size or scene.
+"""
+import os
+import time
+
+import numpy as np
+from zwoasi import (ASI_GAIN, ASI_EXPOSURE, ASI_OFFSET, ASI_BANDWIDTHOVERLOAD, ASI_FLIP, ASI_HIGH_SPEED_MODE,
+                    ASI_IMG_RAW8, ASI_IMG_Y8, ZWO_Error, ZWO_IOError)
+
+from .clock import sleep_until
+
+
+class FiberTipScene:
+    def __init__(self, center=(968.0, 548.0), radius=27.0, amplitude=(20.0, 0.0), frequency=5.0, background=10,
+                 brightness=230, noise=4.0, seed=0):
+        '''center and radius of the tip in sensor pixels, amplitude (x, y) in pixels and frequency in Hz of the
+        sine drive, background/brightness are the 8 bit levels and noise the gaussian sigma of the background.
+        stage can be set to anything with an offset(t) method giving (dx, dy) in pixels from center, e.g. a simulated
+        actuator that the DAC commands move. it takes the place of the sine drive'''
+        self.center = center
+        self.radius = radius
+        self.amplitude = amplitude
+        self.frequency = frequency
+        self.background = background
+        self.brightness = brightness
+        self.noise = noise
+        self.stage = stage # module default, see the bottom of the file
+        self.rng = np.random.default_rng(seed)
+        self._noise_bank = {} # a few precomputed noise frames per roi shape, making new noise every frame is slow
+
+    def position(self, t):
+        '''(x, y) of the tip center in sensor pixels at time t (a time.perf_counter() time)'''
+        if self.stage is not None:
+            dx, dy = self.stage.offset(t)
+        else:
+            phase = np.sin(2 * np.pi * self.frequency * t)
+            dx, dy = self.amplitude[0] * phase, self.amplitude[1] * phase
+        return self.center[0] + dx, self.center[1] + dy
+
+    def render(self, out, t, start_x=0, start_y=0, bins=1):
+        '''draws the scene at time t into out, a (height, width) uint8 roi whose corner is start_x, start_y (binned)'''
+        height, width = out.shape
+        bank = self._noise_bank.get(out.shape)
+        if bank is None:
+            bank = self.rng.normal(self.background, self.noise, (16, height, width))
+            bank = self._noise_bank[out.shape] = np.clip(bank, 0, 255).astype(np.uint8)
+        out[...] = bank[self.rng.integers(len(bank))]
+
+        # anti-aliased disc, only inside its bounding box
+        x, y = self.position(t)
+        x, y, r = x / bins - start_x, y / bins - start_y, self.radius / bins
+        x0, x1 = max(0, int(x - r - 1)), min(width, int(x + r + 2))
+        y0, y1 = max(0, int(y - r - 1)), min(height, int(y + r + 2))
+        if x0 >= x1 or y0 >= y1:
+            return out
+        yy, xx = np.ogrid[y0:y1, x0:x1]
+        coverage = np.clip(r + 0.5 - np.sqrt((xx - x)**2 + (yy - y)**2), 0, 1)
+        region = out[y0:y1, x0:x1]
+        region[...] = np.minimum(255, region + coverage * (self.brightness - self.background))
+        return out
+
+
+class SimulatedCamera:
+    def __init__(self, id_=0, fps=200.0, max_width=1936, max_height=1096, scene=None, buffer_frames=4):
+        '''fps is the frame rate the sensor runs at (the exposure slows it down if it's longer than a frame),
+        buffer_frames is how many finished frames it holds before it starts dropping them'''
+        self.id = id_
+        self.fps = fps
+        self.max_width = max_width
+        self.max_height = max_height
+        self.scene = scene if scene is not None else FiberTipScene(center=(max_width / 2, max_height / 2), seed=id_)
+        self.buffer_frames = buffer_frames
+        self.controls = {ASI_GAIN: 0, ASI_EXPOSURE: 1000, ASI_OFFSET: 0, ASI_BANDWIDTHOVERLOAD: 40, ASI_FLIP: 0,
+                         ASI_HIGH_SPEED_MODE: 0}
+        self.video_started = None # perf_counter time of frame 0 while in video mode
+        self.frame_index = -1 # last video frame handed out
+        self.dropped = 0
+        self.closed = False
+        self.set_roi_format(max_width - max_width % 8, max_height - max_height % 2, 1, ASI_IMG_RAW8)
+        self.set_roi_start_position(0, 0)
+
+    # ---- same methods as zwoasi.Camera ----
+
+    def get_id(self):
+        return self.id
+
+    def get_camera_property(self):
+        return {'Name': f'ZWO ASI simulated #{self.id}', 'CameraID': self.id, 'MaxHeight': self.max_height,
+                'MaxWidth': self.max_width, 'IsColorCam': False, 'BayerPattern': 0, 'SupportedBins': [1, 2, 4],
+                'SupportedVideoFormat': [ASI_IMG_RAW8], 'PixelSize': 5.86, 'BitDepth': 8}
+
+    def get_controls(self):
+        return {'Gain': {'ControlType': ASI_GAIN}, 'Exposure': {'ControlType': ASI_EXPOSURE}}
+
+    def set_control_value(self, control_type, value, auto=False):
+        self.controls[control_type] = value
+
+    def get_control_value(self, control_type):
+        return self.controls.get(control_type, 0), False
+
+    def set_image_type(self, image_type):
+        self.set_roi_format(self.width, self.height, self.bins, image_type)
+
+    def get_image_type(self):
+        return self.image_type
+
+    def set_roi_format(self, width, height, bins, image_type):
+        if width % 8 or height % 2:
+            raise ValueError('ROI width must be a multiple of 8 and height a multiple of 2')
+        if image_type not in (ASI_IMG_RAW8, ASI_IMG_Y8):
+            raise ValueError('Only 8 bit images are simulated')
+        if width > self.max_width // bins or height > self.max_height // bins:
+            raise ValueError('ROI larger than binned sensor')
+        self.width, self.height, self.bins, self.image_type = width, height, bins, image_type
+
+    def get_roi_format(self):
+        return [self.width, self.height, self.bins, self.image_type]
+
+    def set_roi_start_position(self, start_x, start_y):
+        self.start_x, self.start_y = start_x, start_y
+
+    def get_roi_start_position(self):
+        return self.start_x, self.start_y
+
+    def set_roi(self, start_x=None, start_y=None, width=None, height=None, bins=None, image_type=None):
+        # same defaults as zwoasi: full (binned) sensor, centered
+        bins = self.bins if bins is None else bins
+        image_type = self.image_type if image_type is None else image_type
+        max_width, max_height = self.max_width // bins, self.max_height // bins
+        if width is None:
+            width = max_width - max_width % 8
+        if height is None:
+            height = max_height - max_height % 2
+        if start_x is None:
+            start_x = (max_width - width) // 2
+        if start_x + width > max_width:
+            raise ValueError('ROI and start position larger than binned sensor width')
+        if start_y is None:
+            start_y = (max_height - height) // 2
+        if start_y + height > max_height:
+            raise ValueError('ROI and start position larger than binned sensor height')
+        self.set_roi_format(width, height, bins, image_type)
+        self.set_roi_start_position(start_x, start_y)
+
+    def get_roi(self):
+        return self.start_x, self.start_y, self.width, self.height
+
+    def frame_period(self):
+        '''seconds per frame, the exposure (us) if that's longer than 1 / fps'''
+        return max(1.0 / self.fps, self.controls[ASI_EXPOSURE] * 1e-6)
+
+    def start_video_capture(self):
+        self.video_started = time.perf_counter()
+        self.frame_index = -1
+        self.dropped = 0
+
+    def stop_video_capture(self):
+        self.video_started = None
+
+    def stop_exposure(self):
+        pass
+
+    def get_dropped_frames(self):
+        return self.dropped
+
+    def get_video_data(self, timeout=None, buffer_=None):
+        '''waits for the next frame (timeout in ms, None waits as long as it takes) and returns it as a bytearray'''
+        if self.video_started is None:
+            raise ZWO_Error('Video capture not started')
+        period = self.frame_period()
+        index = self.frame_index + 1
+        finished = int((time.perf_counter() - self.video_started) / period) - 1 # newest complete frame
+        if finished - index >= self.buffer_frames: # we're late, the oldest ones are gone
+            self.dropped += finished - self.buffer_frames + 1 - index
+            index = finished - self.buffer_frames + 1
+        ready = self.video_started + (index + 1) * period
+        if timeout is not None and ready - time.perf_counter() > timeout / 1000:
+            sleep_until(time.perf_counter() + timeout / 1000)
+            raise ZWO_IOError('Timeout', 11)
+        sleep_until(ready)
+        self.frame_index = index
+
+        if buffer_ is None:
+            buffer_ = bytearray(self.width * self.height)
+        out = np.frombuffer(buffer_, dtype=np.uint8).reshape(self.height, self.width)
+        self.scene.render(out, ready, self.start_x, self.start_y, self.bins)
+        return buffer_
+
+    def capture_video_frame(self, buffer_=None, filename=None, timeout=None):
+        data = self.get_video_data(timeout, buffer_)
+        return np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width)
+
+    def capture(self, initial_sleep=0.01, poll=0.01, buffer_=None, filename=None):
+        '''single exposure, the scene at the current time'''
+        time.sleep(self.controls[ASI_EXPOSURE] * 1e-6)
+        img = np.empty((self.height, self.width), dtype=np.uint8)
+        return self.scene.render(img, time.perf_counter(), self.start_x, self.start_y, self.bins)
+
+    def close(self):
+        self.closed = True
+
+
+# ---- module level functions like zwoasi's ----
+
+settings = {'num_cameras': int(os.getenv('ZWO_SIMULATE') or 1)} # changed by configure(), the rest are SimulatedCamera arguments
+cameras = {} # id -> the last SimulatedCamera opened with it, so a simulated stage can find its scene
+stage = None # simulated actuator that new scenes start out attached to (ftacontrol.SimulatedFTA.attach sets it)
+
+
+def configure(num_cameras=1, **camera_args):
+    '''sets how many cameras there are and the SimulatedCamera arguments (fps, max_width, scene, ...) for new ones'''
+    settings.clear()
+    settings['num_cameras'] = num_cameras
+    settings.update(camera_args)
+
+
+def init(library_file=None):
+    pass # nothing to load
+
+
+def get_num_cameras():
+    return settings['num_cameras']
+
+
+def list_cameras():
+    return [f'ZWO ASI simulated #{i}' for i in range(get_num_cameras())]
+
+
+def Camera(id_):
+    if not 0 <= id_ < get_num_cameras():
+        raise ZWO_Error('Invalid camera ID')
+    camera_args = {k: v for k, v in settings.items() if k != 'num_cameras'}
+    cameras[id_] = SimulatedCamera(id_, **camera_args)
+    return cameras[id_]
@@ -0,0 +1,81 @@
+"""
+Real time base for recorded frames. Recordings carry a per frame 'timestamps' dataset (perf_counter ns,
+older recordings have monotonic ns which on windows only ticks every ~15.6 ms) and the camera's
+'dropped_frames' counter, older files only have the actual_fps attr and get an evenly spaced time base from that.
+"""
+import numpy as np
+
+
+def frame_times(h5f, fallback_fps=120.0):
+    '''seconds since the first frame for every frame in an open h5 file'''
+    if 'timestamps' in h5f and len(h5f['timestamps']) == len(h5f['frames']):
+        timestamps = h5f['timestamps'][:]
+        return (timestamps - timestamps[0]) / 1e9
+    try:
+        fps = float(h5f.attrs.get('actual_fps', fallback_fps))
+    except ValueError: # 'unknown'
+        fps = fallback_fps
+    return np.arange(len(h5f['frames'])) / fps
+
+
+def find_gaps(times, tolerance=1.5):
+    '''frames that came in more than tolerance x the median frame interval after the previous one.
+    returns (indices, missing) where indices are the frames after each gap and missing is roughly how many frames fit in it'''
+    times = np.asarray(times, dtype=np.float64)
+    if len(times) < 3:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    dt = np.diff(times)
+    period = np.median(dt)
+    if not period > 0: # clock too coarse for the frame rate, most frames share a stamp
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    gaps = np.nonzero(dt > tolerance * period)[0]
+    missing = np.rint(dt[gaps] / period).astype(np.int64) - 1
+    return gaps + 1, missing
+
+
+def resample_uniform(times, values, rate=None):
+    '''linear interpolation of values (nan allowed, those are skipped) onto an evenly spaced time base.
+    rate defaults to 1 / median frame interval (the mean one if the clock was too coarse for the median).
+    with fewer than 2 distinct times there is nothing to resample, the input comes back with rate nan.
+    returns (uniform_times, resampled_values, rate)'''
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(times) < 2 or not times[-1] > times[0]:
+        return times, values.copy(), np.nan if rate is None else rate
+    if rate is None:
+        period = np.median(np.diff(times))
+        if not period > 0:
+            period = (times[-1] - times[0]) / (len(times) - 1)
+        rate = 1.0 / period
+    uniform_times = times[0] + np.arange(int(np.floor((times[-1] - times[0]) * rate + 1e-6)) + 1) / rate
+    valid = ~np.isnan(values)
+    if valid.sum() < 2:
+        return uniform_times, np.full(len(uniform_times), np.nan), rate
+    return uniform_times, np.interp(uniform_times, times[valid], values[valid]), rate
+
+
+def align_streams(times_a, times_b, tolerance=None):
+    '''pairs up the frames of two cameras by timestamp, each frame of a with the nearest frame of b.
+    pairs further apart than tolerance (default half a's median frame interval) are left out, and a frame of b goes
+    with at most one frame of a (the closest). returns (index_a, index_b, offsets) with offsets = times_b - times_a'''
+    times_a = np.asarray(times_a, dtype=np.float64)
+    times_b = np.asarray(times_b, dtype=np.float64)
+    empty = np.array([], dtype=np.int64)
+    if len(times_a) == 0 or len(times_b) == 0:
+        return empty, empty, np.array([])
+    if tolerance is None:
+        tolerance = np.median(np.diff(times_a)) / 2 if len(times_a) > 1 else np.inf
+    if len(times_b) > 1:
+        right = np.clip(np.searchsorted(times_b, times_a), 1, len(times_b) - 1)
+    else:
+        right = np.zeros(len(times_a), dtype=np.int64)
+    left = np.maximum(right - 1, 0)
+    nearest = np.where(np.abs(times_b[left] - times_a) <= np.abs(times_b[right] - times_a), left, right)
+    distance = np.abs(times_b[nearest] - times_a)
+    index_a = np.nonzero(distance <= tolerance)[0]
+    # closest first, then the first time each b frame shows up is the one it's kept for
+    index_a = index_a[np.argsort(distance[index_a], kind='stable')]
+    _, first = np.unique(nearest[index_a], return_index=True)
+    index_a = np.sort(index_a[first])
+    index_b = nearest[index_a]
+    return index_a, index_b, times_b[index_b] - times_a[index_a]